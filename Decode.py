@@ -6,7 +6,11 @@ This script decodes binary data from an image back to its original file format.
 It extracts RGB pixel values and converts them back to bytes.
 
 Usage:
-    python Decode.py [input_image] [output_file] [--method METHOD]
+    python Decode.py [input_image] [output_file] [--method METHOD] [--stream [--buffer-size BYTES]] [--trusted]
+    python Decode.py input_image output_file --range OFFSET:LENGTH
+    python Decode.py manifest.json output_file [--workers N]
+    python Decode.py input_dir output_dir --batch [--workers N]
+    python Decode.py input_image output_file --cache DIR [--cache-size SIZE] [--cache-link]
 
 Example:
     python Decode.py Sample/Encode.png Sample/Decode.txt
@@ -14,138 +18,1169 @@ Example:
 """
 
 import argparse
+import functools
+import hashlib
+import io
 import os
 import sys
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
 from pathlib import Path
-from PIL import Image
+from PIL import Image, ImageChops
+
+from compression import CODEC_NAMES, DecompressingWriter, decompress_payload, read_compression_record
+from fec import (FEC_BLOCK_SIZE, FecDecodingWriter, decode_buffer as fec_decode_buffer,
+                 decoded_length as fec_decoded_length, read_fec_record)
+from file_cache import DEFAULT_CACHE_SIZE, DecodeCache
+from image_header import HEADER_FIXED_SIZE, parse_header, peek_header_length
+from instrumentation import NULL_INSTRUMENTATION, cprofile_to, from_options, print_stages
+from integrity import HashingWriter, new_digest, read_digest_record, trailer_length, verify_digest
+from pixel_modes import PIXEL_MODE_NAMES, peek_png_pixel_mode, pixel_mode_for_image, pixel_mode_for_png
+from png_stream import DEFAULT_BUFFER_SIZE, PngStreamReader
+from raw_formats import RawImage, detect_raw_format
+from shard_manifest import ShardManifest, is_manifest
+from sizes import parse_range, parse_size
+
+
+@dataclass
+class DecodeResult:
+    """
+    Summary of one decoded image.
+
+    Attributes:
+        input_image (str): Image that was decoded
+        output_file (str): File that was written
+        data_length (int): Bytes written to the output file
+        data_pixels (int): Pixels holding the header and payload
+        total_bytes (int): Payload bytes read from the image before padding removal
+        corrected_blocks (int): Blocks repaired by forward error correction
+        cached (bool): The output was copied from a decode cache instead of decoded
+    """
+    input_image: str
+    output_file: str
+    data_length: int
+    data_pixels: int
+    total_bytes: int
+    corrected_blocks: int = 0
+    cached: bool = False
+
+
+def _silent(*args, **kwargs):
+    """Stand-in for ``print`` when output is suppressed."""
+
+
+_trusted_lock = threading.Lock()
+_trusted_users = 0
+_saved_max_image_pixels = None
+
+
+@contextmanager
+def trusted_image_size():
+    """
+    Lift Pillow's decompression-bomb limit (``Image.MAX_IMAGE_PIXELS``) for
+    the body, restoring it afterwards.
+    
+    The limit is process-wide in Pillow, so nested and concurrent uses are
+    counted and the last one out restores it. Keep the body to opening
+    images from trusted sources; untrusted opens in other threads meanwhile
+    see the lifted limit too.
+    """
+    global _trusted_users, _saved_max_image_pixels
+    with _trusted_lock:
+        if not _trusted_users:
+            _saved_max_image_pixels = Image.MAX_IMAGE_PIXELS
+            Image.MAX_IMAGE_PIXELS = None
+        _trusted_users += 1
+    try:
+        yield
+    finally:
+        with _trusted_lock:
+            _trusted_users -= 1
+            if not _trusted_users:
+                Image.MAX_IMAGE_PIXELS = _saved_max_image_pixels
+
+
+def _open_image(source, trusted: bool = False):
+    """
+    ``Image.open`` that, for ``trusted`` input, skips Pillow's decompression-bomb
+    check, and otherwise explains how to get past it.
+    """
+    if trusted:
+        with trusted_image_size():
+            return Image.open(source)
+    try:
+        return Image.open(source)
+    except Image.DecompressionBombError as e:
+        raise ValueError(f"{e} Decode it with trusted=True (--trusted) if the image comes "
+                         f"from a trusted source, or stream it (--stream) if it is a PNG.")
+
+
+def _ensure_pixel_layout(image):
+    """
+    Return the image in one of the 8-bit pixel layouts (L, RGB or RGBA),
+    converting anything else to RGB.
+    
+    ``Image.convert`` copies the whole image even when the mode already
+    matches, so callers that share one image should go through this helper.
+    """
+    return image if pixel_mode_for_image(image) is not None else image.convert("RGB")
+
+
+def _bytes_per_pixel(image) -> int:
+    """Bytes per pixel of an image in one of the 8-bit layouts."""
+    return len(image.getbands())
+
+
+def trailing_strip_length(view, strip: bytes, chunk_size: int = 1 << 16):
+    """
+    Length of a buffer once trailing ``strip`` bytes are removed.
+    
+    Works like ``len(bytes(view).rstrip(strip))`` but scans backwards in
+    bounded chunks, so only the tail of the buffer is ever copied.
+    
+    Args:
+        view (memoryview): Buffer to inspect
+        strip (bytes): Byte values to strip from the end
+        chunk_size (int): Number of bytes examined per step
+        
+    Returns:
+        int: Length of the buffer without its trailing ``strip`` bytes
+    """
+    end = len(view)
+    while end > 0:
+        start = max(0, end - chunk_size)
+        stripped = bytes(view[start:end]).rstrip(strip)
+        if stripped:
+            return start + len(stripped)
+        end = start
+    return 0
+
+
+def leading_pixel_bytes(image, byte_count: int):
+    """
+    Raw pixel bytes of the rows covering the first ``byte_count`` bytes.
+    
+    Only those rows are copied out of the image, so reading a header or a
+    payload near the top of a large image doesn't copy the whole image.
+    
+    Args:
+        image (PIL.Image.Image): Image in one of the 8-bit layouts
+        byte_count (int): Number of leading bytes needed
+        
+    Returns:
+        bytes: Raw bytes of the covering rows (may be longer than requested)
+    """
+    width, height = image.size
+    row_bytes = width * _bytes_per_pixel(image)
+    rows = min(height, -(-byte_count // row_bytes))
+    if rows == height:
+        return image.tobytes()
+    return image.crop((0, 0, width, rows)).tobytes()
+
+
+def read_header_payload(image):
+    """
+    Read the format header and slice out exactly the payload it describes.
+    
+    Args:
+        image (PIL.Image.Image): Image in one of the 8-bit layouts
+        
+    Returns:
+        tuple[ImageHeader, memoryview, memoryview] | None: Header, payload and
+        the digest trailer following it (empty without a digest), or None for
+        a legacy image without a header
+        
+    Raises:
+        ValueError: If the header is damaged or claims more data than the image holds
+    """
+    width, height = image.size
+    header_length = peek_header_length(leading_pixel_bytes(image, HEADER_FIXED_SIZE))
+    if header_length is None:
+        return None
+    
+    header = parse_header(leading_pixel_bytes(image, header_length))
+    data_start = header.header_length
+    data_end = data_start + header.payload_length
+    trailer_end = data_end + trailer_length(header)
+    if trailer_end > width * height * _bytes_per_pixel(image):
+        raise ValueError(f"Header payload length {header.payload_length} exceeds image capacity")
+    
+    view = memoryview(leading_pixel_bytes(image, trailer_end))
+    return header, view[data_start:data_end], view[data_end:trailer_end]
+
+
+def _verify_payload(header, data, trailer, log) -> str:
+    """
+    Hash decoded data held in memory and compare it with the image's digest trailer.
+    
+    Raises:
+        ValueError: On a mismatch
+    """
+    digest = new_digest(read_digest_record(header))
+    digest.update(data)
+    value = verify_digest(digest, trailer)
+    log(f"Integrity check passed ({digest.name}): {value}")
+    return value
 
 
 def count_non_white_pixels(image):
     """
     Count the number of non-white pixels in an image.
     
+    A pixel is white only if all its channels are 255, so the per-pixel
+    minimum over the bands is 255 exactly for white pixels. That minimum is
+    computed with ``ImageChops.darker`` and counted with one histogram, all
+    inside Pillow.
+    
     Args:
         image (PIL.Image.Image): The image to analyze
         
     Returns:
         int: Number of non-white pixels
     """
-    # Ensure the image is in RGB format
-    image = image.convert("RGB")
+    # Ensure the image is in one of the 8-bit layouts
+    image = _ensure_pixel_layout(image)
     width, height = image.size
-    non_white_count = 0
     
-    # Loop through each pixel
-    for y in range(height):
-        for x in range(width):
-            r, g, b = image.getpixel((x, y))
-            if (r, g, b) != (255, 255, 255):  # Not white
-                non_white_count += 1
+    channel_min = functools.reduce(ImageChops.darker, image.split())
+    white_count = channel_min.histogram()[255]
+    
+    return width * height - white_count
+
+
+def count_non_white_in_buffer(pixel_bytes, bytes_per_pixel: int = 3) -> int:
+    """
+    Count non-white pixels in a raw pixel buffer of any layout.
+    
+    16-bit pixels are viewed as two 8-bit half-pixels side by side, and the
+    darker half decides, so the count stays inside Pillow for every layout.
+    
+    Args:
+        pixel_bytes (bytes-like): Raw pixel bytes, a whole number of pixels
+        bytes_per_pixel (int): Bytes per pixel of the layout
+        
+    Returns:
+        int: Number of pixels that are not all 0xFF
+    """
+    halves = 2 if bytes_per_pixel in (6, 8) else 1
+    pil_mode = {1: "L", 3: "RGB", 4: "RGBA"}[bytes_per_pixel // halves]
+    pixels = len(pixel_bytes) // bytes_per_pixel
+    if not pixels:
+        return 0
+    image = Image.frombytes(pil_mode, (halves, pixels), bytes(pixel_bytes))
+    if halves == 2:
+        image = ImageChops.darker(image.crop((0, 0, 1, pixels)), image.crop((1, 0, 2, pixels)))
+    return count_non_white_pixels(image)
+
+
+def find_data_end_in_buffer(pixel_bytes, bytes_per_pixel: int = 3) -> int:
+    """
+    Smart data-end detection over a raw pixel buffer.
+    
+    Searches backwards from the end for the last byte that is not 0xFF; the
+    pixel holding it is the last non-white pixel. Only the white tail is
+    examined.
     
-    return non_white_count
+    Args:
+        pixel_bytes (bytes-like): Raw pixel bytes in reading order
+        bytes_per_pixel (int): Bytes per pixel of the layout (3 for RGB)
+        
+    Returns:
+        int: Number of pixels up to and including the last non-white one
+    """
+    data_end = trailing_strip_length(memoryview(pixel_bytes), b'\xff')
+    
+    # An all-white buffer still reports one pixel, as the pixel scan always has
+    return max(data_end - 1, 0) // bytes_per_pixel + 1
 
 
-def find_data_end_smart(image):
+def find_data_end_smart(image, band_rows: int = 64):
     """
     Smart detection of where encoded data ends by finding the last non-white pixel.
     
+    Rows are read back from the bottom of the image in bands, so the cost is
+    proportional to the white tail rather than the whole image.
+    
     Args:
         image (PIL.Image.Image): The image to analyze
+        band_rows (int): Number of rows fetched per step
         
     Returns:
         int: Index of the last pixel containing data
     """
-    image = image.convert("RGB")
+    image = _ensure_pixel_layout(image)
     width, height = image.size
-    last_data_pixel = 0
+    bytes_per_pixel = _bytes_per_pixel(image)
     
-    # Scan pixels in reading order to find last non-white pixel
-    for y in range(height):
-        for x in range(width):
-            pixel_index = y * width + x
-            r, g, b = image.getpixel((x, y))
-            if (r, g, b) != (255, 255, 255):  # Not white
-                last_data_pixel = pixel_index
+    bottom = height
+    while bottom > 0:
+        top = max(0, bottom - band_rows)
+        band = image.crop((0, top, width, bottom)).tobytes()
+        data_end = trailing_strip_length(memoryview(band), b'\xff')
+        if data_end:
+            return top * width + (data_end - 1) // bytes_per_pixel + 1
+        bottom = top
     
-    return last_data_pixel + 1  # +1 because we want count, not index
+    return 1  # +1 because we want count, not index
+
 
+def _write_repeated(f, byte: bytes, count: int, chunk_size: int = 1 << 16):
+    """Write ``count`` copies of a single byte in bounded chunks."""
+    chunk = byte * min(count, chunk_size)
+    while count > 0:
+        piece = chunk[:count]
+        f.write(piece)
+        count -= len(piece)
 
-def decode_image_to_file(input_image: str, output_file: str, method: str = "count"):
+
+def _truncate_trailing(f, length: int, strip: bytes, chunk_size: int = 1 << 16) -> int:
     """
-    Decode an image back to its original file format.
+    Truncate a file to ``length`` bytes minus any trailing ``strip`` bytes.
+    
+    The tail is read back in bounded chunks, mirroring ``trailing_strip_length``
+    for data that has already been written out.
+    
+    Returns:
+        int: The new file length
+    """
+    end = length
+    while end > 0:
+        start = max(0, end - chunk_size)
+        f.seek(start)
+        stripped = f.read(end - start).rstrip(strip)
+        if stripped:
+            end = start + len(stripped)
+            break
+        end = start
+    f.truncate(end)
+    return end
+
+
+class _PayloadSink:
+    """
+    File-like sink for the payload span of an image with a format header.
+    
+    Undoes the stages the header records on the way to ``out``: FEC repair,
+    then decompression, then the integrity digest over the bytes written.
+    """
+    
+    def __init__(self, out, header, log, fec_workers: int = None):
+        self._header = header
+        self._log = log
+        algorithm = read_digest_record(header)
+        self._hashing = HashingWriter(out, new_digest(algorithm)) if algorithm is not None else None
+        target = self._hashing or out
+        compression = read_compression_record(header)
+        self._decompressing = DecompressingWriter(target, *compression) if compression else None
+        target = self._decompressing or target
+        self._parity = read_fec_record(header)
+        self._fec = FecDecodingWriter(target, self._parity, fec_workers) if self._parity else None
+        self._sink = self._fec or target
+    
+    def write(self, data) -> int:
+        return self._sink.write(data)
+    
+    def close(self, trailer=b""):
+        """
+        Finish every stage and check the digest against ``trailer``.
+        
+        Returns:
+            tuple[int, int]: Bytes written to ``out`` and blocks repaired by FEC
+        
+        Raises:
+            ValueError: If a stage finds the payload damaged or incomplete
+        """
+        data_length = self._header.payload_length
+        corrected = 0
+        if self._fec is not None:
+            corrected = self._fec.close()
+            data_length = fec_decoded_length(data_length, self._parity)
+            self._log(f"FEC: repaired {corrected} of "
+                      f"{-(-self._header.payload_length // FEC_BLOCK_SIZE)} blocks")
+        if self._decompressing is not None:
+            data_length = self._decompressing.close()
+        if self._hashing is not None:
+            value = verify_digest(self._hashing.digest, trailer)
+            self._log(f"Integrity check passed ({self._hashing.digest.name}): {value}")
+        return data_length, corrected
+
+
+def stream_decode_png(input_image: str, output_file: str, method: str = "smart",
+                      buffer_size: int = DEFAULT_BUFFER_SIZE, quiet: bool = False,
+                      fec_workers: int = None):
+    """
+    Decode a PNG scanline by scanline, writing payload bytes as they are produced.
+    
+    With a format header the payload span is known up front: rows are read
+    only until the payload ends. Legacy images are written up to the last
+    non-white pixel seen so far. Runs of white pixels are only counted, and
+    are written once a later non-white pixel shows they belong to the data.
+    The output is then cut back to the detected length and the zero padding
+    is trimmed by reading the file's tail. An integrity digest recorded in
+    the header is computed over the bytes as they are written and checked
+    against the image's trailer; on a mismatch the output is removed. An
+    FEC-coded payload is repaired chunk by chunk before it is written.
     
     Args:
-        input_image (str): Path to the input image
+        input_image (str): Path to a PNG image in one of the pixel layouts
         output_file (str): Path for the output file
-        method (str): Decoding method ('count' or 'smart')
-    
+        method (str): Decoding method for legacy images ('count' or 'smart')
+        buffer_size (int): Bytes read and inflated per step
+        quiet (bool): Suppress progress output
+        fec_workers (int, optional): Worker processes repairing FEC blocks.
+            Defaults to the CPU count
+        
+    Returns:
+        tuple[int, int, int, int]: Decoded bytes, data pixels, bytes before
+        padding removal and blocks repaired by FEC
+        
     Raises:
-        FileNotFoundError: If input image doesn't exist
-        ValueError: If image cannot be processed
-        IOError: If there's an error reading/writing files
+        ValueError: If the image is not a PNG in a supported layout or holds no data
     """
-    try:
-        # Check if input image exists
-        if not os.path.exists(input_image):
-            raise FileNotFoundError(f"Input image '{input_image}' not found.")
-        
-        # Open and validate the image
+    log = _silent if quiet else print
+    with open(input_image, "rb") as source:
         try:
-            image = Image.open(input_image)
-        except Exception as e:
+            reader = PngStreamReader(source, read_size=buffer_size)
+        except ValueError as e:
             raise ValueError(f"Cannot open image '{input_image}': {e}")
         
-        # Ensure RGB format
-        image = image.convert("RGB")
-        width, height = image.size
+        log(f"Input image: {input_image}")
+        try:
+            with open(output_file, "w+b") as out:
+                return _stream_decode(reader, out, method, log, fec_workers)
+        except Exception:
+            if os.path.exists(output_file):
+                os.remove(output_file)
+            raise
+
+
+def _stream_decode(reader: PngStreamReader, out, method: str, log, fec_workers: int = None):
+    """
+    Core of ``stream_decode_png``: decode from an open reader into a
+    seekable, writable binary file object.
+    
+    Returns:
+        tuple[int, int, int, int]: Decoded bytes, data pixels, bytes before
+        padding removal and blocks repaired by FEC
+    """
+    mode = pixel_mode_for_png(reader.color_type, reader.bit_depth)
+    if mode is None:
+        raise ValueError(f"Streaming decode needs a PNG in one of the pixel modes "
+                         f"({', '.join(PIXEL_MODE_NAMES)})")
+    bytes_per_pixel = mode.bytes_per_pixel
+    
+    log(f"Image dimensions: {reader.width}x{reader.height} ({mode.name})")
+    
+    rows = reader.iter_rows()
+    leading = bytearray()
+    _read_at_least(rows, leading, HEADER_FIXED_SIZE)
+    
+    header_length = peek_header_length(leading)
+    if header_length is not None:
+        _read_at_least(rows, leading, header_length)
+        header = parse_header(leading)
+        data_start = header.header_length
+        data_end = data_start + header.payload_length
+        trailer_end = data_end + trailer_length(header)
+        if trailer_end > reader.width * reader.height * bytes_per_pixel:
+            raise ValueError(f"Header payload length {header.payload_length} exceeds image capacity")
         
-        print(f"Input image: {input_image}")
-        print(f"Image dimensions: {width}x{height}")
-        print(f"Decoding method: {method}")
+        log(f"Format header: version {header.version}, {header.payload_length} payload bytes")
+        compression = read_compression_record(header)
+        if compression is not None:
+            codec, original_length = compression
+            log(f"Payload compressed with {CODEC_NAMES.get(codec, codec)}, "
+                  f"{original_length} bytes decompressed")
         
-        # Determine how many pixels contain data
-        if method == "smart":
-            data_pixels = find_data_end_smart(image)
-            print(f"Smart detection: {data_pixels} pixels contain data")
-        else:  # count method
-            data_pixels = count_non_white_pixels(image)
-            print(f"Non-white pixels: {data_pixels}")
+        # Exactly the payload span and its digest trailer; rows past them are never inflated
+        sink = _PayloadSink(out, header, log, fec_workers)
+        trailer = bytearray()
+        offset = 0
+        for piece in _chain_rows(leading, rows):
+            piece_end = offset + len(piece)
+            if piece_end > data_start and offset < data_end:
+                sink.write(memoryview(piece)[max(data_start - offset, 0):data_end - offset])
+            if piece_end > data_end:
+                trailer += memoryview(piece)[max(data_end - offset, 0):trailer_end - offset]
+            offset = piece_end
+            if offset >= trailer_end:
+                break
+        if offset < trailer_end:
+            raise ValueError("Image ended before the payload length in its header")
+        data_length, corrected = sink.close(trailer)
+        return data_length, -(-trailer_end // bytes_per_pixel), header.payload_length, corrected
+    
+    log(f"Decoding method: {method}")
+    written = 0
+    pending_white = 0
+    non_white = 0
+    for piece in _chain_rows(leading, rows):
+        data_end = trailing_strip_length(memoryview(piece), b'\xff')
+        if method != "smart":
+            non_white += count_non_white_in_buffer(piece, bytes_per_pixel)
+        if data_end:
+            pixel_end = (data_end - 1) // bytes_per_pixel * bytes_per_pixel + bytes_per_pixel
+            _write_repeated(out, b'\xff', pending_white)
+            out.write(memoryview(piece)[:pixel_end])
+            written += pending_white + pixel_end
+            pending_white = len(piece) - pixel_end
+        else:
+            pending_white += len(piece)
+    
+    if method == "smart":
+        if not written:
+            # An all-white image still reports one pixel, as the pixel scan always has
+            out.write(b'\xff' * bytes_per_pixel)
+            written = bytes_per_pixel
+        data_pixels = written // bytes_per_pixel
+        log(f"Smart detection: {data_pixels} pixels contain data")
+    else:
+        data_pixels = non_white
+        log(f"Non-white pixels: {data_pixels}")
+    
+    if data_pixels == 0:
+        raise ValueError("No encoded data found in image (all pixels are white)")
+    
+    # Cut back to the detected data and drop the zero padding
+    data_length = _truncate_trailing(out, data_pixels * bytes_per_pixel, b'\x00')
+    if not data_length:
+        raise ValueError("No valid data found after removing padding")
+    return data_length, data_pixels, data_pixels * bytes_per_pixel, 0
+
+
+def decode_raw_image(input_image: str, output_file: str, method: str = "smart",
+                     buffer_size: int = DEFAULT_BUFFER_SIZE, quiet: bool = False,
+                     fec_workers: int = None):
+    """
+    Decode an uncompressed BMP, PPM or TIFF image through a memory map.
+    
+    The payload is sliced straight out of the mapped pixel region and written
+    to the output, so there is no Pillow decode and, for PPM and TIFF, no
+    intermediate copy: decode time is bounded by page-cache reads. BMP rows
+    are reordered (bottom-up storage) and converted from BGR row by row.
+    
+    Args:
+        input_image (str): Path to the image
+        output_file (str): Path for the output file
+        method (str): Decoding method for legacy images ('count' or 'smart')
+        buffer_size (int): Bytes written per step
+        quiet (bool): Suppress progress output
+        fec_workers (int, optional): Worker processes repairing FEC blocks.
+            Defaults to the CPU count
         
-        if data_pixels == 0:
-            raise ValueError("No encoded data found in image (all pixels are white)")
+    Returns:
+        tuple[int, int, int, int]: Decoded bytes, data pixels, bytes before
+        padding removal and blocks repaired by FEC
         
-        # Extract bytes from pixels
-        decoded_bytes = []
+    Raises:
+        ValueError: If the image is not a supported container or holds no data
+    """
+    log = _silent if quiet else print
+    with RawImage(input_image) as raw:
+        log(f"Input image: {input_image} ({raw.image_format.upper()}, memory-mapped)")
+        log(f"Image dimensions: {raw.width}x{raw.height}")
         
-        for i in range(data_pixels):
-            x = i % width
-            y = i // width
+        leading = bytes(raw.read(0, HEADER_FIXED_SIZE))
+        header_length = peek_header_length(leading)
+        if header_length is not None:
+            header = parse_header(bytes(raw.read(0, header_length)))
+            data_start = header.header_length
+            data_end = data_start + header.payload_length
+            trailer_end = data_end + trailer_length(header)
+            if trailer_end > raw.size:
+                raise ValueError(f"Header payload length {header.payload_length} exceeds image capacity")
             
-            if y >= height:
-                break
+            log(f"Format header: version {header.version}, {header.payload_length} payload bytes")
+            compression = read_compression_record(header)
+            if compression is not None:
+                codec, original_length = compression
+                log(f"Payload compressed with {CODEC_NAMES.get(codec, codec)}, "
+                      f"{original_length} bytes decompressed")
             
-            r, g, b = image.getpixel((x, y))
-            decoded_bytes.extend([r, g, b])
+            try:
+                with open(output_file, "wb") as out:
+                    sink = _PayloadSink(out, header, log, fec_workers)
+                    for chunk in raw.iter_chunks(data_start, data_end, buffer_size):
+                        sink.write(chunk)
+                    data_length, corrected = sink.close(bytes(raw.read(data_end, trailer_end)))
+            except Exception:
+                # Never leave output that failed its checks behind
+                if os.path.exists(output_file):
+                    os.remove(output_file)
+                raise
+            return data_length, -(-trailer_end // 3), header.payload_length, corrected
         
-        # Convert to bytes object
-        decoded_data = bytes(decoded_bytes)
+        log(f"Decoding method: {method}")
+        if method == "smart":
+            # Last non-white byte, searching rows from the end of the image
+            data_end = 0
+            for row in range(raw.height - 1, -1, -1):
+                row_end = trailing_strip_length(memoryview(raw.read(row * raw.row_bytes,
+                                                                    (row + 1) * raw.row_bytes)), b'\xff')
+                if row_end:
+                    data_end = row * raw.row_bytes + row_end
+                    break
+            data_pixels = max(data_end - 1, 0) // 3 + 1
+            log(f"Smart detection: {data_pixels} pixels contain data")
+        else:
+            data_pixels = 0
+            for chunk in raw.iter_chunks(0, raw.size, buffer_size):
+                data_pixels += count_non_white_pixels(
+                    Image.frombuffer("RGB", (raw.width, len(chunk) // raw.row_bytes), chunk, "raw", "RGB", 0, 1)
+                )
+            log(f"Non-white pixels: {data_pixels}")
         
-        # Remove trailing null bytes (padding)
-        decoded_data = decoded_data.rstrip(b'\x00')
+        if data_pixels == 0:
+            raise ValueError("No encoded data found in image (all pixels are white)")
         
-        if not decoded_data:
+        # Drop the zero padding, then write the data span
+        data_view = memoryview(raw.read(0, data_pixels * 3))
+        data_length = trailing_strip_length(data_view, b'\x00')
+        if not data_length:
             raise ValueError("No valid data found after removing padding")
+        with open(output_file, "wb") as out:
+            out.write(data_view[:data_length])
+        data_view.release()
+        return data_length, data_pixels, data_pixels * 3, 0
+
+
+def _read_at_least(rows, buffer: bytearray, size: int):
+    """Append rows to ``buffer`` until it holds ``size`` bytes or the image ends."""
+    while len(buffer) < size:
+        row = next(rows, None)
+        if row is None:
+            return
+        buffer += row
+
+
+def _chain_rows(leading, rows):
+    """Yield the already-read leading bytes, then the remaining rows."""
+    if leading:
+        yield leading
+    yield from rows
+
+
+def _decode_pixels(image, method: str, log, instrumentation=NULL_INSTRUMENTATION,
+                   fec_workers: int = None):
+    """
+    Extract the payload from an opened image.
+    
+    Returns:
+        tuple: Payload (a memoryview, or bytes when it was repaired or
+        decompressed), the number of data pixels, the pixel bytes spanned
+        before padding removal and the blocks repaired by FEC
+    
+    Raises:
+        ValueError: If the image holds no data
+    """
+    width, height = image.size
+    
+    # Ensure RGB format (converted once and shared with the detection step)
+    with instrumentation.stage("load"):
+        image = _ensure_pixel_layout(image)
+        image.load()
+    bytes_per_pixel = _bytes_per_pixel(image)
+    
+    log(f"Image dimensions: {width}x{height}")
+    
+    with instrumentation.stage("locate") as locate:
+        header_payload = read_header_payload(image)
+        if header_payload is not None:
+            # Self-describing image: read the header, then exactly the payload span
+            header, data_view, trailer = header_payload
+            log(f"Format header: version {header.version}, {header.payload_length} payload bytes")
+            data_pixels = -(-(header.header_length + len(data_view) + len(trailer)) // bytes_per_pixel)
+            decoded_data = data_view
+        else:
+            log(f"Decoding method: {method}")
+            
+            pixel_bytes = image.tobytes()
+            
+            # Determine how many pixels contain data
+            if method == "smart":
+                data_pixels = find_data_end_in_buffer(pixel_bytes, bytes_per_pixel)
+                log(f"Smart detection: {data_pixels} pixels contain data")
+            else:  # count method
+                data_pixels = count_non_white_pixels(image)
+                log(f"Non-white pixels: {data_pixels}")
+            
+            if data_pixels == 0:
+                raise ValueError("No encoded data found in image (all pixels are white)")
+            
+            # Slice the data pixels straight out of the raw RGB buffer
+            data_view = memoryview(pixel_bytes)[:data_pixels * bytes_per_pixel]
+            
+            # Remove trailing null bytes (padding) without copying the payload
+            decoded_data = data_view[:trailing_strip_length(data_view, b'\x00')]
+        locate.bytes = len(data_view)
+    
+    parity = read_fec_record(header) if header_payload is not None else None
+    corrected = 0
+    if parity is not None:
+        with instrumentation.stage("fec", len(data_view)):
+            decoded_data, corrected = fec_decode_buffer(data_view, parity, fec_workers)
+        log(f"FEC: repaired {corrected} of {-(-len(data_view) // FEC_BLOCK_SIZE)} blocks")
+    
+    compression = read_compression_record(header) if header_payload is not None else None
+    if compression is not None:
+        codec, original_length = compression
+        log(f"Payload compressed with {CODEC_NAMES.get(codec, codec)}, "
+              f"{original_length} bytes decompressed")
+        with instrumentation.stage("decompress", len(decoded_data)):
+            decoded_data = decompress_payload(decoded_data, codec, original_length)
+    
+    if header_payload is not None and len(trailer):
+        # Checked before anything is written, so a damaged image leaves no output
+        with instrumentation.stage("verify", len(decoded_data)):
+            _verify_payload(header, decoded_data, trailer, log)
+    
+    if not len(decoded_data):
+        raise ValueError("No valid data found after removing padding")
+    return decoded_data, data_pixels, len(data_view), corrected
+
+
+def _is_16bit_png(f) -> bool:
+    """Whether a seekable PNG file object holds one of the 16-bit pixel modes."""
+    mode = peek_png_pixel_mode(f)
+    return mode is not None and mode.pil_mode is None
+
+
+def _is_16bit_image(input_image: str) -> bool:
+    """Whether the image file is a PNG in one of the 16-bit pixel modes."""
+    with open(input_image, "rb") as f:
+        return _is_16bit_png(f)
+
+
+def _decode_source(source, method: str, trusted: bool = False):
+    """
+    Decode an image from a path, a binary file object or encoded bytes.
+    
+    16-bit PNGs go through the streaming reader, as Pillow cannot hold them
+    without losing precision; everything else is decoded by Pillow.
+    
+    Returns:
+        bytes-like: The decoded payload
+    """
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as f:
+            return _decode_source(f, method, trusted)
+    f = source if hasattr(source, "read") else io.BytesIO(source)
+    if not f.seekable():
+        f = io.BytesIO(f.read())
+    
+    if _is_16bit_png(f):
+        try:
+            reader = PngStreamReader(f)
+        except ValueError as e:
+            raise ValueError(f"Cannot open image: {e}")
+        out = io.BytesIO()
+        data_length, _, _, _ = _stream_decode(reader, out, method, _silent)
+        return out.getbuffer()[:data_length]
+    
+    try:
+        image = _open_image(f, trusted)
+    except Exception as e:
+        raise ValueError(f"Cannot open image: {e}")
+    decoded_data, _, _, _ = _decode_pixels(image, method, _silent)
+    return decoded_data
+
+
+def decode_image_bytes(source, method: str = "count", trusted: bool = False) -> bytes:
+    """
+    Decode an in-memory image back to its payload.
+    
+    Args:
+        source: Encoded image as a bytes-like object (e.g. PNG file bytes) or a
+            readable binary file object; any container Pillow reads is accepted
+        method (str): Decoding method for legacy images ('count' or 'smart')
+        trusted (bool): Skip Pillow's decompression-bomb limit on the image size
+    
+    Returns:
+        bytes: The decoded payload
+    
+    Raises:
+        ValueError: If the image cannot be opened or holds no data
+    """
+    return bytes(_decode_source(source, method, trusted))
+
+
+def decode_image_into(source, buffer, method: str = "count", trusted: bool = False) -> int:
+    """
+    Decode an in-memory image into a caller-provided buffer, ``readinto``-style.
+    
+    Args:
+        source: Encoded image as a bytes-like object or a readable binary file object
+        buffer: Writable bytes-like object (``bytearray``, ``memoryview``, writable ``mmap``)
+        method (str): Decoding method for legacy images ('count' or 'smart')
+        trusted (bool): Skip Pillow's decompression-bomb limit on the image size
+    
+    Returns:
+        int: Number of payload bytes written to the start of ``buffer``
+    
+    Raises:
+        ValueError: If the image cannot be opened, holds no data or the payload
+            does not fit in ``buffer``
+    """
+    decoded_data = _decode_source(source, method, trusted)
+    
+    data_length = len(decoded_data)
+    with memoryview(buffer) as view, view.cast("B") as target:
+        if data_length > len(target):
+            raise ValueError(f"Buffer too small: payload is {data_length} bytes, "
+                             f"buffer holds {len(target)}")
+        target[:data_length] = decoded_data
+    return data_length
+
+
+# Bytes read and inflated per step by range reads, so small ranges stay cheap
+RANGE_READ_SIZE = 64 * 1024
+
+
+class _RangeSink:
+    """File-like sink keeping only bytes ``[start, end)`` of everything written to it."""
+    
+    def __init__(self, start: int, end: int):
+        self.start = start
+        self.end = end
+        self.position = 0
+        self.data = bytearray()
+    
+    def write(self, data) -> int:
+        view = memoryview(data)
+        low = max(self.start - self.position, 0)
+        high = min(self.end - self.position, len(view))
+        if high > low:
+            self.data += view[low:high]
+        self.position += len(view)
+        return len(view)
+
+
+def _png_span(f, start: int, end: int) -> bytes:
+    """
+    Pixel bytes ``[start, end)`` of a PNG, inflating from the indexed segment
+    holding ``start`` (or from the top without an index).
+    """
+    f.seek(0)
+    reader = PngStreamReader(f, read_size=RANGE_READ_SIZE)
+    first_row = start // reader.row_bytes
+    skip = start - first_row * reader.row_bytes
+    span = bytearray()
+    for row in reader.iter_rows(first_row):
+        span += row
+        if len(span) >= skip + end - start:
+            break
+    return bytes(span[skip:skip + end - start])
+
+
+def _read_payload_range(read_span, capacity: int, offset: int, length: int,
+                        buffer_size: int) -> bytes:
+    """
+    Read ``length`` payload bytes from ``offset`` through ``read_span(start, end)``,
+    which returns pixel bytes of the image.
+    """
+    leading = bytes(read_span(0, HEADER_FIXED_SIZE))
+    header_length = peek_header_length(leading)
+    if header_length is None:
+        raise ValueError("Range reads need the format header; decode the whole image instead")
+    header = parse_header(bytes(read_span(0, header_length)))
+    data_start = header.header_length
+    data_end = data_start + header.payload_length
+    if data_end > capacity:
+        raise ValueError(f"Header payload length {header.payload_length} exceeds image capacity")
+    
+    compression = read_compression_record(header)
+    parity = read_fec_record(header)
+    if compression is None and parity is not None:
+        # Only the FEC blocks covering the range are read and checked
+        data_size = FEC_BLOCK_SIZE - parity
+        end = min(offset + length, fec_decoded_length(header.payload_length, parity))
+        if offset >= end:
+            return b""
+        first, last = offset // data_size, (end - 1) // data_size + 1
+        coded = read_span(data_start + first * FEC_BLOCK_SIZE,
+                          min(data_start + last * FEC_BLOCK_SIZE, data_end))
+        data, _ = fec_decode_buffer(coded, parity, workers=1)
+        return data[offset - first * data_size:end - first * data_size]
+    if compression is None:
+        start = data_start + min(offset, header.payload_length)
+        return bytes(read_span(start, min(start + length, data_end)))
+    
+    # A compressed payload has no random access: decompress up to the range end
+    sink = _RangeSink(offset, offset + length)
+    decompressing = DecompressingWriter(sink, *compression)
+    writer = decompressing if parity is None else FecDecodingWriter(decompressing, parity, workers=1)
+    for start in range(data_start, data_end, buffer_size):
+        writer.write(read_span(start, min(start + buffer_size, data_end)))
+        if sink.position >= sink.end:
+            break
+    else:
+        if writer is not decompressing:
+            writer.close()
+        decompressing.close()
+    return bytes(sink.data)
+
+
+def decode_image_range(input_image: str, offset: int, length: int,
+                       buffer_size: int = DEFAULT_BUFFER_SIZE) -> bytes:
+    """
+    Read ``length`` bytes of the payload starting at ``offset`` without decoding
+    the whole image.
+    
+    PNGs written with a range index (``encode_file_to_image(index_chunk=...)``)
+    are inflated only over the segments covering the range, so the cost follows
+    the range size rather than the image size. Uncompressed BMP, PPM and TIFF
+    containers are read straight from a memory map. PNGs without an index are
+    inflated from the top up to the end of the range. Payloads compressed
+    before encoding are decompressed from their start.
+    
+    Args:
+        input_image (str): Path to the image, which must carry a format header
+        offset (int): Payload offset of the first byte
+        length (int): Number of bytes to read
+        buffer_size (int): Compressed payload bytes decompressed per step
+    
+    Returns:
+        bytes: The requested bytes, shorter if the range passes the payload end
+    
+    Raises:
+        FileNotFoundError: If the image doesn't exist
+        ValueError: If the range is negative or the image has no format header
+    """
+    if offset < 0 or length < 0:
+        raise ValueError("Range offset and length must not be negative")
+    if not os.path.exists(input_image):
+        raise FileNotFoundError(f"Input image '{input_image}' not found.")
+    
+    if detect_raw_format(input_image) is not None:
+        with RawImage(input_image) as raw:
+            return _read_payload_range(raw.read, raw.size, offset, length, buffer_size)
+    
+    with open(input_image, "rb") as f:
+        try:
+            reader = PngStreamReader(f)
+        except ValueError as e:
+            raise ValueError(f"Cannot open image '{input_image}': {e}")
+        capacity = reader.row_bytes * reader.height
+        return _read_payload_range(lambda start, end: _png_span(f, start, end), capacity,
+                                   offset, length, buffer_size)
+
+
+def decode_image_to_file(input_image: str, output_file: str, method: str = "count",
+                         stream: bool = False, buffer_size: int = DEFAULT_BUFFER_SIZE,
+                         trusted: bool = False, fec_workers: int = None,
+                         cache: DecodeCache = None, quiet: bool = False,
+                         instrumentation=None) -> "DecodeResult":
+    """
+    Decode an image back to its original file format.
+    
+    Images carrying a format header are decoded from the exact payload
+    length it records; ``method`` only applies to legacy images without one.
+    If the encoder stored an integrity digest, the decoded data is hashed as
+    it is produced and decoding fails on a mismatch without leaving output.
+    An FEC-coded payload is checked block by block and damaged blocks are
+    repaired; ``DecodeResult.corrected_blocks`` counts them.
+    
+    Args:
+        input_image (str): Path to the input image
+        output_file (str): Path for the output file
+        method (str): Decoding method for legacy images ('count' or 'smart')
+        stream (bool): Parse the PNG directly, inflating and un-filtering one
+            scanline at a time and writing payload bytes as they are produced,
+            so memory stays bounded by a few scanlines
+        buffer_size (int): Bytes read and inflated per step when streaming
+        trusted (bool): Skip Pillow's decompression-bomb limit
+            (``Image.MAX_IMAGE_PIXELS``) while opening the image; only for
+            images from a trusted source. Streaming and raw decoding never
+            go through Pillow and are not limited
+        fec_workers (int, optional): Worker processes repairing FEC blocks.
+            Defaults to the CPU count
+        cache (DecodeCache, optional): Decode cache. An image decoded before,
+            and unchanged since, is served from the in-process or on-disk tier
+            with one file write or copy; a fresh decode is inserted, see
+            ``file_cache.py``
+        quiet (bool): Suppress progress and error output
+        instrumentation (Instrumentation, optional): Receives per-stage timings,
+            byte counts and peak memory, see ``instrumentation.py``
+    
+    Returns:
+        DecodeResult: What was written; ``cached`` is set on a cache hit
+    
+    Raises:
+        FileNotFoundError: If input image doesn't exist
+        ValueError: If image cannot be processed
+        IOError: If there's an error reading/writing files
+    """
+    log = _silent if quiet else print
+    instrumentation = instrumentation or NULL_INSTRUMENTATION
+    try:
+        with instrumentation.run("decode", input_image=input_image):
+            # Check if input image exists
+            if not os.path.exists(input_image):
+                raise FileNotFoundError(f"Input image '{input_image}' not found.")
+            
+            cache_key = None
+            if cache is not None:
+                Path(output_file).parent.mkdir(parents=True, exist_ok=True)
+                with instrumentation.stage("cache"):
+                    cache_key = cache.key(input_image, {"method": method})
+                    cached = cache.fetch(cache_key, output_file)
+                if cached is not None:
+                    log(f"Cache hit: {cached['data_length']} bytes copied to '{output_file}'")
+                    return DecodeResult(input_image=input_image, output_file=output_file,
+                                        cached=True, **cached)
+                log("Cache miss" if cache_key else "Cache skipped: image modified too recently")
+                if cache.disk is not None and cache.disk.link and os.path.exists(output_file):
+                    # May be a hard link into the cache from an earlier hit
+                    os.remove(output_file)
+            
+            if detect_raw_format(input_image) is not None:
+                # Uncompressed containers are always decoded through a memory map
+                Path(output_file).parent.mkdir(parents=True, exist_ok=True)
+                
+                with instrumentation.stage("decode") as decode:
+                    data_length, data_pixels, total_bytes, corrected = decode_raw_image(
+                        input_image, output_file, method, buffer_size, quiet, fec_workers
+                    )
+                    decode.bytes = data_length
+            elif stream or _is_16bit_image(input_image):
+                if not stream:
+                    log("16-bit pixel mode: decoding with the streaming PNG reader")
+                
+                # Create output directory if it doesn't exist
+                Path(output_file).parent.mkdir(parents=True, exist_ok=True)
+                
+                # Inflating, locating and writing interleave, so they are timed as one stage
+                with instrumentation.stage("decode") as decode:
+                    data_length, data_pixels, total_bytes, corrected = stream_decode_png(
+                        input_image, output_file, method, buffer_size, quiet, fec_workers
+                    )
+                    decode.bytes = data_length
+            else:
+                # Open and validate the image
+                try:
+                    image = _open_image(input_image, trusted)
+                except Exception as e:
+                    raise ValueError(f"Cannot open image '{input_image}': {e}")
+                
+                log(f"Input image: {input_image}")
+                decoded_data, data_pixels, total_bytes, corrected = _decode_pixels(
+                    image, method, log, instrumentation, fec_workers
+                )
+                data_length = len(decoded_data)
+                
+                # Create output directory if it doesn't exist
+                output_path = Path(output_file)
+                output_path.parent.mkdir(parents=True, exist_ok=True)
+                
+                # Save the decoded data
+                with instrumentation.stage("write", data_length), open(output_file, "wb") as f:
+                    f.write(decoded_data)
+            
+            log(f"Successfully decoded {data_length} bytes to '{output_file}'")
+            log(f"Decoded {data_pixels} pixels ({total_bytes} total bytes before padding removal)")
+            
+            result = DecodeResult(
+                input_image=input_image,
+                output_file=output_file,
+                data_length=data_length,
+                data_pixels=data_pixels,
+                total_bytes=total_bytes,
+                corrected_blocks=corrected,
+            )
+            if cache_key is not None:
+                metadata = asdict(result)
+                del metadata["input_image"], metadata["output_file"], metadata["cached"]
+                try:
+                    cache.store(cache_key, output_file, metadata)
+                except OSError as e:
+                    log(f"Cache: could not store the output: {e}", file=sys.stderr)
+            return result
+        
+    except Exception as e:
+        log(f"Error decoding image: {e}", file=sys.stderr)
+        raise
+
+
+def _decode_shard(shard_path: str, output_file: str, offset: int, size: int, sha256: str,
+                  trusted: bool = False):
+    """
+    Decode one shard image and write its payload at its offset in the output.
+    
+    Runs in a worker process; the shard is checked against the manifest's
+    size and SHA-256 before anything is written.
+    """
+    try:
+        image = _ensure_pixel_layout(_open_image(shard_path, trusted))
+    except Exception as e:
+        raise ValueError(f"Cannot open shard '{shard_path}': {e}")
+    
+    header_payload = read_header_payload(image)
+    if header_payload is None:
+        raise ValueError(f"Shard '{shard_path}' has no format header")
+    _, payload, _ = header_payload
+    
+    if len(payload) != size:
+        raise ValueError(f"Shard '{shard_path}' holds {len(payload)} bytes, manifest says {size}")
+    if hashlib.sha256(payload).hexdigest() != sha256:
+        raise ValueError(f"Checksum mismatch in shard '{shard_path}'")
+    
+    with open(output_file, "r+b") as f:
+        f.seek(offset)
+        f.write(payload)
+
+
+def decode_shards_to_file(manifest_path: str, output_file: str, workers: int = None,
+                          trusted: bool = False):
+    """
+    Decode a sharded file from its manifest, decoding shards in parallel.
+    
+    The output file is preallocated to the original size and every worker
+    writes its shard directly at the shard's offset.
+    
+    Args:
+        manifest_path (str): Path to the JSON manifest written by ``encode_file_to_shards``
+        output_file (str): Path for the output file
+        workers (int, optional): Worker processes. Defaults to the CPU count
+        trusted (bool): Skip Pillow's decompression-bomb limit on shard images
+    
+    Raises:
+        FileNotFoundError: If the manifest or a shard image doesn't exist
+        ValueError: If the manifest is invalid or a shard fails verification
+    """
+    try:
+        if not os.path.exists(manifest_path):
+            raise FileNotFoundError(f"Manifest '{manifest_path}' not found.")
+        
+        manifest = ShardManifest.load(manifest_path)
+        shard_dir = os.path.dirname(os.path.abspath(manifest_path))
+        shard_paths = [os.path.join(shard_dir, shard.file) for shard in manifest.shards]
+        for shard_path in shard_paths:
+            if not os.path.exists(shard_path):
+                raise FileNotFoundError(f"Shard image '{shard_path}' not found.")
         
-        # Create output directory if it doesn't exist
-        output_path = Path(output_file)
-        output_path.parent.mkdir(parents=True, exist_ok=True)
+        print(f"Manifest: {manifest_path}")
+        print(f"Decoding {len(manifest.shards)} shards ({manifest.file_size} bytes)")
         
-        # Save the decoded data
+        Path(output_file).parent.mkdir(parents=True, exist_ok=True)
         with open(output_file, "wb") as f:
-            f.write(decoded_data)
+            f.truncate(manifest.file_size)
+        
+        try:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                futures = [
+                    pool.submit(_decode_shard, shard_path, output_file,
+                                shard.offset, shard.size, shard.sha256, trusted)
+                    for shard, shard_path in zip(manifest.shards, shard_paths)
+                ]
+                for future in futures:
+                    future.result()
+        except Exception:
+            os.remove(output_file)
+            raise
         
-        print(f"Successfully decoded {len(decoded_data)} bytes to '{output_file}'")
-        print(f"Decoded {data_pixels} pixels ({len(decoded_bytes)} total bytes before padding removal)")
+        print(f"Successfully decoded {manifest.file_size} bytes to '{output_file}'")
         
     except Exception as e:
         print(f"Error decoding image: {e}", file=sys.stderr)
@@ -160,6 +1195,9 @@ def main():
         description="Decode an image back to its original file format",
         formatter_class=argparse.RawDescriptionHelpFormatter,
         epilog="""
+Images written with a format header are decoded from the payload length it
+records. The methods below apply to legacy images without a header:
+
 Methods:
   count: Count all non-white pixels (legacy method)
   smart: Find the last non-white pixel (more accurate)
@@ -167,6 +1205,13 @@ Methods:
 Examples:
   python Decode.py encoded.png output.txt
   python Decode.py Sample/Encode.png Sample/Decode.txt --method smart
+  python Decode.py backup.png backup.tar --stream
+  python Decode.py huge.png huge.bin --trusted
+  python Decode.py backup.png part.bin --range 100M:4K
+  python Decode.py shards/backup.json backup.tar --workers 16
+  python Decode.py encoded/ restored/ --batch --workers 8
+  python Decode.py popular.png popular.bin --cache ~/.cache/file_to_image/decoded
+  python Decode.py backup.png backup.tar --metrics-jsonl metrics.jsonl --cprofile decode.prof
         """
     )
     
@@ -188,7 +1233,93 @@ Examples:
         "--method",
         choices=["count", "smart"],
         default="smart",
-        help="Decoding method to use (default: smart)"
+        help="Decoding method for images without a format header (default: smart)"
+    )
+    
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Decode scanline by scanline with bounded memory (PNG input only)"
+    )
+    
+    parser.add_argument(
+        "--range",
+        type=parse_range,
+        metavar="OFFSET:LENGTH",
+        help="Write only LENGTH payload bytes from OFFSET (sizes like 4K or 100M); "
+             "fast on images encoded with --index"
+    )
+    
+    parser.add_argument(
+        "--trusted",
+        action="store_true",
+        help="Lift Pillow's decompression-bomb limit so very large images from a "
+             "trusted source decode without warnings or errors"
+    )
+    
+    parser.add_argument(
+        "--workers",
+        type=int,
+        help="Worker processes for shard manifests, --batch and repairing FEC blocks "
+             "(default: CPU count)"
+    )
+    
+    parser.add_argument(
+        "--batch",
+        action="store_true",
+        help="Treat input_image as a directory, glob or @file list and output_file as "
+             "the output directory; every image is decoded across a process pool"
+    )
+    
+    parser.add_argument(
+        "--buffer-size",
+        type=int,
+        default=DEFAULT_BUFFER_SIZE,
+        help=f"Buffer size in bytes for --stream (default: {DEFAULT_BUFFER_SIZE})"
+    )
+    
+    parser.add_argument(
+        "--cache",
+        metavar="DIR",
+        help="Decode cache directory: an image decoded before and unchanged since is "
+             "copied from the cache instead of decoded again"
+    )
+    
+    parser.add_argument(
+        "--cache-size",
+        type=parse_size,
+        default=DEFAULT_CACHE_SIZE,
+        help="Size cap of the decode cache; least recently used outputs are evicted (default: 1G)"
+    )
+    
+    parser.add_argument(
+        "--cache-link",
+        action="store_true",
+        help="Hard-link outputs to and from the cache instead of copying them"
+    )
+    
+    parser.add_argument(
+        "--metrics-jsonl",
+        metavar="PATH",
+        help="Append per-stage timings and byte counts of the run to a JSON lines file"
+    )
+    
+    parser.add_argument(
+        "--metrics-prom",
+        metavar="PATH",
+        help="Write per-stage metrics to a Prometheus textfile-collector file"
+    )
+    
+    parser.add_argument(
+        "--trace-memory",
+        action="store_true",
+        help="Track peak memory per stage with tracemalloc (slows decoding down)"
+    )
+    
+    parser.add_argument(
+        "--cprofile",
+        metavar="PATH",
+        help="Dump cProfile stats for the run to PATH"
     )
     
     parser.add_argument(
@@ -198,15 +1329,73 @@ Examples:
     )
     
     args = parser.parse_args()
+    instrumentation = from_options(args.metrics_jsonl, args.metrics_prom, args.trace_memory)
     
     try:
-        decode_image_to_file(
+        with cprofile_to(args.cprofile):
+            _run_cli(args, instrumentation)
+    except Exception as e:
+        sys.exit(1)
+    if instrumentation.enabled:
+        print_stages(instrumentation)
+
+
+def _run_cli(args, instrumentation):
+    """Run the operation selected on the command line."""
+    cache = None
+    if args.cache:
+        # A single run never sees an image twice, so only the on-disk tier is kept
+        cache = DecodeCache(args.cache, args.cache_size, memory_size=0,
+                            link=args.cache_link)
+    if args.batch:
+        # Imported here: the batch module imports this one
+        from batch import run_batch
+        results = run_batch(
+            "decode",
+            [args.input_image],
+            args.output_file,
+            args.workers,
+            # Files are already spread across the batch pool
+            {"method": args.method, "stream": args.stream, "buffer_size": args.buffer_size,
+             "trusted": args.trusted, "fec_workers": 1, "cache": cache}
+        )
+        if not all(result.ok for result in results):
+            sys.exit(1)
+        return
+    
+    if args.range:
+        offset, length = args.range
+        try:
+            data = decode_image_range(args.input_image, offset, length, args.buffer_size)
+        except Exception as e:
+            print(f"Error decoding image: {e}", file=sys.stderr)
+            raise
+        Path(args.output_file).parent.mkdir(parents=True, exist_ok=True)
+        with open(args.output_file, "wb") as f:
+            f.write(data)
+        print(f"Successfully decoded {len(data)} bytes from offset {offset} to '{args.output_file}'")
+        return
+    
+    if is_manifest(args.input_image):
+        decode_shards_to_file(
             args.input_image,
             args.output_file,
-            args.method
+            args.workers,
+            trusted=args.trusted
         )
-    except Exception as e:
-        sys.exit(1)
+        return
+    
+    decode_image_to_file(
+        args.input_image,
+        args.output_file,
+        args.method,
+        stream=args.stream,
+        buffer_size=args.buffer_size,
+        trusted=args.trusted,
+        fec_workers=args.workers,
+        cache=cache,
+        instrumentation=instrumentation
+    )
 
 
 if __name__ == "__main__":
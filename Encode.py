@@ -6,127 +6,1208 @@ This script encodes binary data from a file into an image by converting bytes to
 Each group of 3 bytes becomes one RGB pixel in the output image.
 
 Usage:
-    python Encode.py [input_file] [output_image] [--width WIDTH] [--height HEIGHT]
+    python Encode.py [input_file] [output_image] [--width WIDTH] [--height HEIGHT] [--no-header]
+                     [--stream [--buffer-size BYTES]] [--threads N]
+                     [--profile fast|balanced|small|auto] [--compress none|auto|zlib|lzma|bz2]
+                     [--format png|bmp|ppm|tiff] [--mode L|RGB|RGBA|RGB16|RGBA16]
+                     [--index [--index-chunk SIZE]] [--digest none|crc32|sha256|blake2b]
+                     [--fec [PARITY]] [--workers N] [--cache DIR [--cache-size SIZE] [--cache-link]]
+    python Encode.py input_file image.png --append [--threads N]
+    python Encode.py input_file manifest.json --shard-size SIZE [--workers N]
+    python Encode.py input_dir output_dir --batch [--workers N]
 
 Example:
     python Encode.py Sample/Encode.txt Sample/Encode.png --width 500 --height 400
 """
 
 import argparse
+import hashlib
+import io
 import math
+import mmap
 import os
+import shutil
 import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
 from pathlib import Path
+from typing import Optional
 from PIL import Image
 
+from compression import (CODEC_NAMES, COMPRESSION_CHOICES, add_compression_record, choose_codec,
+                         compress_buffer, compress_file)
+from compression_profile import DEFAULT_PROFILE, PROFILE_NAMES, choose_profile
+from file_cache import DEFAULT_CACHE_SIZE, FileCache, content_key
+from fec import DEFAULT_FEC_PARITY, add_fec_record, encode_buffer as fec_encode_buffer, \
+    encode_file as fec_encode_file
+from image_header import FLAG_COMPRESSED, FLAG_FEC, ImageHeader, parse_header
+from integrity import (DIGEST_CHOICES, DIGEST_CRC32, DIGEST_NAMES, Crc32, FixedDigest, digest_for,
+                       read_digest_record)
+from instrumentation import NULL_INSTRUMENTATION, cprofile_to, from_options, print_stages
+from pixel_modes import (DEFAULT_PIXEL_MODE, PIXEL_MODE_NAMES, PixelMode, get_pixel_mode,
+                         pixel_mode_for_png)
+from png_stream import DEFAULT_BUFFER_SIZE, PngAppender, PngStreamWriter
+from raw_formats import IMAGE_FORMATS, RawImageWriter, format_from_extension
+from shard_manifest import DEFAULT_SHARD_SIZE, ShardEntry, ShardManifest, shard_file_name
+from sizes import parse_size
 
-def calculate_optimal_dimensions(file_size: int, max_width: int = 1000, max_height: int = 1000):
+# Largest width or height a PNG can describe
+MAX_PNG_DIMENSION = 2 ** 31 - 1
+
+# Image bytes per independently decodable segment of an indexed PNG
+DEFAULT_INDEX_CHUNK = 1024 * 1024
+
+# Widest scanline the planner picks, so streaming memory per row stays bounded
+MAX_ROW_BYTES = 1 << 24
+
+# Widths tried below the square side when looking for the least padding (at
+# most a quarter of the side, so the image stays near-square)
+PLANNER_SEARCH_WIDTHS = 256
+
+
+@dataclass
+class EncodeResult:
+    """
+    Summary of one encoded image.
+
+    Attributes:
+        width (int): Image width in pixels
+        height (int): Image height in pixels
+        input_size (int): Size of the input in bytes
+        payload_length (int): Bytes packed into pixels (after optional compression)
+        header_length (int): Size of the format header, 0 without one
+        image_format (str): Container format, e.g. ``png``
+        output_size (int): Size of the written image file in bytes
+        input_file (str): File that was encoded, None for in-memory input
+        output_image (str): Image that was written, None for in-memory output
+        pixel_mode (str): Pixel layout, e.g. ``RGB`` or ``RGBA16``
+        digest (str): Hex integrity digest of the input stored in the image, None without one
+        cached (bool): The image was copied from an encode cache instead of encoded
+    """
+    width: int
+    height: int
+    input_size: int
+    payload_length: int
+    header_length: int
+    image_format: str
+    output_size: int
+    input_file: Optional[str] = None
+    output_image: Optional[str] = None
+    pixel_mode: str = DEFAULT_PIXEL_MODE
+    digest: Optional[str] = None
+    cached: bool = False
+
+
+def _silent(*args, **kwargs):
+    """Stand-in for ``print`` when output is suppressed."""
+
+
+def calculate_optimal_dimensions(file_size: int, max_width: int = MAX_PNG_DIMENSION,
+                                 max_height: int = MAX_PNG_DIMENSION, bytes_per_pixel: int = 3,
+                                 max_row_bytes: int = MAX_ROW_BYTES):
     """
     Calculate optimal image dimensions based on file size.
     
+    Starts from a square image and tries slightly narrower widths, keeping
+    the one that leaves the fewest unused pixels in the last row. The result
+    never exceeds the constraints: if the payload cannot fit, the largest
+    allowed dimensions are returned and the capacity check reports it.
+    
     Args:
         file_size (int): Size of the file in bytes
-        max_width (int): Maximum width constraint
-        max_height (int): Maximum height constraint
+        max_width (int): Maximum width constraint (default: the PNG limit)
+        max_height (int): Maximum height constraint (default: the PNG limit)
+        bytes_per_pixel (int): Payload bytes each pixel holds (3 for RGB)
+        max_row_bytes (int): Longest scanline in bytes, bounding the memory
+            the streaming writer and reader need per row
         
     Returns:
         tuple[int, int]: Optimal width and height for the image
     """
-    # Calculate minimum pixels needed (3 bytes per pixel)
-    pixels_needed = math.ceil(file_size / 3)
+    # Calculate minimum pixels needed
+    pixels_needed = max(1, -(-file_size // bytes_per_pixel))
+    width_limit = max(1, min(max_width, max_row_bytes // bytes_per_pixel))
+    
+    # Narrowest width that keeps the height within its constraint
+    min_width = -(-pixels_needed // max_height)
+    if min_width > width_limit:
+        return width_limit, max_height
+    
+    # Square side (integer square root, exact for payloads of any size)
+    side_length = math.isqrt(pixels_needed - 1) + 1
+    width = min(max(side_length, min_width), width_limit)
+    
+    best_waste = width * -(-pixels_needed // width) - pixels_needed
+    lowest = max(min_width, width - min(PLANNER_SEARCH_WIDTHS, width // 4))
+    for candidate in range(width - 1, lowest - 1, -1):
+        if not best_waste:
+            break
+        waste = candidate * -(-pixels_needed // candidate) - pixels_needed
+        if waste < best_waste:
+            width, best_waste = candidate, waste
+    
+    return width, -(-pixels_needed // width)
+
+
+def _assemble_rows(header: bytes, data, padded_end: int, start: int, end: int,
+                   trailer: bytes = b"") -> bytearray:
+    """
+    Build the pixel bytes ``[start, end)`` of the image from its parts.
+
+    Used for the few rows that mix the header, the digest trailer, the last
+    partial pixel's zero padding or the white fill with payload bytes.
+    """
+    buffer = bytearray(b'\xff') * (end - start)
+    data_start = len(header)
+    data_end = data_start + len(data)
+    trailer_end = data_end + len(trailer)
+    for piece_start, piece in ((0, header), (data_start, data), (data_end, trailer),
+                               (trailer_end, bytes(padded_end - trailer_end))):
+        low = max(start, piece_start)
+        high = min(end, piece_start + len(piece))
+        if low < high:
+            buffer[low - start:high - start] = piece[low - piece_start:high - piece_start]
+    return buffer
+
+
+def pack_bytes_to_image(data, width: int, height: int, header: bytes = b"",
+                        block_size: int = DEFAULT_BUFFER_SIZE, pixel_mode: str = DEFAULT_PIXEL_MODE,
+                        digest=None):
+    """
+    Pack raw bytes into an image with bulk operations.
+
+    The image starts out white (0xFF) and is filled block by block. Rows made
+    up only of payload bytes are decoded by Pillow straight from ``data``,
+    which may be a memory-mapped file; only the rows holding the header and
+    the last partial pixel (zero-padded to a whole pixel) are assembled in a
+    small separate buffer. No per-pixel Python objects are created and the
+    payload is never copied into an intermediate full-size buffer.
+
+    Args:
+        data (bytes-like): Payload bytes, e.g. ``bytes`` or an ``mmap``
+        width (int): Image width in pixels
+        height (int): Image height in pixels
+        header (bytes): Packed format header placed before the payload
+        block_size (int): Approximate bytes decoded into the image per step
+        pixel_mode (str): ``L``, ``RGB`` or ``RGBA``; the 16-bit layouts have no
+            Pillow mode and are only written by the streaming writer
+        digest (optional): ``hashlib``-style digest fed with the payload as it is
+            packed; its value is stored right after the payload
+
+    Returns:
+        PIL.Image.Image: Image holding the data followed by white pixels
+
+    Raises:
+        ValueError: If the data doesn't fit or the layout has no Pillow mode
+    """
+    mode = get_pixel_mode(pixel_mode)
+    if mode.pil_mode is None:
+        raise ValueError(f"Pixel mode {mode.name} cannot be held in a Pillow image")
+    capacity = width * height * mode.bytes_per_pixel
+    row_bytes = width * mode.bytes_per_pixel
+    data_start = len(header)
+    data_end = data_start + len(data)
+    trailer_end = data_end + (digest.digest_size if digest is not None else 0)
+    if trailer_end > capacity:
+        raise ValueError(f"File too large for image dimensions. "
+                         f"File: {trailer_end} bytes, Image capacity: {capacity} bytes")
+
+    # Zero padding up to the end of the last data pixel
+    padded_end = trailer_end + (-trailer_end) % mode.bytes_per_pixel
+
+    # Pages of a mapped input are dropped once decoded, so they stop counting towards RSS
+    drop_pages = isinstance(data, mmap.mmap) and hasattr(mmap, "MADV_DONTNEED")
+
+    image = Image.new(mode.pil_mode, (width, height), color=mode.white)
+    view = memoryview(data)
+    try:
+        data_rows = -(-padded_end // row_bytes)
+        head_rows = min(-(-data_start // row_bytes), data_rows)
+        tail_start = max(data_end // row_bytes, head_rows)
+        rows_per_block = max(1, block_size // row_bytes)
+
+        # Header rows, then whole payload rows, then the row with the partial pixel
+        blocks = [(0, head_rows)]
+        blocks += [(first, min(first + rows_per_block, tail_start))
+                   for first in range(head_rows, tail_start, rows_per_block)]
+        blocks.append((tail_start, data_rows))
+
+        for first_row, end_row in blocks:
+            if first_row >= end_row:
+                continue
+            start, end = first_row * row_bytes, end_row * row_bytes
+            if digest is not None and start < data_end and end > data_start:
+                digest.update(view[max(start - data_start, 0):end - data_start])
+            if start >= data_start and end <= data_end:
+                rows = view[start - data_start:end - data_start]
+            else:
+                # The whole payload has been hashed once a block reaches the trailer
+                trailer = digest.digest() if digest is not None and end > data_end else b""
+                rows = _assemble_rows(header, view, padded_end, start, end, trailer)
+            image.paste(Image.frombuffer(mode.pil_mode, (width, end_row - first_row), rows,
+                                         "raw", mode.pil_mode, 0, 1),
+                        (0, first_row))
+            del rows
+            
+            consumed = min(end - data_start, len(data)) // mmap.PAGESIZE * mmap.PAGESIZE
+            if drop_pages and consumed > 0:
+                data.madvise(mmap.MADV_DONTNEED, 0, consumed)
+    finally:
+        view.release()
+
+    return image
+
+
+def iter_pixel_blocks(source, payload_length: int, header: bytes, width: int, height: int,
+                      rows_per_block: int, bytes_per_pixel: int = 3, digest=None):
+    """
+    Yield the image's raw scanline bytes in blocks, reading the payload in chunks.
+
+    The rows are laid out exactly as ``pack_bytes_to_image`` lays them out:
+    header, payload, digest trailer, zero padding to a whole pixel, then
+    white pixels. Only one block is held in memory at a time.
+
+    Args:
+        source: Binary file object positioned at the start of the payload
+        payload_length (int): Number of payload bytes to read from ``source``
+        header (bytes): Packed format header placed before the payload
+        width (int): Image width in pixels
+        height (int): Image height in pixels
+        rows_per_block (int): Number of rows per yielded block
+        bytes_per_pixel (int): Bytes per pixel of the layout (3 for RGB)
+        digest (optional): ``hashlib``-style digest fed with the payload as it is read
+
+    Yields:
+        bytearray: Raw pixel bytes for up to ``rows_per_block`` whole rows
+
+    Raises:
+        ValueError: If the source ends before ``payload_length`` bytes were read
+    """
+    row_bytes = width * bytes_per_pixel
+    header_pos = 0
+    remaining = payload_length
+    trailer = None
+    trailer_pos = 0
+    trailer_size = digest.digest_size if digest is not None else 0
+    zero_padding = (-(len(header) + payload_length + trailer_size)) % bytes_per_pixel
+    rows_left = height
+
+    while rows_left > 0:
+        rows = min(rows_left, rows_per_block)
+        block = bytearray(rows * row_bytes)
+        view = memoryview(block)
+
+        # Header bytes first (they may span several blocks for narrow images)
+        pos = min(len(header) - header_pos, len(block))
+        block[:pos] = header[header_pos:header_pos + pos]
+        header_pos += pos
+
+        # Payload straight from the file into the block
+        while remaining and pos < len(block):
+            count = source.readinto(view[pos:pos + min(remaining, len(block) - pos)])
+            if not count:
+                raise ValueError("Input file ended before the expected size")
+            if digest is not None:
+                digest.update(view[pos:pos + count])
+            pos += count
+            remaining -= count
+
+        # Digest trailer once the payload is complete (it may span blocks too)
+        if not remaining and trailer_pos < trailer_size and pos < len(block):
+            if trailer is None:
+                trailer = digest.digest()
+            count = min(trailer_size - trailer_pos, len(block) - pos)
+            block[pos:pos + count] = trailer[trailer_pos:trailer_pos + count]
+            trailer_pos += count
+            pos += count
+
+        # Zero padding (already zero in the block), then white background
+        if not remaining and trailer_pos == trailer_size and pos < len(block):
+            padding = min(zero_padding, len(block) - pos)
+            pos += padding
+            zero_padding -= padding
+            block[pos:] = b'\xff' * (len(block) - pos)
+
+        view.release()
+        rows_left -= rows
+        yield block
+
+
+class _BufferReader:
+    """Minimal ``readinto`` over a bytes-like object, so buffers feed the same row blocks as files."""
+
+    def __init__(self, data):
+        self._view = memoryview(data).cast("B")
+        self._offset = 0
+
+    def readinto(self, buffer) -> int:
+        count = min(len(buffer), len(self._view) - self._offset)
+        buffer[:count] = self._view[self._offset:self._offset + count]
+        self._offset += count
+        return count
+
+    def close(self):
+        self._view.release()
+
+
+def _byte_buffer(data):
+    """``data`` as an object whose ``len`` is its size in bytes."""
+    if isinstance(data, (bytes, bytearray, mmap.mmap)):
+        return data
+    return memoryview(data).cast("B")
+
+
+def _prepare_payload(data, header: bool, compression: str, log, mode: PixelMode,
+                     instrumentation=NULL_INSTRUMENTATION, digest: str = "none",
+                     fec_parity: int = 0, fec_workers: int = None):
+    """
+    Optionally compress and FEC-code an in-memory payload and build its format header.
+
+    Returns:
+        tuple: Payload to pack (``data`` itself or the compressed bytes), the packed
+        header and the running digest to feed while packing (None without one)
+    """
+    input_size = len(data)
+    image_header = ImageHeader(payload_length=input_size)
+    payload = data
+    if digest != "none" and not header:
+        raise ValueError("An integrity digest needs the format header.")
+    running = digest_for(digest, image_header)
+    if compression != "none":
+        if not header:
+            raise ValueError("Pre-encode compression needs the format header.")
+        with instrumentation.stage("compress", input_size):
+            codec, trial = choose_codec(compression, data)
+            compressed = compress_buffer(data, codec, running) if codec is not None else None
+        if compressed is not None and running is not None:
+            # The digest covers the original data, already hashed while compressing
+            running = FixedDigest(running.name, running.digest())
+        if codec is None:
+            log(f"Compression skipped: trial ratio {trial:.2f}")
+        else:
+            log(f"Compressed with {CODEC_NAMES[codec]}: {len(compressed)} bytes "
+                  f"(ratio {len(compressed) / input_size:.2f}, trial {trial:.2f})")
+            if len(compressed) < input_size:
+                add_compression_record(image_header, codec, input_size)
+                image_header.payload_length = len(compressed)
+                payload = compressed
+            else:
+                log("Compression skipped: output is not smaller than the input")
+    if fec_parity:
+        if not header:
+            raise ValueError("Forward error correction needs the format header.")
+        with instrumentation.stage("fec", len(payload)):
+            # Hashes the payload on the way unless compression already did
+            payload = fec_encode_buffer(payload, fec_parity, fec_workers, running)
+        if running is not None:
+            running = FixedDigest(running.name, running.digest())
+        add_fec_record(image_header, fec_parity)
+        image_header.payload_length = len(payload)
+        log(f"FEC: {fec_parity} check bytes per 255-byte block, {len(payload)} bytes coded")
+    return payload, image_header.pack(mode.bytes_per_pixel) if header else b"", running
+
+
+def _plan_image(encoded_length: int, width: int, height: int, log, mode: PixelMode):
+    """
+    Resolve the image dimensions for ``encoded_length`` bytes and check they fit.
+
+    Returns:
+        tuple[int, int, int]: Width, height and the length padded to whole pixels
+    """
+    # Calculate or use provided dimensions
+    if width is None or height is None:
+        width, height = calculate_optimal_dimensions(encoded_length,
+                                                     bytes_per_pixel=mode.bytes_per_pixel)
+        log(f"Auto-calculated dimensions: {width}x{height}")
+    else:
+        log(f"Using provided dimensions: {width}x{height}")
     
-    # Calculate square root for roughly square image
-    side_length = math.ceil(math.sqrt(pixels_needed))
+    # Check if image is large enough
+    max_capacity = width * height * mode.bytes_per_pixel
+    if encoded_length > max_capacity:
+        raise ValueError(f"File too large for image dimensions. "
+                       f"File: {encoded_length} bytes, Image capacity: {max_capacity} bytes")
     
-    # Ensure dimensions don't exceed constraints
-    width = min(side_length, max_width)
-    height = math.ceil(pixels_needed / width)
+    # Padding (to a whole number of pixels, mode.bytes_per_pixel each) is added while packing
+    padding = (-encoded_length) % mode.bytes_per_pixel
+    if padding:
+        log(f"Added {padding} bytes of padding")
+    return width, height, encoded_length + padding
+
+
+def _write_pixels(f, source, payload_length: int, header_bytes: bytes, width: int, height: int,
+                  image_format: str, profile: str, stream: bool, threads: int,
+                  buffer_size: int, log, mode: PixelMode, index_chunk: int = 0,
+                  instrumentation=NULL_INSTRUMENTATION, digest=None):
+    """
+    Write the image container holding a payload to an open binary file.
+
+    Args:
+        source: With ``stream`` a binary file positioned at the payload, otherwise
+            the payload itself as a bytes-like object (e.g. ``bytes`` or an ``mmap``)
+        index_chunk (int): Image bytes per indexed PNG segment, 0 for no index
+        digest (optional): Running digest fed with the payload as it is packed and
+            stored after it
+    """
+    image_bytes = width * height * mode.bytes_per_pixel
+    index_rows = 0
+    head_rows = 0
+    if image_format != "png":
+        if mode.name != "RGB":
+            raise ValueError(f"Pixel mode {mode.name} needs PNG output; "
+                             f"{image_format.upper()} containers hold RGB only")
+        log(f"Output format: uncompressed {image_format.upper()}")
+        if index_chunk:
+            log("Uncompressed containers are random-access; no range index is needed")
+        settings = None
+    else:
+        with instrumentation.stage("sample"):
+            settings = choose_profile(profile, source.name if stream else source, image_bytes)
+        log(f"Compression profile: {settings.describe()}")
+        if index_chunk:
+            # The header rows are stored on their own so appending can rewrite them in place
+            head_rows = -(-len(header_bytes) // (width * mode.bytes_per_pixel))
+            index_rows = max(1, head_rows, index_chunk // (width * mode.bytes_per_pixel))
+            log(f"Range index: a segment every {index_rows} rows")
+    if mode.name != DEFAULT_PIXEL_MODE:
+        log(f"Pixel mode: {mode.name} ({mode.bytes_per_pixel} bytes per pixel)")
     
-    # Ensure height doesn't exceed constraint
-    if height > max_height:
-        height = max_height
-        width = math.ceil(pixels_needed / height)
+    # Filter None, the 16-bit layouts and the range index are only available
+    # through the streaming writer
+    if (settings is not None and not stream and threads <= 1 and settings.adaptive_filter
+            and mode.pil_mode is not None and not index_rows):
+        # The packer reads the payload straight from the buffer
+        with instrumentation.stage("pack", image_bytes):
+            image = pack_bytes_to_image(source, width, height, header_bytes, buffer_size, mode.name,
+                                        digest)
+        with instrumentation.stage("png", image_bytes):
+            image.save(f, format="PNG", compress_level=settings.compress_level,
+                       optimize=settings.optimize)
+        return
     
-    return width, height
+    # Stream row blocks from the input straight into the writer; reading,
+    # packing and compression interleave, so they are timed as one stage
+    rows_per_block = max(1, buffer_size // (width * mode.bytes_per_pixel))
+    reader = source if stream else _BufferReader(source)
+    try:
+        with instrumentation.stage("write", image_bytes):
+            blocks = iter_pixel_blocks(reader, payload_length, header_bytes, width, height,
+                                       rows_per_block, mode.bytes_per_pixel, digest)
+            if settings is None:
+                # Pixel bytes are copied into the container as they are
+                with RawImageWriter(f, image_format, width, height) as writer:
+                    for block in blocks:
+                        writer.write_rows(block)
+                return
+            with PngStreamWriter(f, width, height, mode.color_type, mode.bit_depth,
+                                 compress_level=settings.compress_level,
+                                 buffer_size=buffer_size, threads=threads,
+                                 index_rows=index_rows, head_rows=head_rows) as writer:
+                for block in blocks:
+                    writer.write_rows(block)
+    finally:
+        if not stream:
+            reader.close()
+    log(f"Streamed {height} rows in blocks of {rows_per_block}")
+    if settings.adaptive_filter:
+        log("Streaming writer uses filter None for every scanline")
+    if threads > 1:
+        log(f"Compressed with {threads} deflate threads")
+
+
+def write_encoded_image(data, f, width: int = None, height: int = None, header: bool = True,
+                        buffer_size: int = DEFAULT_BUFFER_SIZE, threads: int = 1,
+                        profile: str = DEFAULT_PROFILE, compression: str = "none",
+                        image_format: str = "png", pixel_mode: str = DEFAULT_PIXEL_MODE,
+                        index_chunk: int = 0, digest: str = "none", fec_parity: int = 0,
+                        fec_workers: int = None, quiet: bool = True,
+                        instrumentation=None) -> "EncodeResult":
+    """
+    Encode an in-memory payload into an image written to an open binary file.
+
+    This is the core that ``encode_file_to_image`` wraps; it takes any object
+    supporting the buffer protocol (``bytes``, ``bytearray``, ``memoryview``,
+    ``mmap``) and never copies the payload into an intermediate buffer.
+
+    Args:
+        data (bytes-like): Payload to encode
+        f (file): Seekable binary file object the image is written to, e.g. ``io.BytesIO``
+        width (int, optional): Image width. Auto-calculated if not provided
+        height (int, optional): Image height. Auto-calculated if not provided
+        header (bool): Write the format header recording the exact payload length
+        buffer_size (int): Approximate bytes handled per step
+        threads (int): Deflate threads for the PNG data
+        profile (str): PNG compression profile, see ``encode_file_to_image``
+        compression (str): Pre-encode compression, see ``encode_file_to_image``
+        image_format (str): ``png``, ``bmp``, ``ppm`` or ``tiff``
+        pixel_mode (str): Pixel layout, see ``encode_file_to_image``
+        index_chunk (int): Range index segment size, see ``encode_file_to_image``
+        digest (str): Integrity digest, see ``encode_file_to_image``
+        fec_parity (int): Reed-Solomon check bytes per block, see ``encode_file_to_image``
+        fec_workers (int, optional): Worker processes for FEC coding. Defaults to the CPU count
+        quiet (bool): Suppress progress output
+        instrumentation (Instrumentation, optional): Receives per-stage timings
+
+    Returns:
+        EncodeResult: What was written (``input_file`` and ``output_image`` are None)
+
+    Raises:
+        ValueError: If the payload is empty or does not fit the given dimensions
+    """
+    log = _silent if quiet else print
+    instrumentation = instrumentation or NULL_INSTRUMENTATION
+    mode = get_pixel_mode(pixel_mode)
+    data = _byte_buffer(data)
+    input_size = len(data)
+    if not input_size:
+        raise ValueError("Input is empty.")
+    if index_chunk and not header:
+        raise ValueError("A range index needs the format header.")
+    
+    with instrumentation.run("encode", image_format=image_format):
+        payload, header_bytes, running = _prepare_payload(data, header, compression, log, mode,
+                                                          instrumentation, digest, fec_parity,
+                                                          fec_workers)
+        trailer_size = running.digest_size if running is not None else 0
+        width, height, padded_length = _plan_image(len(header_bytes) + len(payload) + trailer_size,
+                                                   width, height, log, mode)
+        
+        start = f.tell()
+        _write_pixels(f, payload, len(payload), header_bytes, width, height, image_format,
+                      profile, False, threads, buffer_size, log, mode, index_chunk,
+                      instrumentation, running)
+        output_size = f.tell() - start
+    
+    log(f"Output size: {output_size} bytes (ratio {output_size / padded_length:.2f})")
+    if header:
+        log(f"Wrote {len(header_bytes)}-byte format header")
+    if running is not None:
+        log(f"Integrity digest ({running.name}): {running.hexdigest()}")
+    log(f"Encoded {padded_length} bytes into a {width}x{height} image")
+    
+    return EncodeResult(
+        width=width,
+        height=height,
+        input_size=input_size,
+        payload_length=len(payload),
+        header_length=len(header_bytes),
+        image_format=image_format,
+        output_size=output_size,
+        pixel_mode=mode.name,
+        digest=running.hexdigest() if running is not None else None,
+    )
+
+
+def encode_bytes_to_png(data, width: int = None, height: int = None, header: bool = True,
+                        profile: str = DEFAULT_PROFILE, compression: str = "none",
+                        threads: int = 1, pixel_mode: str = DEFAULT_PIXEL_MODE,
+                        index_chunk: int = 0, digest: str = "none", fec_parity: int = 0) -> bytes:
+    """
+    Encode an in-memory payload into PNG file bytes.
+
+    Args:
+        data (bytes-like): Payload to encode
+        width (int, optional): Image width. Auto-calculated if not provided
+        height (int, optional): Image height. Auto-calculated if not provided
+        header (bool): Write the format header recording the exact payload length
+        profile (str): PNG compression profile
+        compression (str): Pre-encode compression
+        threads (int): Deflate threads
+        pixel_mode (str): Pixel layout: ``L``, ``RGB``, ``RGBA``, ``RGB16`` or ``RGBA16``
+        index_chunk (int): Image bytes per range-index segment, 0 for no index
+        digest (str): Integrity digest: ``none``, ``crc32``, ``sha256`` or ``blake2b``
+        fec_parity (int): Reed-Solomon check bytes per 255-byte block, 0 for no FEC
+
+    Returns:
+        bytes: The complete PNG file
+    """
+    output = io.BytesIO()
+    write_encoded_image(data, output, width, height, header=header, threads=threads,
+                        profile=profile, compression=compression, pixel_mode=pixel_mode,
+                        index_chunk=index_chunk, digest=digest, fec_parity=fec_parity)
+    return output.getvalue()
+
+
+def encode_bytes_to_image(data, width: int = None, height: int = None, header: bool = True,
+                          compression: str = "none", pixel_mode: str = DEFAULT_PIXEL_MODE,
+                          digest: str = "none", fec_parity: int = 0):
+    """
+    Encode an in-memory payload into a PIL image without writing a file.
+
+    Args:
+        data (bytes-like): Payload to encode
+        width (int, optional): Image width. Auto-calculated if not provided
+        height (int, optional): Image height. Auto-calculated if not provided
+        header (bool): Write the format header recording the exact payload length
+        compression (str): Pre-encode compression
+        pixel_mode (str): ``L``, ``RGB`` or ``RGBA`` (Pillow has no 16-bit RGB mode)
+        digest (str): Integrity digest: ``none``, ``crc32``, ``sha256`` or ``blake2b``
+        fec_parity (int): Reed-Solomon check bytes per 255-byte block, 0 for no FEC
+
+    Returns:
+        PIL.Image.Image: Image holding the payload
+
+    Raises:
+        ValueError: If the payload is empty or does not fit the given dimensions
+    """
+    mode = get_pixel_mode(pixel_mode)
+    data = _byte_buffer(data)
+    if not len(data):
+        raise ValueError("Input is empty.")
+    payload, header_bytes, running = _prepare_payload(data, header, compression, _silent, mode,
+                                                      digest=digest, fec_parity=fec_parity)
+    trailer_size = running.digest_size if running is not None else 0
+    width, height, _ = _plan_image(len(header_bytes) + len(payload) + trailer_size, width, height,
+                                   _silent, mode)
+    return pack_bytes_to_image(payload, width, height, header_bytes, pixel_mode=mode.name,
+                               digest=running)
 
 
-def encode_file_to_image(input_file: str, output_image: str, width: int = None, height: int = None):
+def encode_file_to_image(input_file: str, output_image: str, width: int = None, height: int = None,
+                         header: bool = True, stream: bool = False,
+                         buffer_size: int = DEFAULT_BUFFER_SIZE, threads: int = 1,
+                         profile: str = DEFAULT_PROFILE, compression: str = "none",
+                         image_format: str = None, pixel_mode: str = DEFAULT_PIXEL_MODE,
+                         index_chunk: int = 0, digest: str = "none", fec_parity: int = 0,
+                         fec_workers: int = None, cache: FileCache = None, quiet: bool = False,
+                         instrumentation=None) -> "EncodeResult":
     """
     Encode a file into an image by converting bytes to RGB pixel values.
     
+    The input is memory-mapped and handed to ``write_encoded_image``; with
+    ``stream`` it is read in chunks instead.
+    
     Args:
         input_file (str): Path to the input file
         output_image (str): Path for the output image
         width (int, optional): Image width. Auto-calculated if not provided
         height (int, optional): Image height. Auto-calculated if not provided
+        header (bool): Write the format header recording the exact payload length.
+            Disable for images that must decode with pre-header decoders
+        stream (bool): Read the input in chunks and write PNG scanlines
+            incrementally, so memory use is bounded by ``buffer_size``
+            instead of growing with the file size
+        buffer_size (int): Approximate bytes held in memory per stage when streaming
+        threads (int): Deflate threads. Above 1 the IDAT stream is compressed in
+            parallel blocks (this also uses the streaming writer)
+        profile (str): Compression profile, one of ``fast``, ``balanced``, ``small``
+            or ``auto`` (sample the input and skip deflate work it would waste)
+        compression (str): Compress the payload before packing it into pixels:
+            ``none``, ``zlib``, ``lzma``, ``bz2`` or ``auto`` (smallest trial result).
+            Skipped when the trial saves too little. Needs the format header
+        image_format (str, optional): ``png``, or ``bmp``, ``ppm`` or ``tiff`` for an
+            uncompressed container. Defaults to the output file extension
+        pixel_mode (str): Pixel layout: ``RGB`` (3 bytes per pixel), ``RGBA`` (4),
+            ``RGB16`` (6), ``RGBA16`` (8) or ``L`` (1). Denser layouts need fewer
+            pixels and scanlines; the decoder detects the layout. Layouts other
+            than RGB need PNG output, and the 16-bit ones use the streaming writer
+        index_chunk (int): Deflate the PNG in independently decodable segments of
+            about this many image bytes and record where each starts in a
+            ``fiDX`` chunk, so ``decode_image_range`` can read any byte range by
+            inflating only the segments covering it. 0 (default) writes no index.
+            Uses the streaming writer and needs the format header
+        digest (str): Integrity digest of the input: ``none`` (default), ``crc32``,
+            ``sha256`` or ``blake2b``. Computed while the input is packed (or
+            compressed), stored right after the payload and verified by the
+            decoder as it writes the output. Needs the format header
+        fec_parity (int): Reed-Solomon check bytes per 255-byte block (even, 2 to
+            128), so the decoder repairs up to ``fec_parity // 2`` damaged bytes
+            per block, e.g. pixels changed by a lossy pipeline. 0 (default)
+            disables FEC; 32 adds 14%. Applied after compression. Needs the
+            format header
+        fec_workers (int, optional): Worker processes coding FEC blocks in
+            parallel. Defaults to the CPU count
+        cache (FileCache, optional): Encode cache. The input is hashed together
+            with the options that shape the image; on a hit the cached image is
+            copied (or hard-linked) to ``output_image`` instead of encoding, and
+            a newly encoded image is inserted, see ``file_cache.py``
+        quiet (bool): Suppress progress and error output
+        instrumentation (Instrumentation, optional): Receives per-stage timings,
+            byte counts and peak memory, see ``instrumentation.py``
+    
+    Returns:
+        EncodeResult: What was written; ``cached`` is set on a cache hit
     
     Raises:
         FileNotFoundError: If input file doesn't exist
         ValueError: If image dimensions are too small for file size
         IOError: If there's an error reading/writing files
     """
+    log = _silent if quiet else print
+    instrumentation = instrumentation or NULL_INSTRUMENTATION
+    spool_paths = []
     try:
-        # Check if input file exists
-        if not os.path.exists(input_file):
-            raise FileNotFoundError(f"Input file '{input_file}' not found.")
-        
-        # Read the file bytes
-        with open(input_file, "rb") as f:
-            file_bytes = f.read()
-        
-        if not file_bytes:
-            raise ValueError("Input file is empty.")
-        
-        print(f"Input file: {input_file}")
-        print(f"File size: {len(file_bytes)} bytes")
-        
-        # Calculate or use provided dimensions
-        if width is None or height is None:
-            width, height = calculate_optimal_dimensions(len(file_bytes))
-            print(f"Auto-calculated dimensions: {width}x{height}")
-        else:
-            print(f"Using provided dimensions: {width}x{height}")
+        with instrumentation.run("encode", input_file=input_file):
+            # Check if input file exists
+            if not os.path.exists(input_file):
+                raise FileNotFoundError(f"Input file '{input_file}' not found.")
+            
+            file_size = os.path.getsize(input_file)
+            if not file_size:
+                raise ValueError("Input file is empty.")
+            
+            log(f"Input file: {input_file}")
+            log(f"File size: {file_size} bytes")
+            
+            image_format = image_format or format_from_extension(output_image)
+            
+            # Create output directory if it doesn't exist
+            output_path = Path(output_image)
+            output_path.parent.mkdir(parents=True, exist_ok=True)
+            
+            cache_key = None
+            if cache is not None:
+                with instrumentation.stage("cache", file_size):
+                    cache_key = content_key(input_file, {
+                        "width": width, "height": height, "header": header, "stream": stream,
+                        "buffer_size": buffer_size, "threads": threads, "profile": profile,
+                        "compression": compression, "image_format": image_format,
+                        "pixel_mode": pixel_mode, "index_chunk": index_chunk, "digest": digest,
+                        "fec_parity": fec_parity,
+                    }, buffer_size)
+                    cached = cache.fetch(cache_key, output_image)
+                if cached is not None:
+                    result = EncodeResult(**cached)
+                    result.input_file = input_file
+                    result.output_image = output_image
+                    result.cached = True
+                    log(f"Cache hit: image copied from '{cache.directory}'")
+                    log(f"Image written to '{output_image}'")
+                    return result
+                log("Cache miss")
+                if cache.link and os.path.exists(output_image):
+                    # May be a hard link into the cache from an earlier hit
+                    os.remove(output_image)
+            
+            if not stream:
+                # Map the input and encode it as one buffer. The image is written next to
+                # the output and renamed over it, so a failure (e.g. too little capacity)
+                # leaves an existing output as it was
+                temp_image = f"{output_image}.{os.getpid()}.tmp"
+                try:
+                    with open(input_file, "rb") as source, \
+                            mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ) as mapped, \
+                            open(temp_image, "wb") as f:
+                        result = write_encoded_image(mapped, f, width, height, header=header,
+                                                     buffer_size=buffer_size, threads=threads,
+                                                     profile=profile, compression=compression,
+                                                     image_format=image_format,
+                                                     pixel_mode=pixel_mode,
+                                                     index_chunk=index_chunk, digest=digest,
+                                                     fec_parity=fec_parity,
+                                                     fec_workers=fec_workers,
+                                                     quiet=quiet, instrumentation=instrumentation)
+                    os.replace(temp_image, output_image)
+                finally:
+                    if os.path.exists(temp_image):
+                        os.remove(temp_image)
+                result.input_file = input_file
+                result.output_image = output_image
+                log(f"Image written to '{output_image}'")
+                _store_in_cache(cache, cache_key, result, log)
+                return result
+            
+            # Streaming: the optional compressed and FEC-coded payloads are spooled to disk
+            if index_chunk and not header:
+                raise ValueError("A range index needs the format header.")
+            if digest != "none" and not header:
+                raise ValueError("An integrity digest needs the format header.")
+            image_header = ImageHeader(payload_length=file_size)
+            running = digest_for(digest, image_header)
+            source_file = input_file
+            if compression != "none":
+                if not header:
+                    raise ValueError("Pre-encode compression needs the format header.")
+                codec, trial = choose_codec(compression, input_file)
+                if codec is None:
+                    log(f"Compression skipped: trial ratio {trial:.2f}")
+                else:
+                    with instrumentation.stage("compress", file_size), \
+                            tempfile.NamedTemporaryFile(dir=output_path.parent, suffix=".tmp",
+                                                        delete=False) as spool:
+                        spool_paths.append(spool.name)
+                        with open(input_file, "rb") as f:
+                            compressed_size = compress_file(f, spool, codec, buffer_size, running)
+                    if running is not None:
+                        # The digest covers the original file, already hashed while compressing
+                        running = FixedDigest(running.name, running.digest())
+                    log(f"Compressed with {CODEC_NAMES[codec]}: {compressed_size} bytes "
+                          f"(ratio {compressed_size / file_size:.2f}, trial {trial:.2f})")
+                    if compressed_size < file_size:
+                        add_compression_record(image_header, codec, file_size)
+                        image_header.payload_length = compressed_size
+                        source_file = spool.name
+                        file_size = compressed_size
+                    else:
+                        log("Compression skipped: output is not smaller than the input")
+            
+            if fec_parity:
+                if not header:
+                    raise ValueError("Forward error correction needs the format header.")
+                with instrumentation.stage("fec", file_size), \
+                        tempfile.NamedTemporaryFile(dir=output_path.parent, suffix=".tmp",
+                                                    delete=False) as spool:
+                    spool_paths.append(spool.name)
+                    with open(source_file, "rb") as f:
+                        # Hashes the input on the way unless compression already did
+                        file_size = fec_encode_file(f, spool, fec_parity, fec_workers, running)
+                if running is not None:
+                    running = FixedDigest(running.name, running.digest())
+                add_fec_record(image_header, fec_parity)
+                image_header.payload_length = file_size
+                source_file = spool.name
+                log(f"FEC: {fec_parity} check bytes per 255-byte block, {file_size} bytes coded")
+            
+            mode = get_pixel_mode(pixel_mode)
+            header_bytes = image_header.pack(mode.bytes_per_pixel) if header else b""
+            trailer_size = running.digest_size if running is not None else 0
+            width, height, padded_length = _plan_image(len(header_bytes) + file_size + trailer_size,
+                                                       width, height, log, mode)
+            
+            with open(source_file, "rb") as source, open(output_image, "wb") as f:
+                _write_pixels(f, source, file_size, header_bytes, width, height, image_format,
+                              profile, True, threads, buffer_size, log, mode, index_chunk,
+                              instrumentation, running)
+            
+            output_size = os.path.getsize(output_image)
+            log(f"Output size: {output_size} bytes (ratio {output_size / padded_length:.2f})")
+            if header:
+                log(f"Wrote {len(header_bytes)}-byte format header")
+            if running is not None:
+                log(f"Integrity digest ({running.name}): {running.hexdigest()}")
+            log(f"Successfully encoded {padded_length} bytes into '{output_image}'")
+            log(f"Image dimensions: {width}x{height}")
+            
+            result = EncodeResult(
+                input_file=input_file,
+                output_image=output_image,
+                width=width,
+                height=height,
+                input_size=os.path.getsize(input_file),
+                payload_length=file_size,
+                header_length=len(header_bytes),
+                image_format=image_format,
+                output_size=output_size,
+                pixel_mode=mode.name,
+                digest=running.hexdigest() if running is not None else None,
+            )
+            _store_in_cache(cache, cache_key, result, log)
+            return result
         
-        # Check if image is large enough
-        max_capacity = width * height * 3
-        if len(file_bytes) > max_capacity:
-            raise ValueError(f"File too large for image dimensions. "
-                           f"File: {len(file_bytes)} bytes, Image capacity: {max_capacity} bytes")
-        
-        # Add padding if necessary (ensure length is multiple of 3)
-        padded_length = len(file_bytes)
-        if padded_length % 3 != 0:
-            padding = 3 - (padded_length % 3)
-            file_bytes += b'\x00' * padding
-            padded_length = len(file_bytes)
-            print(f"Added {padding} bytes of padding")
-        
-        # Create a new RGB image with white background
-        image = Image.new("RGB", (width, height), color=(255, 255, 255))
-        
-        # Convert bytes to RGB tuples
-        pixel_data = [(file_bytes[i], file_bytes[i+1], file_bytes[i+2])
-                      for i in range(0, len(file_bytes), 3)]
-        
-        # Set pixels in the image
-        for i, color in enumerate(pixel_data):
-            x = i % width
-            y = i // width
-            if y < height:
-                image.putpixel((x, y), color)
-            else:
-                break
+    except Exception as e:
+        log(f"Error encoding file: {e}", file=sys.stderr)
+        raise
+    finally:
+        for spool_path in spool_paths:
+            os.remove(spool_path)
+
+
+@contextmanager
+def _unshared(path: str):
+    """
+    Yield a path whose file can be modified in place without touching other files.
+
+    That is ``path`` itself, unless the file has other hard links, e.g. an
+    image served from an encode cache with ``link=True``: then a private copy
+    next to it is yielded and replaces ``path`` once the block succeeds.
+    """
+    if os.stat(path).st_nlink <= 1:
+        yield path
+        return
+    fd, copy_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix=".tmp")
+    os.close(fd)
+    try:
+        shutil.copyfile(path, copy_path)
+        yield copy_path
+        os.replace(copy_path, path)
+    except BaseException:
+        os.remove(copy_path)
+        raise
+
+
+def _append_payload(source, length: int, sample, output_image: str, profile: str,
+                    buffer_size: int, threads: int, log,
+                    instrumentation=NULL_INSTRUMENTATION) -> "EncodeResult":
+    """
+    Append ``length`` bytes read from ``source`` to the payload of an indexed PNG in place.
+
+    The format header in the stored head rows gets the new payload length,
+    a CRC-32 digest is resumed from its stored value, and the rows from the
+    end of the old payload down are rebuilt like ``iter_pixel_blocks`` lays
+    them out; ``PngAppender`` re-deflates only the segment holding the old
+    end onward. The image grows in height when the old padding is too short.
+    An image with other hard links is extended as a private copy that then
+    replaces it, so the linked files keep their contents.
+
+    Args:
+        source: Object with ``readinto`` yielding the bytes to append
+        length (int): Number of bytes to append
+        sample: File path or buffer the compression profile samples
+    """
+    with _unshared(output_image) as image_path, open(image_path, "r+b") as f:
+        try:
+            appender = PngAppender(f, buffer_size)
+        except ValueError as e:
+            raise ValueError(f"Cannot append to '{output_image}': {e}. "
+                             f"Only PNG images encoded with --index can be appended to.")
+        mode = pixel_mode_for_png(appender.color_type, appender.bit_depth)
+        head = appender.read_rows(0, appender.head_rows)
+        image_header = parse_header(head)
+        if image_header is None:
+            raise ValueError(f"Cannot append to '{output_image}': it has no format header.")
+        if image_header.flags & (FLAG_COMPRESSED | FLAG_FEC):
+            raise ValueError("Cannot append to a compressed or FEC-coded payload.")
+        algorithm = read_digest_record(image_header)
+        if algorithm not in (None, DIGEST_CRC32):
+            raise ValueError(f"Cannot extend a {DIGEST_NAMES[algorithm]} digest; "
+                             f"only crc32 digests can be appended to.")
         
-        # Create output directory if it doesn't exist
-        output_path = Path(output_image)
-        output_path.parent.mkdir(parents=True, exist_ok=True)
+        row_bytes = appender.row_bytes
+        header_length = image_header.header_length
+        end = header_length + image_header.payload_length
+        trailer_size = Crc32.digest_size if algorithm is not None else 0
+        first_row = end // row_bytes
+        old_rows = appender.read_rows(first_row, (end + trailer_size) // row_bytes - first_row + 1)
+        row_offset = end - first_row * row_bytes
+        running = None
+        if algorithm is not None:
+            running = Crc32(int.from_bytes(old_rows[row_offset:row_offset + trailer_size], "big"))
         
-        # Save the image
-        image.save(output_image)
+        image_header.payload_length += length
+        header_bytes = image_header.pack(mode.bytes_per_pixel)
+        if len(header_bytes) != header_length:
+            raise ValueError("Format header changed size while appending")
+        new_head = bytearray(head)
+        new_head[:header_length] = header_bytes
+        # Bytes of the first rewritten row before the appended data, header included
+        prefix = bytearray(old_rows[:row_offset])
+        if first_row * row_bytes < header_length:
+            prefix[:header_length - first_row * row_bytes] = header_bytes[first_row * row_bytes:]
         
-        print(f"Successfully encoded {padded_length} bytes into '{output_image}'")
-        print(f"Image dimensions: {width}x{height}")
+        padded_end = end + length + trailer_size
+        padded_end += (-padded_end) % mode.bytes_per_pixel
+        height = max(appender.height, -(-padded_end // row_bytes))
+        if height > appender.height:
+            log(f"Image grows from {appender.height} to {height} rows")
+        with instrumentation.stage("sample"):
+            settings = choose_profile(profile, sample, length)
+        log(f"Compression profile: {settings.describe()}")
         
+        rows_per_block = max(1, buffer_size // row_bytes)
+        with instrumentation.stage("write", length):
+            blocks = iter_pixel_blocks(source, length, bytes(prefix), appender.width,
+                                       height - first_row, rows_per_block, mode.bytes_per_pixel,
+                                       running)
+            appender.rewrite(new_head, first_row, blocks, height, settings.compress_level,
+                             buffer_size, threads,
+                             spool_dir=os.path.dirname(os.path.abspath(output_image)))
+    
+    segment = min(first_row // appender.index_rows, len(appender.offsets) - 1)
+    log(f"Appended {length} bytes; re-deflated rows {segment * appender.index_rows} to {height} "
+        f"of {appender.width}x{height}")
+    return EncodeResult(
+        output_image=output_image,
+        width=appender.width,
+        height=height,
+        input_size=length,
+        payload_length=image_header.payload_length,
+        header_length=header_length,
+        image_format="png",
+        output_size=os.path.getsize(output_image),
+        pixel_mode=mode.name,
+        digest=running.hexdigest() if running is not None else None,
+    )
+
+
+def append_bytes_to_image(data, output_image: str, profile: str = DEFAULT_PROFILE,
+                          buffer_size: int = DEFAULT_BUFFER_SIZE, threads: int = 1,
+                          quiet: bool = True, instrumentation=None) -> "EncodeResult":
+    """
+    Append an in-memory buffer to the payload of an existing encoded image.
+
+    See ``append_file_to_image``.
+    
+    Args:
+        data (bytes-like): Bytes to append, any buffer-protocol object
+        output_image (str): Image to extend in place
+    
+    Returns:
+        EncodeResult: The extended image; ``input_size`` counts the appended bytes
+    """
+    log = _silent if quiet else print
+    instrumentation = instrumentation or NULL_INSTRUMENTATION
+    try:
+        with instrumentation.run("append", output_image=output_image):
+            data = _byte_buffer(data)
+            reader = _BufferReader(data)
+            try:
+                return _append_payload(reader, len(data), data, output_image, profile,
+                                       buffer_size, threads, log, instrumentation)
+            finally:
+                reader.close()
+    except Exception as e:
+        log(f"Error appending to image: {e}", file=sys.stderr)
+        raise
+
+
+def append_file_to_image(input_file: str, output_image: str, profile: str = DEFAULT_PROFILE,
+                         buffer_size: int = DEFAULT_BUFFER_SIZE, threads: int = 1,
+                         quiet: bool = False, instrumentation=None) -> "EncodeResult":
+    """
+    Append a file's bytes to the payload of an existing encoded image.
+    
+    The image is modified in place, and the work done is proportional to the
+    appended data, not to the image: the image must be a PNG encoded with a
+    range index (``index_chunk``), whose format header rows are stored
+    uncompressed so they can be rewritten where they are. Only the deflate
+    segment holding the old end of the payload and the rows after it are
+    compressed again; every earlier segment is kept byte for byte. The image
+    keeps its width and grows in height when needed. A crc32 digest is
+    extended; compressed or FEC-coded payloads and other digests cannot be
+    appended to. The rewritten segments are spooled next to the image and
+    only copied into it once complete, so an input that fails to read
+    leaves the image unchanged. An image with other hard links (such as an
+    output of an encode cache with ``link=True``) is copied first and the
+    extended copy replaces it, so the other links keep their contents.
+    
+    Args:
+        input_file (str): File holding the bytes to append
+        output_image (str): Image to extend in place
+        profile (str): Compression profile for the rewritten segments, see
+            ``encode_file_to_image``
+        buffer_size (int): Approximate bytes held in memory per stage
+        threads (int): Deflate threads for the rewritten segments
+        quiet (bool): Suppress progress and error output
+        instrumentation (Instrumentation, optional): Receives per-stage timings,
+            byte counts and peak memory, see ``instrumentation.py``
+    
+    Returns:
+        EncodeResult: The extended image; ``input_size`` counts the appended bytes
+    
+    Raises:
+        FileNotFoundError: If the input file or the image doesn't exist
+        ValueError: If the image cannot be appended to
+    """
+    log = _silent if quiet else print
+    instrumentation = instrumentation or NULL_INSTRUMENTATION
+    try:
+        with instrumentation.run("append", input_file=input_file):
+            if not os.path.exists(input_file):
+                raise FileNotFoundError(f"Input file '{input_file}' not found.")
+            if not os.path.exists(output_image):
+                raise FileNotFoundError(f"Image '{output_image}' not found.")
+            length = os.path.getsize(input_file)
+            log(f"Appending {length} bytes from '{input_file}' to '{output_image}'")
+            with open(input_file, "rb") as source:
+                result = _append_payload(source, length, input_file, output_image, profile,
+                                         buffer_size, threads, log, instrumentation)
+            result.input_file = input_file
+            return result
+    except Exception as e:
+        log(f"Error appending to image: {e}", file=sys.stderr)
+        raise
+
+
+def _store_in_cache(cache: FileCache, key: str, result: EncodeResult, log):
+    """Insert a freshly encoded image into the cache; a failure only costs the entry."""
+    if cache is None:
+        return
+    metadata = asdict(result)
+    del metadata["input_file"], metadata["output_image"], metadata["cached"]
+    try:
+        if not cache.store(key, result.output_image, metadata):
+            log(f"Cache: image larger than the {cache.max_size}-byte cap, not stored")
+    except OSError as e:
+        log(f"Cache: could not store the image: {e}", file=sys.stderr)
+
+
+def _encode_shard(input_file: str, shard_path: str, offset: int, size: int) -> str:
+    """
+    Encode one byte range of the input into a standalone shard image.
+
+    Runs in a worker process: the range is read from the input file directly,
+    so only paths and offsets cross the process boundary.
+
+    Returns:
+        str: Hex SHA-256 of the shard's payload
+    """
+    with open(input_file, "rb") as f:
+        f.seek(offset)
+        data = f.read(size)
+    if len(data) != size:
+        raise ValueError(f"Input file ended inside shard at offset {offset}")
+
+    header_bytes = ImageHeader(payload_length=size).pack()
+    width, height = calculate_optimal_dimensions(len(header_bytes) + size)
+    pack_bytes_to_image(data, width, height, header_bytes).save(shard_path, format="PNG")
+    return hashlib.sha256(data).hexdigest()
+
+
+def encode_file_to_shards(input_file: str, manifest_path: str, shard_size: int = DEFAULT_SHARD_SIZE,
+                          workers: int = None):
+    """
+    Encode a file into several shard images plus a JSON manifest.
+
+    The input is split into ranges of at most ``shard_size`` bytes. Each range
+    is encoded into its own image by a pool of worker processes. Shards are
+    written next to the manifest as ``<name>.00000.png``, ``<name>.00001.png``, ...
+
+    Args:
+        input_file (str): Path to the input file
+        manifest_path (str): Path for the JSON manifest
+        shard_size (int): Maximum payload bytes per shard
+        workers (int, optional): Worker processes. Defaults to the CPU count
+
+    Returns:
+        ShardManifest: The manifest that was written
+
+    Raises:
+        FileNotFoundError: If input file doesn't exist
+        ValueError: If the input is empty or the shard size is invalid
+    """
+    try:
+        if not os.path.exists(input_file):
+            raise FileNotFoundError(f"Input file '{input_file}' not found.")
+        if shard_size <= 0:
+            raise ValueError("Shard size must be positive.")
+
+        file_size = os.path.getsize(input_file)
+        if not file_size:
+            raise ValueError("Input file is empty.")
+
+        shard_dir = os.path.dirname(os.path.abspath(manifest_path))
+        os.makedirs(shard_dir, exist_ok=True)
+
+        manifest = ShardManifest(file_size=file_size, shard_size=shard_size)
+        for index, offset in enumerate(range(0, file_size, shard_size)):
+            manifest.shards.append(ShardEntry(
+                index=index,
+                file=shard_file_name(manifest_path, index),
+                offset=offset,
+                size=min(shard_size, file_size - offset),
+            ))
+
+        print(f"Input file: {input_file}")
+        print(f"File size: {file_size} bytes")
+        print(f"Encoding {len(manifest.shards)} shards of up to {shard_size} bytes")
+
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [
+                pool.submit(_encode_shard, input_file, os.path.join(shard_dir, shard.file),
+                            shard.offset, shard.size)
+                for shard in manifest.shards
+            ]
+            for shard, future in zip(manifest.shards, futures):
+                shard.sha256 = future.result()
+
+        manifest.save(manifest_path)
+
+        print(f"Successfully encoded {file_size} bytes into {len(manifest.shards)} shards")
+        print(f"Manifest: '{manifest_path}'")
+        return manifest
+
     except Exception as e:
         print(f"Error encoding file: {e}", file=sys.stderr)
         raise
@@ -143,6 +1224,22 @@ def main():
 Examples:
   python Encode.py input.txt output.png
   python Encode.py data.bin image.png --width 800 --height 600
+  python Encode.py backup.tar backup.png --stream --width 4096
+  python Encode.py backup.tar backup.png --threads 8
+  python Encode.py photos.zip photos.png --profile fast
+  python Encode.py server.log server.png --compress auto
+  python Encode.py backup.tar backup.bmp
+  python Encode.py backup.tar backup.img --format ppm
+  python Encode.py backup.tar backup.png --mode RGBA16
+  python Encode.py backup.tar backup.png --index --index-chunk 256K
+  python Encode.py backup.tar backup.png --digest sha256
+  python Encode.py backup.tar backup.png --fec 32 --workers 8
+  python Encode.py today.log logs.png --append
+  python Encode.py build/app.tar app.png --cache ~/.cache/file_to_image --cache-size 10G
+  python Encode.py "logs/**/*.log" encoded/ --batch --workers 8
+  python Encode.py backup.tar backup.png --metrics-prom /var/lib/node_exporter/encode.prom
+  python Encode.py backup.tar backup.png --trace-memory --cprofile encode.prof
+  python Encode.py backup.tar shards/backup.json --shard-size 64M --workers 16
   python Encode.py Sample/Encode.txt Sample/Encode.png
         """
     )
@@ -173,6 +1270,167 @@ Examples:
         help="Image height (auto-calculated if not provided)"
     )
     
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Stream the input in chunks with bounded memory (for files larger than RAM)"
+    )
+    
+    parser.add_argument(
+        "--buffer-size",
+        type=int,
+        default=DEFAULT_BUFFER_SIZE,
+        help=f"Buffer size in bytes for --stream (default: {DEFAULT_BUFFER_SIZE})"
+    )
+    
+    parser.add_argument(
+        "--threads",
+        type=int,
+        default=1,
+        help="Compress the PNG data with N parallel deflate threads (default: 1)"
+    )
+    
+    parser.add_argument(
+        "--profile",
+        choices=PROFILE_NAMES,
+        default=DEFAULT_PROFILE,
+        help="PNG compression profile; auto samples the input and stores "
+             f"incompressible data without deflate work (default: {DEFAULT_PROFILE})"
+    )
+    
+    parser.add_argument(
+        "--compress",
+        choices=COMPRESSION_CHOICES,
+        default="none",
+        help="Compress the payload before packing it into pixels; auto keeps the "
+             "smallest codec and skips compression when it saves little (default: none)"
+    )
+    
+    parser.add_argument(
+        "--format",
+        choices=IMAGE_FORMATS,
+        help="Output image format; bmp, ppm and tiff are uncompressed containers "
+             "(default: from the output file extension, otherwise png)"
+    )
+    
+    parser.add_argument(
+        "--mode",
+        choices=PIXEL_MODE_NAMES,
+        default=DEFAULT_PIXEL_MODE,
+        help="Pixel layout: L (1 byte per pixel), RGB (3), RGBA (4), RGB16 (6) or RGBA16 (8); "
+             f"denser layouts need fewer pixels (default: {DEFAULT_PIXEL_MODE})"
+    )
+    
+    parser.add_argument(
+        "--index",
+        action="store_true",
+        help="Deflate the PNG in independently decodable segments and store their "
+             "offsets, so Decode.py --range reads a byte range without decoding the whole image"
+    )
+    
+    parser.add_argument(
+        "--index-chunk",
+        type=parse_size,
+        default=DEFAULT_INDEX_CHUNK,
+        help="Image bytes per indexed segment for --index (default: 1M)"
+    )
+    
+    parser.add_argument(
+        "--digest",
+        choices=DIGEST_CHOICES,
+        default="none",
+        help="Store an integrity digest of the input, computed while encoding and "
+             "verified by Decode.py while decoding (default: none)"
+    )
+    
+    parser.add_argument(
+        "--fec",
+        type=int,
+        nargs="?",
+        const=DEFAULT_FEC_PARITY,
+        default=0,
+        metavar="PARITY",
+        help="Add PARITY Reed-Solomon check bytes per 255-byte block so the decoder repairs "
+             f"up to PARITY/2 damaged bytes per block (default with --fec: {DEFAULT_FEC_PARITY})"
+    )
+    
+    parser.add_argument(
+        "--cache",
+        metavar="DIR",
+        help="Encode cache directory: an input already encoded with the same options is "
+             "copied from the cache instead of encoded again"
+    )
+    
+    parser.add_argument(
+        "--cache-size",
+        type=parse_size,
+        default=DEFAULT_CACHE_SIZE,
+        help="Size cap of the encode cache; least recently used images are evicted (default: 1G)"
+    )
+    
+    parser.add_argument(
+        "--cache-link",
+        action="store_true",
+        help="Hard-link images to and from the cache instead of copying them"
+    )
+    
+    parser.add_argument(
+        "--append",
+        action="store_true",
+        help="Append input_file to the payload of output_image, an existing PNG encoded with "
+             "--index; only its last segment is compressed again"
+    )
+    
+    parser.add_argument(
+        "--shard-size",
+        type=parse_size,
+        help="Split the input into shard images of at most this many bytes (e.g. 64M); "
+             "output_image is then the path of the JSON manifest"
+    )
+    
+    parser.add_argument(
+        "--workers",
+        type=int,
+        help="Worker processes for sharded encoding, --batch and --fec (default: CPU count)"
+    )
+    
+    parser.add_argument(
+        "--batch",
+        action="store_true",
+        help="Treat input_file as a directory, glob or @file list and output_image as "
+             "the output directory; every file is encoded across a process pool"
+    )
+    
+    parser.add_argument(
+        "--no-header",
+        action="store_true",
+        help="Omit the format header (for decoders that predate it)"
+    )
+    
+    parser.add_argument(
+        "--metrics-jsonl",
+        metavar="PATH",
+        help="Append per-stage timings and byte counts of the run to a JSON lines file"
+    )
+    
+    parser.add_argument(
+        "--metrics-prom",
+        metavar="PATH",
+        help="Write per-stage metrics to a Prometheus textfile-collector file"
+    )
+    
+    parser.add_argument(
+        "--trace-memory",
+        action="store_true",
+        help="Track peak memory per stage with tracemalloc (slows encoding down)"
+    )
+    
+    parser.add_argument(
+        "--cprofile",
+        metavar="PATH",
+        help="Dump cProfile stats for the run to PATH (--profile selects the PNG compression profile)"
+    )
+    
     parser.add_argument(
         "--version",
         action="version",
@@ -180,16 +1438,89 @@ Examples:
     )
     
     args = parser.parse_args()
+    instrumentation = from_options(args.metrics_jsonl, args.metrics_prom, args.trace_memory)
     
     try:
-        encode_file_to_image(
+        with cprofile_to(args.cprofile):
+            _run_cli(args, instrumentation)
+    except Exception as e:
+        sys.exit(1)
+    if instrumentation.enabled:
+        print_stages(instrumentation)
+
+
+def _run_cli(args, instrumentation):
+    """Run the operation selected on the command line."""
+    cache = FileCache(args.cache, args.cache_size, args.cache_link) if args.cache else None
+    if args.batch:
+        # Imported here: the batch module imports this one
+        from batch import run_batch
+        results = run_batch(
+            "encode",
+            [args.input_file],
+            args.output_image,
+            args.workers,
+            {
+                "header": not args.no_header,
+                "stream": args.stream,
+                "buffer_size": args.buffer_size,
+                "threads": args.threads,
+                "profile": args.profile,
+                "compression": args.compress,
+                "image_format": args.format,
+                "pixel_mode": args.mode,
+                "index_chunk": args.index_chunk if args.index else 0,
+                "digest": args.digest,
+                "fec_parity": args.fec,
+                # Files are already spread across the batch pool
+                "fec_workers": 1,
+                "cache": cache,
+            }
+        )
+        if not all(result.ok for result in results):
+            sys.exit(1)
+        return
+    
+    if args.append:
+        append_file_to_image(
             args.input_file,
             args.output_image,
-            args.width,
-            args.height
+            profile=args.profile,
+            buffer_size=args.buffer_size,
+            threads=args.threads,
+            instrumentation=instrumentation
         )
-    except Exception as e:
-        sys.exit(1)
+        return
+    
+    if args.shard_size:
+        encode_file_to_shards(
+            args.input_file,
+            args.output_image,
+            args.shard_size,
+            args.workers
+        )
+        return
+    
+    encode_file_to_image(
+        args.input_file,
+        args.output_image,
+        args.width,
+        args.height,
+        header=not args.no_header,
+        stream=args.stream,
+        buffer_size=args.buffer_size,
+        threads=args.threads,
+        profile=args.profile,
+        compression=args.compress,
+        image_format=args.format,
+        pixel_mode=args.mode,
+        index_chunk=args.index_chunk if args.index else 0,
+        digest=args.digest,
+        fec_parity=args.fec,
+        fec_workers=args.workers,
+        cache=cache,
+        instrumentation=instrumentation
+    )
 
 
 if __name__ == "__main__":
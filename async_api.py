@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+asyncio API for encoding and decoding inside async services.
+
+``encode_file_to_image`` and ``decode_image_to_file`` block for the whole
+operation. The coroutines here run them on an executor so the event loop
+stays responsive, bound how many run at once, support cancellation and
+return structured results instead of printing.
+
+Pillow and zlib release the GIL while compressing and decompressing, so the
+default thread pool gives real parallelism; a ``ProcessPoolExecutor`` can be
+passed instead for fully CPU-bound workloads.
+
+Example:
+    async with AsyncFileImageCodec(max_concurrency=8) as codec:
+        result = await codec.encode("upload.bin", "upload.png")
+        print(result.width, result.height)
+
+Cancellation: a request still waiting for a slot or queued on the executor
+never starts. One already running cannot be interrupted mid-call; it is
+allowed to finish in the background and its partial output is removed. It
+keeps its slot until it finishes, so ``max_concurrency`` holds even then.
+"""
+
+import asyncio
+import functools
+import os
+from concurrent.futures import Executor, ThreadPoolExecutor
+
+from Decode import DecodeResult, decode_image_to_file
+from Encode import EncodeResult, encode_file_to_image
+
+DEFAULT_MAX_CONCURRENCY = 4
+
+
+def _remove_quietly(path: str):
+    """Remove a partial output file, ignoring a file that was never created."""
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def _release_soon(loop, limiter: asyncio.Semaphore):
+    """Release a slot on the loop from an executor thread, unless the loop is already closed."""
+    try:
+        loop.call_soon_threadsafe(limiter.release)
+    except RuntimeError:
+        pass
+
+
+class AsyncFileImageCodec:
+    """
+    Bounded-concurrency async front end for the encoder and decoder.
+
+    Attributes:
+        max_concurrency (int): Operations allowed to run at the same time
+    """
+
+    def __init__(self, max_concurrency: int = DEFAULT_MAX_CONCURRENCY, executor: Executor = None):
+        """
+        Args:
+            max_concurrency (int): Operations allowed to run at the same time;
+                further requests wait without blocking the loop
+            executor (Executor, optional): Executor for the blocking work. By default
+                a thread pool of ``max_concurrency`` workers owned by this codec
+
+        Raises:
+            ValueError: If ``max_concurrency`` is not positive
+        """
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency must be at least 1")
+        self.max_concurrency = max_concurrency
+        self._owns_executor = executor is None
+        self._executor = executor or ThreadPoolExecutor(max_workers=max_concurrency,
+                                                        thread_name_prefix="file-to-image")
+        self._limiter = None
+
+    async def encode(self, input_file: str, output_image: str, **options) -> EncodeResult:
+        """
+        Encode a file into an image without blocking the event loop.
+
+        Args:
+            input_file (str): Path to the input file
+            output_image (str): Path for the output image
+            **options: Keyword arguments for ``encode_file_to_image``
+
+        Returns:
+            EncodeResult: What was written
+
+        Raises:
+            asyncio.CancelledError: If the request was cancelled
+            Exception: Whatever ``encode_file_to_image`` raised
+        """
+        call = functools.partial(encode_file_to_image, input_file, output_image, quiet=True, **options)
+        return await self._run(call, output_image)
+
+    async def decode(self, input_image: str, output_file: str, **options) -> DecodeResult:
+        """
+        Decode an image back to a file without blocking the event loop.
+
+        Args:
+            input_image (str): Path to the input image
+            output_file (str): Path for the output file
+            **options: Keyword arguments for ``decode_image_to_file``
+
+        Returns:
+            DecodeResult: What was written
+
+        Raises:
+            asyncio.CancelledError: If the request was cancelled
+            Exception: Whatever ``decode_image_to_file`` raised
+        """
+        call = functools.partial(decode_image_to_file, input_image, output_file, quiet=True, **options)
+        return await self._run(call, output_file)
+
+    async def _run(self, call, output_path: str):
+        # Created lazily so the semaphore belongs to the running loop
+        if self._limiter is None:
+            self._limiter = asyncio.Semaphore(self.max_concurrency)
+
+        await self._limiter.acquire()
+        try:
+            future = self._executor.submit(call)
+        except BaseException:
+            self._limiter.release()
+            raise
+        # The slot is freed when the job ends, not when its caller stops waiting,
+        # so a cancelled call still running keeps counting against the limit
+        loop = asyncio.get_running_loop()
+        future.add_done_callback(lambda _: _release_soon(loop, self._limiter))
+        try:
+            return await asyncio.wrap_future(future)
+        except asyncio.CancelledError:
+            if not future.cancel():
+                # Already running: let it finish, then discard what it wrote
+                future.add_done_callback(lambda _: _remove_quietly(output_path))
+            raise
+
+    def close(self):
+        """Shut down the owned executor, waiting for running operations."""
+        if self._owns_executor:
+            self._executor.shutdown(wait=True)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await asyncio.get_running_loop().run_in_executor(None, self.close)
+        return False
+
+
+async def encode_file_async(input_file: str, output_image: str,
+                            codec: AsyncFileImageCodec = None, **options) -> EncodeResult:
+    """
+    Encode a file into an image on an executor.
+
+    Args:
+        input_file (str): Path to the input file
+        output_image (str): Path for the output image
+        codec (AsyncFileImageCodec, optional): Shared codec whose limiter and executor
+            to use. Without one a single-use codec is created
+        **options: Keyword arguments for ``encode_file_to_image``
+
+    Returns:
+        EncodeResult: What was written
+    """
+    if codec is not None:
+        return await codec.encode(input_file, output_image, **options)
+    async with AsyncFileImageCodec(max_concurrency=1) as own_codec:
+        return await own_codec.encode(input_file, output_image, **options)
+
+
+async def decode_image_async(input_image: str, output_file: str,
+                             codec: AsyncFileImageCodec = None, **options) -> DecodeResult:
+    """
+    Decode an image back to a file on an executor.
+
+    Args:
+        input_image (str): Path to the input image
+        output_file (str): Path for the output file
+        codec (AsyncFileImageCodec, optional): Shared codec whose limiter and executor
+            to use. Without one a single-use codec is created
+        **options: Keyword arguments for ``decode_image_to_file``
+
+    Returns:
+        DecodeResult: What was written
+    """
+    if codec is not None:
+        return await codec.decode(input_image, output_file, **options)
+    async with AsyncFileImageCodec(max_concurrency=1) as own_codec:
+        return await own_codec.decode(input_image, output_file, **options)
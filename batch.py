@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""
+Batch encoding and decoding across a process pool.
+
+Encodes or decodes many files in one run instead of one interpreter (and one
+Pillow import) per file. Inputs can be directories (walked recursively),
+glob patterns (``**`` supported) or file lists (``@list.txt``, one path per
+line). The directory layout below each input is mirrored in the output
+directory. A failing file is reported and the run carries on; a summary
+with per-file timings and aggregate throughput is printed at the end.
+
+Usage:
+    python batch.py encode SOURCE [SOURCE ...] -o OUTPUT_DIR [--workers N]
+    python batch.py decode SOURCE [SOURCE ...] -o OUTPUT_DIR [--workers N]
+
+Example:
+    python batch.py encode logs/ "exports/**/*.csv" @extra.txt -o encoded/ --workers 8
+    python batch.py decode encoded/ -o restored/
+"""
+
+import argparse
+import glob
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
+from typing import Dict, List, Tuple
+
+from Decode import decode_image_to_file
+from Encode import encode_file_to_image
+
+# Extensions recognised as encoded images when decoding a directory or glob
+IMAGE_EXTENSIONS = (".png", ".bmp", ".dib", ".ppm", ".pnm", ".tif", ".tiff")
+
+_GLOB_CHARACTERS = "*?["
+
+
+@dataclass
+class BatchResult:
+    """
+    Outcome of one file in a batch.
+
+    Attributes:
+        input_path (str): File that was processed
+        output_path (str): File that was written
+        ok (bool): Whether the file was processed successfully
+        seconds (float): Time spent on the file
+        size (int): Payload bytes (input size when encoding, output size when decoding)
+        error (str): Error message for a failed file
+    """
+    input_path: str
+    output_path: str
+    ok: bool
+    seconds: float
+    size: int = 0
+    error: str = ""
+
+
+def _glob_base(pattern: str) -> str:
+    """Leading directory of a glob pattern that contains no wildcards."""
+    parts = []
+    for part in os.path.normpath(pattern).split(os.sep):
+        if any(character in part for character in _GLOB_CHARACTERS):
+            break
+        parts.append(part)
+    return os.sep.join(parts) or "."
+
+
+def collect_inputs(sources: List[str], mode: str = "encode") -> List[Tuple[str, str]]:
+    """
+    Expand directories, globs and ``@file lists`` into individual files.
+
+    Args:
+        sources (list[str]): Input directories, glob patterns, files or ``@list`` files
+        mode (str): ``encode`` takes every file found in directories and globs;
+            ``decode`` only takes files with an image extension
+
+    Returns:
+        list[tuple[str, str]]: Input path and the relative path to mirror, in input order
+
+    Raises:
+        FileNotFoundError: If a source matches nothing
+    """
+    def wanted(path):
+        return mode == "encode" or path.lower().endswith(IMAGE_EXTENSIONS)
+
+    inputs = []
+    for source in sources:
+        if source.startswith("@"):
+            with open(source[1:], "r", encoding="utf-8") as f:
+                for line in f:
+                    path = line.strip()
+                    if path and not path.startswith("#"):
+                        relative = os.path.basename(path) if os.path.isabs(path) else os.path.normpath(path)
+                        inputs.append((path, relative))
+        elif os.path.isdir(source):
+            for root, dirs, files in os.walk(source):
+                dirs.sort()
+                for name in sorted(files):
+                    path = os.path.join(root, name)
+                    if wanted(path):
+                        inputs.append((path, os.path.relpath(path, source)))
+        elif any(character in source for character in _GLOB_CHARACTERS):
+            base = _glob_base(source)
+            matches = [path for path in sorted(glob.glob(source, recursive=True))
+                       if os.path.isfile(path) and wanted(path)]
+            if not matches:
+                raise FileNotFoundError(f"No files match '{source}'")
+            inputs.extend((path, os.path.relpath(path, base)) for path in matches)
+        elif os.path.isfile(source):
+            inputs.append((source, os.path.basename(source)))
+        else:
+            raise FileNotFoundError(f"Input '{source}' not found.")
+    return inputs
+
+
+def output_path_for(relative: str, output_dir: str, mode: str, extension: str = ".png") -> str:
+    """
+    Output path mirroring ``relative`` below ``output_dir``.
+
+    Encoding appends the image extension (``notes.txt`` -> ``notes.txt.png``);
+    decoding strips it again, or appends ``.out`` if the name has none.
+    """
+    if mode == "encode":
+        name = relative + extension
+    else:
+        stem, image_extension = os.path.splitext(relative)
+        name = stem if image_extension.lower() in IMAGE_EXTENSIONS else relative + ".out"
+    return os.path.join(output_dir, name)
+
+
+def _process_file(mode: str, input_path: str, output_path: str, options: Dict) -> BatchResult:
+    """Encode or decode one file in a worker process, capturing its errors."""
+    start = time.perf_counter()
+    try:
+        # Per-file progress output would interleave across workers
+        if mode == "encode":
+            size = encode_file_to_image(input_path, output_path, quiet=True, **options).input_size
+        else:
+            size = decode_image_to_file(input_path, output_path, quiet=True, **options).data_length
+    except Exception as e:
+        return BatchResult(input_path, output_path, False, time.perf_counter() - start, error=str(e))
+    return BatchResult(input_path, output_path, True, time.perf_counter() - start, size)
+
+
+def print_summary(mode: str, results: List[BatchResult], elapsed: float):
+    """Print per-file timings and aggregate throughput for a finished batch."""
+    failed = [result for result in results if not result.ok]
+    total_size = sum(result.size for result in results)
+
+    print(f"\nBatch {mode}: {len(results)} files, {len(results) - len(failed)} succeeded, "
+          f"{len(failed)} failed in {elapsed:.2f}s")
+    for result in sorted(results, key=lambda result: result.input_path):
+        status = f"{result.size / 1e6:10.2f} MB" if result.ok else "    FAILED   "
+        print(f"  {result.seconds:8.3f}s {status}  {result.input_path}")
+        if not result.ok:
+            print(f"             {result.error}")
+    rate = total_size / elapsed / 1e6 if elapsed > 0 else 0.0
+    print(f"Total: {total_size / 1e6:.2f} MB at {rate:.2f} MB/s")
+
+
+def run_batch(mode: str, sources: List[str], output_dir: str, workers: int = None,
+              options: Dict = None) -> List[BatchResult]:
+    """
+    Encode or decode every file found in ``sources`` across a process pool.
+
+    Args:
+        mode (str): ``encode`` or ``decode``
+        sources (list[str]): Input directories, glob patterns, files or ``@list`` files
+        output_dir (str): Directory that receives the mirrored output tree
+        workers (int, optional): Worker processes. Defaults to the CPU count
+        options (dict, optional): Keyword arguments for ``encode_file_to_image``
+            or ``decode_image_to_file``
+
+    Returns:
+        list[BatchResult]: One result per file, in input order
+
+    Raises:
+        ValueError: If the mode is unknown or no input files were found
+        FileNotFoundError: If a source does not exist
+    """
+    try:
+        if mode not in ("encode", "decode"):
+            raise ValueError(f"Unknown batch mode '{mode}'")
+        options = dict(options or {})
+
+        inputs = collect_inputs(sources, mode)
+        if not inputs:
+            raise ValueError("No input files found.")
+
+        extension = "." + options["image_format"] if options.get("image_format") else ".png"
+        jobs = [(path, output_path_for(relative, output_dir, mode, extension))
+                for path, relative in inputs]
+
+        print(f"Batch {mode}: {len(jobs)} files -> '{output_dir}'")
+        start = time.perf_counter()
+        results = [None] * len(jobs)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {
+                pool.submit(_process_file, mode, path, output_path, options): index
+                for index, (path, output_path) in enumerate(jobs)
+            }
+            for done, future in enumerate(as_completed(futures), 1):
+                result = future.result()
+                results[futures[future]] = result
+                status = "ok" if result.ok else "FAILED"
+                print(f"[{done}/{len(jobs)}] {status} {result.input_path} ({result.seconds:.2f}s)")
+
+        print_summary(mode, results, time.perf_counter() - start)
+        return results
+
+    except Exception as e:
+        print(f"Error in batch {mode}: {e}", file=sys.stderr)
+        raise
+
+
+def main():
+    """
+    Main function to handle command-line arguments and run a batch.
+    """
+    parser = argparse.ArgumentParser(
+        description="Encode or decode many files across a process pool",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Sources may be directories (walked recursively), glob patterns or
+@file lists with one path per line. The layout below each source is
+mirrored in the output directory.
+
+Examples:
+  python batch.py encode logs/ -o encoded/
+  python batch.py encode "exports/**/*.csv" @extra.txt -o encoded/ --workers 8
+  python batch.py decode encoded/ -o restored/
+        """
+    )
+
+    parser.add_argument("mode", choices=("encode", "decode"), help="Operation to run on every file")
+    parser.add_argument("sources", nargs="+", help="Input directories, globs, files or @file lists")
+    parser.add_argument("-o", "--output-dir", required=True, help="Directory for the mirrored output")
+    parser.add_argument("--workers", type=int, help="Worker processes (default: CPU count)")
+
+    args = parser.parse_args()
+
+    try:
+        results = run_batch(args.mode, args.sources, args.output_dir, args.workers)
+    except Exception:
+        sys.exit(1)
+    if not all(result.ok for result in results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Event-loop lag benchmark for the asyncio API.
+
+Runs a burst of concurrent encode+decode requests while a monitor task
+measures how late its timer wake-ups fire (loop lag). The same workload is
+run once by calling the blocking functions straight from coroutines, and
+once through ``AsyncFileImageCodec``; p50/p99/max lag and total time are
+reported for both.
+
+Usage:
+    python benchmarks/bench_async.py [--requests N] [--size KB] [--concurrency N]
+"""
+
+import argparse
+import asyncio
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from async_api import AsyncFileImageCodec
+from Decode import decode_image_to_file
+from Encode import encode_file_to_image
+
+MONITOR_INTERVAL = 0.005
+
+
+async def monitor_lag(lags: list, stop: asyncio.Event):
+    """Record how late each timer wake-up fires until ``stop`` is set."""
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        expected = loop.time() + MONITOR_INTERVAL
+        await asyncio.sleep(MONITOR_INTERVAL)
+        lags.append(max(0.0, loop.time() - expected))
+
+
+async def blocking_request(path: str):
+    """The pre-async way: call the blocking functions on the loop thread."""
+    encode_file_to_image(path, path + ".png", quiet=True)
+    decode_image_to_file(path + ".png", path + ".out", quiet=True)
+
+
+async def async_request(codec: AsyncFileImageCodec, path: str):
+    """The same request through the async API."""
+    await codec.encode(path, path + ".png")
+    await codec.decode(path + ".png", path + ".out")
+
+
+async def measure(make_request, paths):
+    """Run all requests concurrently; return (seconds, lag samples)."""
+    lags = []
+    stop = asyncio.Event()
+    monitor = asyncio.ensure_future(monitor_lag(lags, stop))
+    await asyncio.sleep(MONITOR_INTERVAL * 2)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(make_request(path) for path in paths))
+    elapsed = time.perf_counter() - start
+
+    stop.set()
+    await monitor
+    return elapsed, lags
+
+
+def report(name: str, elapsed: float, lags: list):
+    """Print total time and loop-lag percentiles."""
+    lags_ms = sorted(lag * 1000 for lag in lags) or [0.0]
+    p99 = lags_ms[min(len(lags_ms) - 1, int(len(lags_ms) * 0.99))]
+    print(f"{name:9s} total {elapsed:7.2f}s  loop lag p50 {statistics.median(lags_ms):8.2f} ms  "
+          f"p99 {p99:8.2f} ms  max {lags_ms[-1]:8.2f} ms  ({len(lags_ms)} samples)")
+
+
+async def run(paths, concurrency: int):
+    elapsed, lags = await measure(blocking_request, paths)
+    report("blocking", elapsed, lags)
+
+    async with AsyncFileImageCodec(max_concurrency=concurrency) as codec:
+        elapsed, lags = await measure(lambda path: async_request(codec, path), paths)
+    report("async", elapsed, lags)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark event-loop lag of the asyncio API")
+    parser.add_argument("--requests", type=int, default=200, help="Concurrent requests (default: 200)")
+    parser.add_argument("--size", type=int, default=256, help="Payload size per request in KB (default: 256)")
+    parser.add_argument("--concurrency", type=int, default=os.cpu_count() or 4,
+                        help="Codec max_concurrency (default: CPU count)")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp()
+    try:
+        paths = []
+        for index in range(args.requests):
+            path = os.path.join(work_dir, f"request{index}.bin")
+            with open(path, "wb") as f:
+                f.write(os.urandom(args.size * 1024))
+            paths.append(path)
+
+        print(f"{args.requests} requests of {args.size} KB, concurrency {args.concurrency}")
+        asyncio.run(run(paths, args.concurrency))
+    finally:
+        shutil.rmtree(work_dir)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Pre-encode compression benchmark.
+
+Encodes and decodes the same input once per codec and reports end-to-end
+time and image size, so the cost of each codec can be weighed against the
+pixels (and PNG deflate work) it saves.
+
+Usage:
+    python benchmarks/bench_codecs.py [--input FILE] [--size MB]
+
+Without ``--input`` a synthetic log file of ``--size`` MB is generated.
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from compression import COMPRESSION_CHOICES
+from Decode import decode_image_to_file
+from Encode import encode_file_to_image
+
+
+def synthetic_log(path: str, size: int):
+    """Write a log-like text file of about ``size`` bytes."""
+    with open(path, "wb") as f:
+        written = line = 0
+        while written < size:
+            record = (f"2025-10-03T12:{line // 60 % 60:02d}:{line % 60:02d} INFO "
+                      f"worker-{line % 16} served GET /api/items/{line * 7919 % 100000} "
+                      f"status=200 bytes={line * 31 % 65536}\n").encode()
+            written += f.write(record)
+            line += 1
+
+
+def run(input_file: str, work_dir: str, codec: str):
+    """Return (encode seconds, decode seconds, image bytes, round-trip ok) for one codec."""
+    image = os.path.join(work_dir, f"{codec}.png")
+    output = os.path.join(work_dir, f"{codec}.out")
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        encode_file_to_image(input_file, image, compression=codec)
+        encoded = time.perf_counter()
+        decode_image_to_file(image, output)
+        decoded = time.perf_counter()
+
+    with open(input_file, "rb") as a, open(output, "rb") as b:
+        identical = a.read() == b.read()
+    return encoded - start, decoded - encoded, os.path.getsize(image), identical
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark pre-encode compression codecs")
+    parser.add_argument("--input", help="File to encode (default: synthetic log)")
+    parser.add_argument("--size", type=float, default=20, help="Synthetic input size in MB (default: 20)")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp()
+    try:
+        input_file = args.input
+        if input_file is None:
+            input_file = os.path.join(work_dir, "input.log")
+            synthetic_log(input_file, int(args.size * 1024 * 1024))
+        input_size = os.path.getsize(input_file)
+        print(f"input: {input_file} ({input_size / 1e6:.1f} MB)")
+
+        ok = True
+        for codec in COMPRESSION_CHOICES:
+            encode_time, decode_time, image_size, identical = run(input_file, work_dir, codec)
+            ok = ok and identical
+            print(f"{codec:5s}  encode {encode_time:7.3f}s  decode {decode_time:7.3f}s  "
+                  f"total {encode_time + decode_time:7.3f}s  image {image_size / 1e6:8.2f} MB  "
+                  f"({image_size / input_size:5.1%})  round-trip: {identical}")
+    finally:
+        shutil.rmtree(work_dir)
+
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Encoder pixel-packing benchmark.
+
+Compares the legacy per-pixel ``putpixel`` loop against the bulk
+``pack_bytes_to_image`` path and checks that both produce byte-identical PNGs.
+
+Usage:
+    python benchmarks/bench_encode.py [--size MB] [--legacy-size MB]
+
+The legacy loop is far too slow to run at 100 MB, so it is measured on a
+smaller payload and compared by throughput (MB/s).
+"""
+
+import argparse
+import io
+import os
+import sys
+import time
+
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Encode import calculate_optimal_dimensions, pack_bytes_to_image
+
+
+def legacy_pack(data: bytes, width: int, height: int):
+    """Reference implementation: the original putpixel loop."""
+    image = Image.new("RGB", (width, height), color=(255, 255, 255))
+    pixel_data = [(data[i], data[i+1], data[i+2]) for i in range(0, len(data), 3)]
+    for i, color in enumerate(pixel_data):
+        image.putpixel((i % width, i // width), color)
+    return image
+
+
+def square_dimensions(size: int):
+    """Auto-sized dimensions for the payload."""
+    return calculate_optimal_dimensions(size)
+
+
+def time_pack(pack, data: bytes):
+    """Return (seconds, image) for one packing run."""
+    width, height = square_dimensions(len(data))
+    start = time.perf_counter()
+    image = pack(data, width, height)
+    return time.perf_counter() - start, image
+
+
+def png_bytes(image) -> bytes:
+    """Serialize an image to PNG in memory."""
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark encoder pixel packing")
+    parser.add_argument("--size", type=float, default=100, help="Bulk payload size in MB (default: 100)")
+    parser.add_argument("--legacy-size", type=float, default=2, help="Legacy payload size in MB (default: 2)")
+    args = parser.parse_args()
+
+    bulk_size = int(args.size * 1024 * 1024) // 3 * 3
+    legacy_size = int(args.legacy_size * 1024 * 1024) // 3 * 3
+
+    # Identical output check on the legacy-sized payload
+    data = os.urandom(legacy_size)
+    legacy_time, legacy_image = time_pack(legacy_pack, data)
+    _, bulk_image = time_pack(pack_bytes_to_image, data)
+    identical = png_bytes(legacy_image) == png_bytes(bulk_image)
+
+    data = os.urandom(bulk_size)
+    bulk_time, _ = time_pack(pack_bytes_to_image, data)
+
+    legacy_rate = legacy_size / legacy_time / 1e6
+    bulk_rate = bulk_size / bulk_time / 1e6
+
+    print(f"legacy putpixel: {legacy_size / 1e6:8.1f} MB in {legacy_time:8.3f}s  {legacy_rate:10.1f} MB/s")
+    print(f"bulk frombytes:  {bulk_size / 1e6:8.1f} MB in {bulk_time:8.3f}s  {bulk_rate:10.1f} MB/s")
+    print(f"speedup: {bulk_rate / legacy_rate:.0f}x")
+    print(f"byte-identical PNG: {identical}")
+
+    return 0 if identical else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Forward error correction benchmark.
+
+Encodes and decodes one payload without FEC and with several parity sizes,
+and reports the time, the coded size and the slowdown against plain
+encoding, so the cost of each repair budget can be weighed. A second pass
+damages pixels and times the repairing decode.
+
+Usage:
+    python benchmarks/bench_fec.py [--size MB] [--parity N [N ...]] [--workers N]
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Decode import decode_image_to_file
+from Encode import encode_file_to_image
+
+
+def damage_pixels(image_path: str, every: int):
+    """Blacken every ``every``-th pixel of the image's data rows."""
+    with Image.open(image_path) as original:
+        image = original.convert("RGB")
+    width, height = image.size
+    for pixel in range(every // 2, width * height, every):
+        image.putpixel((pixel % width, pixel // width), (0, 0, 0))
+    image.save(image_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark forward error correction")
+    parser.add_argument("--size", type=float, default=16, help="Payload size in MB (default: 16)")
+    parser.add_argument("--parity", type=int, nargs="+", default=[8, 16, 32],
+                        help="Check bytes per block to compare (default: 8 16 32)")
+    parser.add_argument("--workers", type=int, help="FEC worker processes (default: CPU count)")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp()
+    try:
+        input_file = os.path.join(work_dir, "input.bin")
+        output_file = os.path.join(work_dir, "output.bin")
+        data = os.urandom(int(args.size * 1024 * 1024))
+        with open(input_file, "wb") as f:
+            f.write(data)
+
+        print(f"{len(data) / 1e6:.1f} MB random payload, {args.workers or os.cpu_count()} FEC workers")
+        print(f"{'parity':>6s} {'PNG MB':>8s} {'encode s':>9s} {'x plain':>8s} {'decode s':>9s} "
+              f"{'x plain':>8s} {'repair s':>9s} {'blocks':>8s}")
+        plain = None
+        for parity in [0] + args.parity:
+            image = os.path.join(work_dir, f"fec{parity}.png")
+            start = time.perf_counter()
+            result = encode_file_to_image(input_file, image, fec_parity=parity,
+                                          fec_workers=args.workers, quiet=True)
+            encode_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            decode_image_to_file(image, output_file, fec_workers=args.workers, quiet=True)
+            decode_time = time.perf_counter() - start
+            with open(output_file, "rb") as f:
+                if f.read() != data:
+                    raise SystemExit(f"parity {parity}: round trip mismatch")
+
+            repair_time, repaired = 0.0, 0
+            if parity:
+                damage_pixels(image, 997)
+                start = time.perf_counter()
+                repaired = decode_image_to_file(image, output_file, fec_workers=args.workers,
+                                                quiet=True).corrected_blocks
+                repair_time = time.perf_counter() - start
+                with open(output_file, "rb") as f:
+                    if f.read() != data:
+                        raise SystemExit(f"parity {parity}: repair mismatch")
+            plain = plain or (encode_time, decode_time)
+
+            print(f"{parity:6d} {result.output_size / 1e6:8.2f} {encode_time:9.3f} "
+                  f"{encode_time / plain[0]:8.2f} {decode_time:9.3f} {decode_time / plain[1]:8.2f} "
+                  f"{repair_time:9.3f} {repaired:8d}")
+            os.remove(image)
+    finally:
+        shutil.rmtree(work_dir)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
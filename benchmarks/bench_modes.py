@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Pixel-mode benchmark.
+
+Encodes and decodes the same payload in every pixel layout and reports the
+image dimensions, PNG size and encode/decode time, so the density gain of
+RGBA and the 16-bit layouts can be weighed against their cost.
+
+Usage:
+    python benchmarks/bench_modes.py [--size MB] [--content random|text] [--stream]
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Decode import decode_image_to_file
+from Encode import encode_file_to_image
+from pixel_modes import PIXEL_MODE_NAMES
+
+
+def make_payload(size: int, content: str) -> bytes:
+    """Random bytes, or repetitive text that PNG compression can shrink."""
+    if content == "text":
+        line = b"The quick brown fox jumps over the lazy dog. 0123456789\n"
+        return (line * (size // len(line) + 1))[:size]
+    return os.urandom(size)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark encoding and decoding per pixel mode")
+    parser.add_argument("--size", type=float, default=16, help="Payload size in MB (default: 16)")
+    parser.add_argument("--content", choices=["random", "text"], default="random",
+                        help="Payload content (default: random)")
+    parser.add_argument("--stream", action="store_true", help="Use the streaming encoder and decoder")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp()
+    try:
+        input_file = os.path.join(work_dir, "input.bin")
+        output_file = os.path.join(work_dir, "output.bin")
+        data = make_payload(int(args.size * 1024 * 1024), args.content)
+        with open(input_file, "wb") as f:
+            f.write(data)
+
+        print(f"{len(data) / 1e6:.1f} MB {args.content} payload, "
+              f"{'streaming' if args.stream else 'bulk'} codec")
+        print(f"{'mode':7s} {'dimensions':>13s} {'pixels':>10s} {'PNG MB':>8s} "
+              f"{'encode s':>9s} {'decode s':>9s}")
+        for name in PIXEL_MODE_NAMES:
+            image = os.path.join(work_dir, f"{name}.png")
+            start = time.perf_counter()
+            result = encode_file_to_image(input_file, image, stream=args.stream, pixel_mode=name,
+                                          quiet=True)
+            encode_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            decode_image_to_file(image, output_file, stream=args.stream, quiet=True)
+            decode_time = time.perf_counter() - start
+
+            with open(output_file, "rb") as f:
+                if f.read() != data:
+                    raise SystemExit(f"{name}: round trip mismatch")
+            dimensions = f"{result.width}x{result.height}"
+            print(f"{name:7s} {dimensions:>13s} {result.width * result.height:10d} "
+                  f"{result.output_size / 1e6:8.2f} {encode_time:9.3f} {decode_time:9.3f}")
+            os.remove(image)
+    finally:
+        shutil.rmtree(work_dir)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Byte-range read benchmark.
+
+Encodes one payload with and without a range index and times
+``decode_image_range`` for a small read at the start, middle and end of the
+payload, next to a full decode. With the index the time stays flat; without
+it the time grows with the offset.
+
+Usage:
+    python benchmarks/bench_range.py [--size MB] [--read KB] [--index-chunk KB]
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Decode import decode_image_range, decode_image_to_file
+from Encode import encode_file_to_image
+
+
+def make_payload(size: int) -> bytes:
+    """Log-like text, so the PNG is deflated rather than stored."""
+    lines = b"".join(b"%08d GET /api/items/%d status=200\n" % (i, i * 7919 % 100000)
+                     for i in range(size // 30 + 1))
+    return lines[:size]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark byte-range reads from encoded images")
+    parser.add_argument("--size", type=float, default=64, help="Payload size in MB (default: 64)")
+    parser.add_argument("--read", type=int, default=4, help="Bytes per range read in KB (default: 4)")
+    parser.add_argument("--index-chunk", type=int, default=1024,
+                        help="Image bytes per indexed segment in KB (default: 1024)")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp()
+    try:
+        input_file = os.path.join(work_dir, "input.bin")
+        data = make_payload(int(args.size * 1024 * 1024))
+        with open(input_file, "wb") as f:
+            f.write(data)
+        length = args.read * 1024
+
+        print(f"{len(data) / 1e6:.1f} MB payload, {args.read} KB reads")
+        for label, index_chunk in (("indexed", args.index_chunk * 1024), ("plain", 0)):
+            image = os.path.join(work_dir, f"{label}.png")
+            encode_file_to_image(input_file, image, index_chunk=index_chunk, quiet=True)
+
+            timings = []
+            for offset in (0, len(data) // 2, len(data) - length):
+                start = time.perf_counter()
+                if decode_image_range(image, offset, length) != data[offset:offset + length]:
+                    raise SystemExit(f"{label}: range mismatch at offset {offset}")
+                timings.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            decode_image_to_file(image, os.path.join(work_dir, "output.bin"), stream=True, quiet=True)
+            full = time.perf_counter() - start
+
+            print(f"{label:8s} start {timings[0] * 1000:8.1f} ms  middle {timings[1] * 1000:8.1f} ms  "
+                  f"end {timings[2] * 1000:8.1f} ms  full decode {full * 1000:8.1f} ms  "
+                  f"image {os.path.getsize(image) / 1e6:.2f} MB")
+    finally:
+        shutil.rmtree(work_dir)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,350 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite with JSON baselines.
+
+Drives ``encode_file_to_image``, ``decode_image_to_file``,
+``find_data_end_smart`` and ``calculate_optimal_dimensions`` over a grid of
+payload sizes (1 KB up to 1 GB) and contents (random, zero-filled and
+text-like), recording wall time, MB/s and peak RSS for every case.
+
+Each case runs in a fresh interpreter so its peak RSS is its own; the best
+of ``--repeat`` runs is kept. Results are written as JSON, and ``compare``
+flags cases that got slower or bigger than a baseline by more than a
+threshold. Everything runs offline with the standard library and Pillow.
+
+Usage:
+    python benchmarks/suite.py run [--sizes 1K,1M,64M] [--content random,zeros,text]
+                                   [--benchmarks encode,decode,...] [--repeat N]
+                                   [--output results.json]
+    python benchmarks/suite.py compare BASELINE CURRENT [--threshold PERCENT]
+
+Example:
+    python benchmarks/suite.py run --output baseline.json
+    python benchmarks/suite.py run --sizes full --output baseline-full.json
+    ...change something...
+    python benchmarks/suite.py run --output current.json
+    python benchmarks/suite.py compare baseline.json current.json --threshold 10
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from sizes import parse_size
+
+BENCHMARKS = ("encode", "decode", "find_data_end_smart", "calculate_optimal_dimensions")
+CONTENTS = ("random", "zeros", "text")
+DEFAULT_SIZES = "1K,64K,1M,16M,64M"
+# ``--sizes full``: the whole range, needs a few GB of free disk and RAM
+FULL_SIZES = "1K,64K,1M,16M,256M,1G"
+DEFAULT_THRESHOLD = 10.0
+
+# RSS differences below this are noise from the interpreter and allocator
+RSS_NOISE_MB = 8.0
+# Cases faster than this are dominated by timer and scheduling noise
+TIME_NOISE_SECONDS = 0.005
+# Cases up to this size get an untimed warm-up run to absorb first-call costs
+WARMUP_MAX_SIZE = 16 * 1024 ** 2
+
+_UNITS = {"K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+
+
+def parse_sizes(text: str) -> list:
+    """Parse ``--sizes``: comma-separated sizes, or ``full`` for ``FULL_SIZES``."""
+    return [parse_size(size) for size in (FULL_SIZES if text == "full" else text).split(",")]
+
+
+def format_size(size: int) -> str:
+    """Shortest ``K``/``M``/``G`` spelling of a size."""
+    for unit in ("G", "M", "K"):
+        if size >= _UNITS[unit] and size % _UNITS[unit] == 0:
+            return f"{size // _UNITS[unit]}{unit}"
+    return str(size)
+
+
+def _text_block(size: int = 1 << 20) -> bytes:
+    """A log-like text block; repeated to build large text inputs quickly."""
+    rng = random.Random(0)
+    lines = []
+    total = 0
+    while total < size:
+        line = (f"2025-10-03T12:{rng.randrange(60):02d}:{rng.randrange(60):02d} "
+                f"{rng.choice(('INFO', 'INFO', 'WARN', 'DEBUG'))} worker-{rng.randrange(16)} "
+                f"GET /api/items/{rng.randrange(100000)} status={rng.choice((200, 200, 404, 500))} "
+                f"bytes={rng.randrange(65536)}\n")
+        lines.append(line)
+        total += len(line)
+    return "".join(lines).encode()[:size]
+
+
+def write_input(path: str, size: int, content: str):
+    """Write ``size`` bytes of the given content kind to ``path``."""
+    chunk = 1 << 20
+    text = _text_block(chunk) if content == "text" else None
+    with open(path, "wb") as f:
+        remaining = size
+        while remaining:
+            count = min(chunk, remaining)
+            if content == "random":
+                f.write(os.urandom(count))
+            elif content == "zeros":
+                f.write(bytes(count))
+            else:
+                f.write(text[:count])
+            remaining -= count
+
+
+def _peak_rss_mb() -> float:
+    """Peak resident set size of this process in MB (``ru_maxrss`` is KB on Linux)."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+
+def run_case(case: dict) -> dict:
+    """
+    Run one benchmark case in this process and return its result.
+
+    ``case`` holds the benchmark name, payload size, content kind, repeat
+    count and the paths of the prepared input and image.
+    """
+    from Decode import decode_image_to_file, find_data_end_smart
+    from Encode import calculate_optimal_dimensions, encode_file_to_image
+    from PIL import Image
+
+    name, size = case["benchmark"], case["size"]
+    best = float("inf")
+    if name == "calculate_optimal_dimensions":
+        calls = 10000
+        best = min(timeit.repeat(lambda: calculate_optimal_dimensions(size),
+                                 number=calls, repeat=case["repeat"])) / calls
+    else:
+        warmup = 1 if size <= WARMUP_MAX_SIZE else 0
+        for run in range(warmup + case["repeat"]):
+            if name == "encode":
+                start = time.perf_counter()
+                encode_file_to_image(case["input"], case["image"], quiet=True)
+            elif name == "decode":
+                start = time.perf_counter()
+                decode_image_to_file(case["image"], case["output"], quiet=True)
+            else:
+                with Image.open(case["image"]) as image:
+                    image = image.convert("RGB")
+                    start = time.perf_counter()
+                    find_data_end_smart(image)
+            if run >= warmup:
+                best = min(best, time.perf_counter() - start)
+
+    throughput = size / best / 1e6 if name != "calculate_optimal_dimensions" and best > 0 else None
+    return {
+        "benchmark": name,
+        "size": size,
+        "content": case["content"],
+        "seconds": best,
+        "mb_per_s": throughput,
+        "peak_rss_mb": _peak_rss_mb(),
+    }
+
+
+def _run_isolated(case: dict) -> dict:
+    """Run a case in a fresh interpreter so its peak RSS is measured on its own."""
+    completed = subprocess.run([sys.executable, os.path.abspath(__file__), "_case", json.dumps(case)],
+                               stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=False)
+    if completed.returncode:
+        raise RuntimeError(f"{case['benchmark']} {format_size(case['size'])} {case['content']} failed:\n"
+                           f"{completed.stderr.decode(errors='replace')}")
+    return json.loads(completed.stdout.decode().splitlines()[-1])
+
+
+def _environment() -> dict:
+    """Describe the machine the results were recorded on."""
+    from PIL import __version__ as pillow_version
+    return {
+        "python": platform.python_version(),
+        "pillow": pillow_version,
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "recorded_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def run_suite(sizes, contents, benchmarks, repeat: int = 3, work_dir: str = None) -> dict:
+    """
+    Run every benchmark over every size and content kind.
+
+    Args:
+        sizes (list[int]): Payload sizes in bytes
+        contents (list[str]): Content kinds from ``CONTENTS``
+        benchmarks (list[str]): Benchmarks from ``BENCHMARKS``
+        repeat (int): Runs per case; the fastest is kept
+        work_dir (str, optional): Directory for inputs and images (default: a temporary one)
+
+    Returns:
+        dict: ``environment`` and a list of ``results``
+    """
+    own_dir = work_dir is None
+    work_dir = work_dir or tempfile.mkdtemp(prefix="file-to-image-bench-")
+    results = []
+    try:
+        for size in sizes:
+            for content in contents:
+                input_path = os.path.join(work_dir, f"{content}-{size}.bin")
+                image_path = input_path + ".png"
+                write_input(input_path, size, content)
+                needs_image = any(name in ("decode", "find_data_end_smart") for name in benchmarks)
+                if needs_image and "encode" not in benchmarks:
+                    _run_isolated({"benchmark": "encode", "size": size, "content": content,
+                                   "repeat": 1, "input": input_path, "image": image_path})
+
+                for name in benchmarks:
+                    result = _run_isolated({
+                        "benchmark": name, "size": size, "content": content, "repeat": repeat,
+                        "input": input_path, "image": image_path, "output": input_path + ".out",
+                    })
+                    results.append(result)
+                    print(format_result(result), flush=True)
+
+                for path in (input_path, image_path, input_path + ".out"):
+                    if os.path.exists(path):
+                        os.remove(path)
+    finally:
+        if own_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    return {"environment": _environment(), "results": results}
+
+
+def format_result(result: dict) -> str:
+    """One aligned line for a result."""
+    if result["mb_per_s"] is None:
+        speed = f"{result['seconds'] * 1e6:9.2f} us/call"
+    else:
+        speed = f"{result['mb_per_s']:9.1f} MB/s   "
+    return (f"{result['benchmark']:29s} {format_size(result['size']):>5s} {result['content']:7s} "
+            f"{result['seconds']:10.4f}s {speed}  peak RSS {result['peak_rss_mb']:8.1f} MB")
+
+
+def _key(result: dict):
+    return result["benchmark"], result["size"], result["content"]
+
+
+def compare_results(baseline: dict, current: dict, threshold: float = DEFAULT_THRESHOLD):
+    """
+    Compare two result sets case by case.
+
+    A case regresses when its time or peak RSS grew by more than
+    ``threshold`` percent; changes within the timer and RSS noise floors are
+    ignored.
+
+    Returns:
+        tuple[list[str], list[str]]: Report lines and the regression lines among them
+    """
+    previous = {_key(result): result for result in baseline["results"]}
+    lines, regressions = [], []
+    for result in current["results"]:
+        old = previous.get(_key(result))
+        if old is None:
+            continue
+        label = f"{result['benchmark']} {format_size(result['size'])} {result['content']}"
+        time_change = (result["seconds"] / old["seconds"] - 1) * 100 if old["seconds"] else 0.0
+        rss_change = (result["peak_rss_mb"] / old["peak_rss_mb"] - 1) * 100 if old["peak_rss_mb"] else 0.0
+
+        problems = []
+        if time_change > threshold and result["seconds"] - old["seconds"] > TIME_NOISE_SECONDS:
+            problems.append(f"time +{time_change:.1f}%")
+        if rss_change > threshold and result["peak_rss_mb"] - old["peak_rss_mb"] > RSS_NOISE_MB:
+            problems.append(f"peak RSS +{rss_change:.1f}%")
+
+        line = (f"{label:50s} time {time_change:+7.1f}%  peak RSS {rss_change:+7.1f}%"
+                + (f"  REGRESSION ({', '.join(problems)})" if problems else ""))
+        lines.append(line)
+        if problems:
+            regressions.append(line)
+    return lines, regressions
+
+
+def _load(path: str) -> dict:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark suite with JSON baselines",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  python benchmarks/suite.py run --output baseline.json
+  python benchmarks/suite.py run --sizes 1M,256M,1G --content random --benchmarks encode,decode
+  python benchmarks/suite.py compare baseline.json current.json --threshold 10
+        """
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="Run the suite and write JSON results")
+    run_parser.add_argument("--sizes", type=parse_sizes, default=DEFAULT_SIZES,
+                            help=f"Comma-separated payload sizes up to 1G, or 'full' for {FULL_SIZES} "
+                                 f"(default: {DEFAULT_SIZES})")
+    run_parser.add_argument("--content", default=",".join(CONTENTS),
+                            help=f"Comma-separated content kinds (default: {','.join(CONTENTS)})")
+    run_parser.add_argument("--benchmarks", default=",".join(BENCHMARKS),
+                            help="Comma-separated benchmarks (default: all)")
+    run_parser.add_argument("--repeat", type=int, default=3, help="Runs per case, fastest kept (default: 3)")
+    run_parser.add_argument("--output", help="Write the results to this JSON file")
+    run_parser.add_argument("--work-dir", help="Directory for temporary inputs (default: system temp)")
+    run_parser.add_argument("--compare", metavar="BASELINE", help="Compare against a baseline when done")
+    run_parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                            help=f"Regression threshold in percent (default: {DEFAULT_THRESHOLD:g})")
+
+    compare_parser = commands.add_parser("compare", help="Flag regressions against a baseline")
+    compare_parser.add_argument("baseline", help="Baseline results JSON")
+    compare_parser.add_argument("current", help="Current results JSON")
+    compare_parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                                help=f"Regression threshold in percent (default: {DEFAULT_THRESHOLD:g})")
+
+    case_parser = commands.add_parser("_case")
+    case_parser.add_argument("case")
+
+    args = parser.parse_args()
+
+    if args.command == "_case":
+        print(json.dumps(run_case(json.loads(args.case))))
+        return 0
+
+    if args.command == "run":
+        unknown = set(args.benchmarks.split(",")) - set(BENCHMARKS) | set(args.content.split(",")) - set(CONTENTS)
+        if unknown:
+            parser.error(f"unknown benchmark or content: {', '.join(sorted(unknown))}")
+        current = run_suite(args.sizes,
+                            args.content.split(","), args.benchmarks.split(","),
+                            args.repeat, args.work_dir)
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as f:
+                json.dump(current, f, indent=2)
+            print(f"Results written to '{args.output}'")
+        if not args.compare:
+            return 0
+        baseline = _load(args.compare)
+    else:
+        baseline, current = _load(args.baseline), _load(args.current)
+
+    lines, regressions = compare_results(baseline, current, args.threshold)
+    for line in lines:
+        print(line)
+    print(f"{len(regressions)} regression(s) beyond {args.threshold:g}% in {len(lines)} compared cases")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+Optional compression of the payload before it is packed into pixels.
+
+Text, logs and CSV files shrink several times under a general-purpose codec,
+which means fewer pixels, less PNG deflate work and smaller images. The codec
+and the original length are recorded in the format header (``FLAG_COMPRESSED``
+and an ``EXT_COMPRESSION`` record), so the decoder reverses it transparently.
+
+Codecs come from the standard library: zlib, lzma and bz2. ``auto`` test-
+compresses samples of the input with each codec and keeps the smallest; any
+codec is bypassed when the trial saves too little to be worth the CPU time.
+"""
+
+import bz2
+import lzma
+import struct
+import zlib
+from typing import Optional, Tuple
+
+from compression_profile import read_samples
+from image_header import EXT_COMPRESSION, FLAG_COMPRESSED, ImageHeader
+
+CODEC_NONE = 0
+CODEC_ZLIB = 1
+CODEC_LZMA = 2
+CODEC_BZ2 = 3
+
+CODEC_IDS = {"zlib": CODEC_ZLIB, "lzma": CODEC_LZMA, "bz2": CODEC_BZ2}
+CODEC_NAMES = {codec: name for name, codec in CODEC_IDS.items()}
+COMPRESSION_CHOICES = ("none", "auto") + tuple(CODEC_IDS)
+
+# Compress only when the trial output is at most this fraction of the input
+BYPASS_RATIO = 0.9
+
+_RECORD = struct.Struct(">BQ")
+
+
+def _compressor(codec: int):
+    """New incremental compressor for a codec."""
+    if codec == CODEC_ZLIB:
+        return zlib.compressobj(9)
+    if codec == CODEC_LZMA:
+        return lzma.LZMACompressor()
+    if codec == CODEC_BZ2:
+        return bz2.BZ2Compressor(9)
+    raise ValueError(f"Unknown compression codec {codec}")
+
+
+def _decompressor(codec: int):
+    """New incremental decompressor for a codec."""
+    if codec == CODEC_ZLIB:
+        return zlib.decompressobj()
+    if codec == CODEC_LZMA:
+        return lzma.LZMADecompressor()
+    if codec == CODEC_BZ2:
+        return bz2.BZ2Decompressor()
+    raise ValueError(f"Unknown compression codec {codec}")
+
+
+def trial_ratio(codec: int, samples) -> float:
+    """Compressed/raw ratio of a codec over the given samples."""
+    raw = sum(len(sample) for sample in samples)
+    if not raw:
+        return 1.0
+    compressed = 0
+    for sample in samples:
+        compressor = _compressor(codec)
+        compressed += len(compressor.compress(sample)) + len(compressor.flush())
+    return compressed / raw
+
+
+def choose_codec(name: str, source) -> Tuple[Optional[int], float]:
+    """
+    Pick the codec to use, or None when compression is not worth it.
+
+    Args:
+        name (str): One of ``COMPRESSION_CHOICES``
+        source (str | bytes-like): Input file path, or the data, to test-compress
+
+    Returns:
+        tuple[int | None, float]: Codec id (None to bypass) and its trial ratio
+
+    Raises:
+        ValueError: If the codec name is unknown
+    """
+    if name == "none":
+        return None, 1.0
+    if name == "auto":
+        candidates = list(CODEC_IDS.values())
+    elif name in CODEC_IDS:
+        candidates = [CODEC_IDS[name]]
+    else:
+        raise ValueError(f"Unknown compression codec '{name}'")
+
+    samples = read_samples(source)
+    codec, ratio = min(((codec, trial_ratio(codec, samples)) for codec in candidates),
+                       key=lambda result: result[1])
+    if ratio > BYPASS_RATIO:
+        return None, ratio
+    return codec, ratio
+
+
+def compress_file(source, destination, codec: int, chunk_size: int = 1 << 20, digest=None) -> int:
+    """
+    Compress one open file into another in chunks.
+
+    Args:
+        source (file): Binary file to read
+        destination (file): Binary file to write
+        codec (int): Codec id
+        chunk_size (int): Bytes read per step
+        digest (optional): ``hashlib``-style digest fed with the input in the same pass
+
+    Returns:
+        int: Compressed size in bytes
+    """
+    compressor = _compressor(codec)
+    written = 0
+    while True:
+        chunk = source.read(chunk_size)
+        if not chunk:
+            break
+        if digest is not None:
+            digest.update(chunk)
+        written += destination.write(compressor.compress(chunk))
+    written += destination.write(compressor.flush())
+    return written
+
+
+def compress_buffer(data, codec: int, digest=None, chunk_size: int = 1 << 20) -> bytes:
+    """
+    Compress a bytes-like object in memory.
+
+    Args:
+        data (bytes-like): Data to compress, e.g. ``bytes`` or an ``mmap``
+        codec (int): Codec id
+        digest (optional): ``hashlib``-style digest fed with the data in the same
+            pass; the data is then compressed in chunks of ``chunk_size`` bytes
+
+    Returns:
+        bytes: The compressed data
+    """
+    compressor = _compressor(codec)
+    if digest is None:
+        return compressor.compress(data) + compressor.flush()
+    compressed = []
+    with memoryview(data) as view:
+        for start in range(0, len(view), chunk_size):
+            chunk = view[start:start + chunk_size]
+            digest.update(chunk)
+            compressed.append(compressor.compress(chunk))
+    compressed.append(compressor.flush())
+    return b"".join(compressed)
+
+
+def add_compression_record(header: ImageHeader, codec: int, original_length: int):
+    """Mark a header's payload as compressed with ``codec``."""
+    header.flags |= FLAG_COMPRESSED
+    header.extensions[EXT_COMPRESSION] = _RECORD.pack(codec, original_length)
+
+
+def read_compression_record(header: ImageHeader) -> Optional[Tuple[int, int]]:
+    """
+    Read the codec and original length from a header.
+
+    Returns:
+        tuple[int, int] | None: Codec id and original length, or None if uncompressed
+
+    Raises:
+        ValueError: If the compressed flag is set without a valid record
+    """
+    if not header.flags & FLAG_COMPRESSED:
+        return None
+    record = header.extensions.get(EXT_COMPRESSION)
+    if record is None or len(record) != _RECORD.size:
+        raise ValueError("Image header is missing its compression record")
+    return _RECORD.unpack(record)
+
+
+class DecompressingWriter:
+    """
+    File-like sink that decompresses everything written to it.
+
+    Used by the streaming decoder so the compressed payload never has to be
+    held in memory.
+    """
+
+    def __init__(self, f, codec: int, original_length: int):
+        self._f = f
+        self._decompressor = _decompressor(codec)
+        self.original_length = original_length
+        self.bytes_written = 0
+
+    def write(self, data) -> int:
+        output = self._decompressor.decompress(data)
+        self.bytes_written += len(output)
+        if self.bytes_written > self.original_length:
+            raise ValueError("Decompressed payload is longer than recorded in the header")
+        self._f.write(output)
+        return len(data)
+
+    def close(self) -> int:
+        """
+        Check that the compressed stream was complete.
+
+        Returns:
+            int: Decompressed size
+
+        Raises:
+            ValueError: If the stream was truncated or the size does not match
+        """
+        if not self._decompressor.eof:
+            raise ValueError("Compressed payload is truncated")
+        if self.bytes_written != self.original_length:
+            raise ValueError(f"Decompressed {self.bytes_written} bytes, "
+                             f"header records {self.original_length}")
+        return self.bytes_written
+
+
+def decompress_payload(data, codec: int, original_length: int) -> bytes:
+    """
+    Decompress a whole payload held in memory.
+
+    Raises:
+        ValueError: If the payload is damaged or its size does not match the header
+    """
+    decompressor = _decompressor(codec)
+    output = decompressor.decompress(data)
+    if not decompressor.eof or len(output) != original_length:
+        raise ValueError(f"Decompressed {len(output)} bytes, header records {original_length}")
+    return output
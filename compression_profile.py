@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+PNG compression profiles.
+
+Deflate is where encoding spends almost all of its time, and for payloads
+that are already compressed (archives, JPEGs, encrypted data) it buys close
+to nothing. A profile fixes the zlib level and the scanline filter strategy;
+the ``auto`` profile test-compresses a few samples spread over the input and
+picks the cheapest settings that are still worth it.
+
+Profiles:
+    fast      level 1, filter None
+    balanced  level 6, adaptive filters (Pillow's default)
+    small     level 9, adaptive filters, Pillow's ``optimize``
+    stored    level 0, filter None (chosen by ``auto`` for incompressible data)
+    auto      sample the input and choose one of the above
+"""
+
+import os
+import zlib
+from dataclasses import dataclass
+from typing import List, Optional
+
+PROFILE_NAMES = ("fast", "balanced", "small", "auto")
+DEFAULT_PROFILE = "auto"
+
+# Samples taken by the auto profile
+SAMPLE_COUNT = 8
+SAMPLE_SIZE = 64 * 1024
+
+# Sample ratios (compressed / raw) at or above which deflate is not worth it
+INCOMPRESSIBLE_RATIO = 0.97
+WEAKLY_COMPRESSIBLE_RATIO = 0.85
+
+
+@dataclass
+class CompressionProfile:
+    """
+    Settings used to write the PNG.
+
+    Attributes:
+        name (str): Profile name
+        compress_level (int): zlib level, 0 (stored) to 9
+        adaptive_filter (bool): Let Pillow pick a filter per scanline instead of filter None
+        optimize (bool): Ask Pillow for its slowest, smallest output
+        sample_ratio (float | None): Compressed/raw ratio measured by ``auto``
+    """
+    name: str
+    compress_level: int
+    adaptive_filter: bool = False
+    optimize: bool = False
+    sample_ratio: Optional[float] = None
+
+    def describe(self) -> str:
+        """One-line summary for progress output."""
+        filters = "adaptive" if self.adaptive_filter else "None"
+        text = f"{self.name} (level {self.compress_level}, filter {filters})"
+        if self.sample_ratio is not None:
+            text += f", sample ratio {self.sample_ratio:.2f}"
+        return text
+
+
+_FIXED_PROFILES = {
+    "fast": CompressionProfile("fast", 1),
+    "balanced": CompressionProfile("balanced", 6, adaptive_filter=True),
+    "small": CompressionProfile("small", 9, adaptive_filter=True, optimize=True),
+    "stored": CompressionProfile("stored", 0),
+}
+
+
+def source_size(source) -> int:
+    """Size in bytes of a file path or a bytes-like object."""
+    if isinstance(source, (str, os.PathLike)):
+        return os.path.getsize(source)
+    with memoryview(source) as view:
+        return view.nbytes
+
+
+def read_samples(source, sample_count: int = SAMPLE_COUNT,
+                 sample_size: int = SAMPLE_SIZE) -> List[bytes]:
+    """
+    Read evenly spaced samples of a file (the whole file if it is small).
+
+    Args:
+        source (str | bytes-like): Path to the file, or the data itself
+        sample_count (int): Number of samples
+        sample_size (int): Bytes per sample
+
+    Returns:
+        list[bytes]: The samples, in file order
+    """
+    file_size = source_size(source)
+    if file_size <= sample_count * sample_size:
+        offsets = range(0, file_size, sample_size)
+    else:
+        stride = (file_size - sample_size) // (sample_count - 1) if sample_count > 1 else 0
+        offsets = [i * stride for i in range(sample_count)]
+
+    if not isinstance(source, (str, os.PathLike)):
+        with memoryview(source) as view, view.cast("B") as data:
+            return [bytes(data[offset:offset + sample_size]) for offset in offsets]
+
+    samples = []
+    with open(source, "rb") as f:
+        for offset in offsets:
+            f.seek(offset)
+            samples.append(f.read(sample_size))
+    return samples
+
+
+def sample_compression_ratio(source, sample_count: int = SAMPLE_COUNT,
+                             sample_size: int = SAMPLE_SIZE) -> float:
+    """
+    Estimate how well a file deflates by test-compressing evenly spaced samples.
+
+    Args:
+        source (str | bytes-like): Path to the file, or the data itself
+        sample_count (int): Number of samples
+        sample_size (int): Bytes per sample
+
+    Returns:
+        float: Compressed size divided by raw size over all samples (1.0 for an empty file)
+    """
+    samples = read_samples(source, sample_count, sample_size)
+    raw = sum(len(sample) for sample in samples)
+    compressed = sum(len(zlib.compress(sample, 1)) for sample in samples)
+    return compressed / raw if raw else 1.0
+
+
+def choose_profile(name: str, source, image_bytes: int = None) -> CompressionProfile:
+    """
+    Resolve a profile name to concrete settings.
+
+    Args:
+        name (str): One of ``PROFILE_NAMES``
+        source (str | bytes-like): Input file path, or the data, that ``auto`` samples
+        image_bytes (int, optional): Total pixel bytes of the image. The white
+            fill after the payload deflates to almost nothing, so a mostly
+            empty image is still worth compressing even if the payload is not
+
+    Returns:
+        CompressionProfile: Settings to encode with
+
+    Raises:
+        ValueError: If the profile name is unknown
+    """
+    if name != "auto":
+        if name not in _FIXED_PROFILES:
+            raise ValueError(f"Unknown compression profile '{name}'")
+        return _FIXED_PROFILES[name]
+
+    ratio = sample_compression_ratio(source)
+    file_size = source_size(source)
+    if image_bytes and image_bytes > file_size:
+        ratio = ratio * file_size / image_bytes
+    if ratio >= INCOMPRESSIBLE_RATIO:
+        base = "stored"
+    elif ratio >= WEAKLY_COMPRESSIBLE_RATIO:
+        base = "fast"
+    else:
+        base = "balanced"
+    profile = _FIXED_PROFILES[base]
+    return CompressionProfile(f"auto/{base}", profile.compress_level, profile.adaptive_filter,
+                              profile.optimize, sample_ratio=ratio)
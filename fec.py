@@ -0,0 +1,547 @@
+#!/usr/bin/env python3
+"""
+Reed-Solomon forward error correction for payloads that pass through lossy pipelines.
+
+The payload is cut into fixed-size blocks and each block is stored as a
+RS(255, 255 - parity) codeword over GF(2^8): the block's data bytes followed
+by ``parity`` check bytes. A codeword survives up to ``parity // 2`` damaged
+bytes, so a flipped pixel (1 to 8 bytes, depending on the pixel layout)
+costs a few bytes of one block's budget. The last block may be shorter (a
+shortened code); it still carries the full parity.
+
+The format header records the parity (``FLAG_FEC`` and an ``EXT_FEC``
+record) and ``payload_length`` counts the coded bytes. FEC is the last stage
+before packing, so it protects the (optionally compressed) payload; the
+format header has its own CRC and the integrity digest trailer is checked
+against the repaired data.
+
+Coding is table-driven and works on columns rather than bytes: check byte
+``j`` of every block is the XOR over data positions ``i`` of
+``G[i][j] * block[i]``, so a chunk's blocks are sliced into per-position
+columns (``data[i::k]``), each column is multiplied by a constant with
+``bytes.translate`` over a precomputed GF(2^8) product table and the
+columns are XORed as integers. Every step runs in C over a whole column.
+Decoding recomputes the check bytes the same way and compares them; only
+damaged blocks go through syndrome decoding (Berlekamp-Massey, Chien
+search and Forney). Chunks of blocks are coded in parallel across a
+process pool.
+"""
+
+import functools
+import itertools
+import operator
+import os
+import struct
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+from image_header import EXT_FEC, FLAG_FEC, ImageHeader
+
+# Codeword size of Reed-Solomon over GF(2^8)
+FEC_BLOCK_SIZE = 255
+
+# Check bytes per block: 32 repair up to 16 damaged bytes per 223 data bytes (14% overhead)
+DEFAULT_FEC_PARITY = 32
+
+# Blocks per chunk handed to a worker process (about 1 MiB of payload)
+FEC_CHUNK_BLOCKS = 4096
+
+_RECORD = struct.Struct(">B")
+
+# Maps every non-zero byte to 1, to find damaged blocks in a mismatch mask
+_DAMAGED = bytes([0]) + bytes([1]) * 255
+
+# GF(2^8) with the primitive polynomial x^8 + x^4 + x^3 + x^2 + 1 and generator 2
+_EXP = [0] * 512
+_LOG = [0] * 256
+_value = 1
+for _power in range(255):
+    _EXP[_power] = _value
+    _LOG[_value] = _power
+    _value <<= 1
+    if _value & 0x100:
+        _value ^= 0x11d
+for _power in range(255, 512):
+    _EXP[_power] = _EXP[_power - 255]
+
+
+def _mul(a: int, b: int) -> int:
+    if not a or not b:
+        return 0
+    return _EXP[_LOG[a] + _LOG[b]]
+
+
+def _div(a: int, b: int) -> int:
+    if not a:
+        return 0
+    return _EXP[_LOG[a] + 255 - _LOG[b]]
+
+
+def _check_parity(parity: int):
+    if not 2 <= parity <= 128 or parity % 2:
+        raise ValueError(f"FEC parity must be an even number of bytes from 2 to 128, got {parity}")
+
+
+@functools.lru_cache(maxsize=None)
+def _product_table(factor: int) -> bytes:
+    """``bytes.translate`` table multiplying every byte by ``factor`` in GF(2^8)."""
+    return bytes(_mul(factor, value) for value in range(256))
+
+
+@functools.lru_cache(maxsize=None)
+def _generator_rows(parity: int):
+    """
+    Check bytes of a block holding a single 1 at each data position.
+
+    Reed-Solomon is linear, so check byte ``j`` of any block is the XOR over
+    positions ``i`` of ``rows[i][j] * block[i]``.
+    """
+    # Generator polynomial: product of (x - 2^i) for i < parity, highest degree first
+    generator = [1]
+    for power in range(parity):
+        product = generator + [0]
+        for index, coefficient in enumerate(generator):
+            product[index + 1] ^= _mul(coefficient, _EXP[power])
+        generator = product
+
+    # Register after feeding value v into an empty shift register
+    feedback = [int.from_bytes(bytes(_mul(coefficient, value) for coefficient in generator[1:]), "big")
+                for value in range(256)]
+
+    # The last position feeds the register once; each earlier one is
+    # followed by one more zero byte
+    shift = 8 * (parity - 1)
+    mask = (1 << 8 * parity) - 1
+    registers = [feedback[1]]
+    for _ in range(FEC_BLOCK_SIZE - parity - 1):
+        register = registers[-1]
+        registers.append(((register << 8) & mask) ^ feedback[register >> shift])
+    return [register.to_bytes(parity, "big") for register in reversed(registers)]
+
+
+def _check_columns(data: bytes, parity: int):
+    """
+    Check bytes of consecutive whole blocks, one column per check byte.
+
+    Args:
+        data (bytes): A whole number of ``255 - parity``-byte blocks
+
+    Returns:
+        list[bytes]: ``parity`` columns; byte ``b`` of column ``j`` is check byte ``j`` of block ``b``
+    """
+    data_size = FEC_BLOCK_SIZE - parity
+    blocks = len(data) // data_size
+    columns = [0] * parity
+    for position, row in enumerate(_generator_rows(parity)):
+        column = data[position::data_size]
+        for index, factor in enumerate(row):
+            if factor:
+                columns[index] ^= int.from_bytes(column.translate(_product_table(factor)), "little")
+    return [column.to_bytes(blocks, "little") for column in columns]
+
+
+def _tail_check_bytes(block: bytes, parity: int) -> bytes:
+    """Check bytes of a short last block (the missing leading bytes count as zero)."""
+    padded = bytes(FEC_BLOCK_SIZE - parity - len(block)) + block
+    return b"".join(_check_columns(padded, parity))
+
+
+def _syndromes(difference: bytes, parity: int):
+    """
+    Syndromes of a codeword, from the XOR of its stored and recomputed check bytes.
+
+    Re-encoding the received data gives a valid codeword, which differs from
+    the received one only in the check bytes, so evaluating that difference
+    at 2^0 .. 2^(parity-1) gives the received codeword's syndromes.
+    """
+    syndromes = []
+    for power in range(parity):
+        table = _product_table(_EXP[power])
+        value = 0
+        for byte in difference:
+            value = table[value] ^ byte
+        syndromes.append(value)
+    return syndromes
+
+
+def _repair(codeword: bytearray, difference: bytes, parity: int) -> int:
+    """
+    Correct a damaged codeword in place.
+
+    Args:
+        codeword (bytearray): Data and check bytes of one block
+        difference (bytes): Stored check bytes XOR the check bytes recomputed from the data
+
+    Returns:
+        int: Number of bytes corrected
+
+    Raises:
+        ValueError: If the block has more damaged bytes than the parity can repair
+    """
+    syndromes = _syndromes(difference, parity)
+    if not any(syndromes):
+        return 0
+
+    # Berlekamp-Massey: error locator polynomial (lowest degree first)
+    locator, previous = [1], [1]
+    errors, shift, last = 0, 1, 1
+    for step in range(parity):
+        discrepancy = syndromes[step]
+        for index in range(1, min(errors, len(locator) - 1) + 1):
+            discrepancy ^= _mul(locator[index], syndromes[step - index])
+        if not discrepancy:
+            shift += 1
+            continue
+        scale = _div(discrepancy, last)
+        updated = locator + [0] * max(0, len(previous) + shift - len(locator))
+        for index, coefficient in enumerate(previous):
+            updated[index + shift] ^= _mul(scale, coefficient)
+        if 2 * errors <= step:
+            previous, errors, last, shift = locator, step + 1 - errors, discrepancy, 1
+        else:
+            shift += 1
+        locator = updated
+    if 2 * errors > parity:
+        raise ValueError("too many damaged bytes")
+
+    # Chien search: byte j is damaged if the locator vanishes at 2^-(n-1-j).
+    # Term i of the locator is multiplied by 2^i from one byte to the next
+    length = len(codeword)
+    terms = [_mul(coefficient, _EXP[(-(length - 1) * index) % 255])
+             for index, coefficient in enumerate(locator)]
+    steps = [_product_table(_EXP[index % 255]) for index in range(len(locator))]
+    positions = []
+    for position in range(length):
+        if not functools.reduce(operator.xor, terms):
+            positions.append(position)
+        terms = list(map(bytes.__getitem__, steps, terms))
+    if len(positions) != errors:
+        raise ValueError("too many damaged bytes")
+
+    # Forney: error values from the evaluator and the locator's derivative
+    evaluator = [0] * parity
+    for index, syndrome in enumerate(syndromes):
+        for offset, coefficient in enumerate(locator):
+            if index + offset < parity:
+                evaluator[index + offset] ^= _mul(syndrome, coefficient)
+    corrections = []
+    for position in positions:
+        power = length - 1 - position
+        inverse = _EXP[(255 - power) % 255]
+        numerator = 0
+        for coefficient in reversed(evaluator):
+            numerator = _mul(numerator, inverse) ^ coefficient
+        denominator = 0
+        for index in range(len(locator) - 1, 0, -1):
+            denominator = _mul(denominator, inverse) ^ (locator[index] if index % 2 else 0)
+        if not denominator:
+            raise ValueError("too many damaged bytes")
+        corrections.append((power, _mul(_EXP[power], _div(numerator, denominator))))
+
+    # The corrections must explain every syndrome, or the block is beyond repair
+    for index, syndrome in enumerate(syndromes):
+        for power, value in corrections:
+            syndrome ^= _mul(value, _EXP[power * index % 255])
+        if syndrome:
+            raise ValueError("too many damaged bytes")
+    for (power, value), position in zip(corrections, positions):
+        codeword[position] ^= value
+    return errors
+
+
+def _encode_chunk(job) -> bytes:
+    """Worker: codewords for one chunk of payload bytes."""
+    chunk, parity = job
+    data_size = FEC_BLOCK_SIZE - parity
+    blocks = len(chunk) // data_size
+    body = chunk[:blocks * data_size]
+    coded = bytearray(blocks * FEC_BLOCK_SIZE)
+    if blocks:
+        for position in range(data_size):
+            coded[position::FEC_BLOCK_SIZE] = body[position::data_size]
+        for index, column in enumerate(_check_columns(body, parity)):
+            coded[data_size + index::FEC_BLOCK_SIZE] = column
+    tail = chunk[len(body):]
+    if tail:
+        coded += tail + _tail_check_bytes(tail, parity)
+    return bytes(coded)
+
+
+def _repair_block(codeword, difference: bytes, parity: int, number: int) -> bytes:
+    """Data bytes of a damaged codeword, or ValueError naming the block."""
+    repaired = bytearray(codeword)
+    try:
+        _repair(repaired, difference, parity)
+    except ValueError:
+        raise ValueError(f"FEC block {number} has more damaged bytes than "
+                         f"{parity} check bytes can repair")
+    return bytes(repaired[:-parity])
+
+
+def _decode_chunk(job):
+    """
+    Worker: data bytes of one chunk of codewords, repairing damaged blocks.
+
+    Returns:
+        tuple[bytes, int]: The data and the number of blocks that were corrected
+    """
+    chunk, parity, first_block = job
+    data_size = FEC_BLOCK_SIZE - parity
+    blocks = len(chunk) // FEC_BLOCK_SIZE
+    body = chunk[:blocks * FEC_BLOCK_SIZE]
+    data = bytearray(blocks * data_size)
+    corrected = 0
+    if blocks:
+        for position in range(data_size):
+            data[position::data_size] = body[position::FEC_BLOCK_SIZE]
+
+        # Stored XOR recomputed check bytes; non-zero bytes mark damaged blocks
+        differences = [int.from_bytes(column, "little")
+                       ^ int.from_bytes(body[data_size + index::FEC_BLOCK_SIZE], "little")
+                       for index, column in enumerate(_check_columns(bytes(data), parity))]
+        mismatch = functools.reduce(operator.or_, differences)
+        if mismatch:
+            differences = [difference.to_bytes(blocks, "little") for difference in differences]
+            damaged = mismatch.to_bytes(blocks, "little").translate(_DAMAGED)
+            block = damaged.find(1)
+            while block >= 0:
+                start = block * FEC_BLOCK_SIZE
+                data[block * data_size:(block + 1) * data_size] = _repair_block(
+                    body[start:start + FEC_BLOCK_SIZE],
+                    bytes(difference[block] for difference in differences),
+                    parity, first_block + block)
+                corrected += 1
+                block = damaged.find(1, block + 1)
+    tail = chunk[len(body):]
+    if tail:
+        block = tail[:-parity]
+        check = _tail_check_bytes(block, parity)
+        if check != tail[-parity:]:
+            difference = bytes(a ^ b for a, b in zip(check, tail[-parity:]))
+            block = _repair_block(tail, difference, parity, first_block + blocks)
+            corrected += 1
+        data += block
+    return bytes(data), corrected
+
+
+class _ChunkMapper:
+    """
+    Ordered ``map`` of a worker function over chunks, in a process pool when
+    ``workers`` is above 1 and there is more than one chunk. At most two
+    chunks per worker are in flight, so streams of any size stay bounded.
+    """
+
+    def __init__(self, workers: int = None):
+        self.workers = workers if workers is not None else os.cpu_count() or 1
+        self._pool = None
+
+    def map(self, function, jobs):
+        jobs = iter(jobs)
+        head = list(itertools.islice(jobs, 2))
+        if self.workers <= 1 or len(head) < 2:
+            yield from map(function, itertools.chain(head, jobs))
+            return
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        pending = deque()
+        for job in itertools.chain(head, jobs):
+            pending.append(self._pool.submit(function, job))
+            if len(pending) >= 2 * self.workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.close()
+        return False
+
+
+def encoded_length(length: int, parity: int) -> int:
+    """Size of ``length`` payload bytes once coded."""
+    return length + -(-length // (FEC_BLOCK_SIZE - parity)) * parity
+
+
+def decoded_length(length: int, parity: int) -> int:
+    """
+    Payload size of ``length`` coded bytes.
+
+    Raises:
+        ValueError: If ``length`` is not a valid coded size
+    """
+    blocks = -(-length // FEC_BLOCK_SIZE)
+    if length % FEC_BLOCK_SIZE and length % FEC_BLOCK_SIZE <= parity:
+        raise ValueError(f"{length} bytes is not a valid FEC-coded length")
+    return length - blocks * parity
+
+
+def add_fec_record(header: ImageHeader, parity: int):
+    """Mark a header's payload as coded with ``parity`` check bytes per block."""
+    _check_parity(parity)
+    header.flags |= FLAG_FEC
+    header.extensions[EXT_FEC] = _RECORD.pack(parity)
+
+
+def read_fec_record(header: ImageHeader) -> Optional[int]:
+    """
+    Read the check bytes per block from a header.
+
+    Returns:
+        int | None: Parity, or None if the payload carries no FEC
+
+    Raises:
+        ValueError: If the FEC flag is set without a valid record
+    """
+    if not header.flags & FLAG_FEC:
+        return None
+    record = header.extensions.get(EXT_FEC)
+    if record is None or len(record) != _RECORD.size:
+        raise ValueError("Image header is missing its FEC record")
+    (parity,) = _RECORD.unpack(record)
+    _check_parity(parity)
+    return parity
+
+
+def _data_chunks(data, parity: int, chunk_blocks: int, digest=None):
+    """Jobs for ``_encode_chunk``, feeding ``digest`` with each chunk on the way."""
+    chunk_size = chunk_blocks * (FEC_BLOCK_SIZE - parity)
+    with memoryview(data) as view, view.cast("B") as payload:
+        for start in range(0, len(payload), chunk_size):
+            chunk = payload[start:start + chunk_size]
+            if digest is not None:
+                digest.update(chunk)
+            yield bytes(chunk), parity
+
+
+def encode_buffer(data, parity: int = DEFAULT_FEC_PARITY, workers: int = None,
+                  digest=None, chunk_blocks: int = FEC_CHUNK_BLOCKS) -> bytes:
+    """
+    Add Reed-Solomon check bytes to a bytes-like payload.
+
+    Args:
+        data (bytes-like): Payload, e.g. ``bytes`` or an ``mmap``
+        parity (int): Check bytes per 255-byte block (even, 2 to 128)
+        workers (int, optional): Worker processes. Defaults to the CPU count
+        digest (optional): ``hashlib``-style digest fed with the payload in the same pass
+        chunk_blocks (int): Blocks per chunk handed to a worker
+
+    Returns:
+        bytes: The coded payload, ``encoded_length(len(data), parity)`` bytes
+    """
+    _check_parity(parity)
+    with _ChunkMapper(workers) as mapper:
+        return b"".join(mapper.map(_encode_chunk, _data_chunks(data, parity, chunk_blocks, digest)))
+
+
+def encode_file(source, destination, parity: int = DEFAULT_FEC_PARITY, workers: int = None,
+                digest=None, chunk_blocks: int = FEC_CHUNK_BLOCKS) -> int:
+    """
+    Add Reed-Solomon check bytes to an open file, writing the codewords to another.
+
+    Returns:
+        int: Coded size in bytes
+    """
+    _check_parity(parity)
+    chunk_size = chunk_blocks * (FEC_BLOCK_SIZE - parity)
+
+    def jobs():
+        while True:
+            chunk = source.read(chunk_size)
+            if not chunk:
+                return
+            if digest is not None:
+                digest.update(chunk)
+            yield chunk, parity
+
+    written = 0
+    with _ChunkMapper(workers) as mapper:
+        for coded in mapper.map(_encode_chunk, jobs()):
+            written += destination.write(coded)
+    return written
+
+
+def decode_buffer(data, parity: int, workers: int = None,
+                  chunk_blocks: int = FEC_CHUNK_BLOCKS):
+    """
+    Check and repair a coded payload held in memory.
+
+    Returns:
+        tuple[bytes, int]: The payload and the number of blocks that were corrected
+
+    Raises:
+        ValueError: If a block has more damaged bytes than the parity can repair
+    """
+    _check_parity(parity)
+    decoded_length(len(data), parity)
+    chunk_size = chunk_blocks * FEC_BLOCK_SIZE
+    with memoryview(data) as view, view.cast("B") as coded:
+        jobs = ((bytes(coded[start:start + chunk_size]), parity, start // FEC_BLOCK_SIZE)
+                for start in range(0, len(coded), chunk_size))
+        with _ChunkMapper(workers) as mapper:
+            results = list(mapper.map(_decode_chunk, jobs))
+    return b"".join(data for data, _ in results), sum(corrected for _, corrected in results)
+
+
+class FecDecodingWriter:
+    """
+    File-like sink that checks and repairs the codewords written to it and
+    writes only the payload on.
+
+    Used by the streaming decoders; whole chunks are decoded as they fill up,
+    across a process pool when ``workers`` is above 1.
+    """
+
+    def __init__(self, f, parity: int, workers: int = None,
+                 chunk_blocks: int = FEC_CHUNK_BLOCKS):
+        _check_parity(parity)
+        self._f = f
+        self._parity = parity
+        self._mapper = _ChunkMapper(workers)
+        self._chunk_size = chunk_blocks * FEC_BLOCK_SIZE
+        self._batch_size = self._chunk_size * 2 * max(1, self._mapper.workers)
+        self._buffer = bytearray()
+        self._blocks = 0
+        self.corrected = 0
+
+    def _decode(self, end: int):
+        jobs = []
+        for start in range(0, end, self._chunk_size):
+            chunk = bytes(self._buffer[start:min(start + self._chunk_size, end)])
+            jobs.append((chunk, self._parity, self._blocks))
+            self._blocks += -(-len(chunk) // FEC_BLOCK_SIZE)
+        del self._buffer[:end]
+        for data, corrected in self._mapper.map(_decode_chunk, jobs):
+            self._f.write(data)
+            self.corrected += corrected
+
+    def write(self, data) -> int:
+        self._buffer += data
+        if len(self._buffer) >= self._batch_size:
+            self._decode(len(self._buffer) // self._chunk_size * self._chunk_size)
+        return len(data)
+
+    def close(self) -> int:
+        """
+        Decode the remaining codewords, including a short last block.
+
+        Returns:
+            int: Number of blocks that were corrected
+
+        Raises:
+            ValueError: If the stream does not end on a whole codeword or a
+                block has more damaged bytes than the parity can repair
+        """
+        try:
+            decoded_length(len(self._buffer), self._parity)
+            self._decode(len(self._buffer))
+        finally:
+            self._mapper.close()
+        return self.corrected
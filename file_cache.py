@@ -0,0 +1,462 @@
+#!/usr/bin/env python3
+"""
+Caches of produced files: encoded images and decoded payloads.
+
+Entries are keyed by a SHA-256 over the input bytes and the parameters that
+shape the output (``content_key``), so the same bytes encoded the same way
+hit the cache whatever the input file is called. Each entry is a copy (or a
+hard link) of the produced file plus a small JSON record of metadata:
+
+    <directory>/<key[:2]>/<key>        cached file
+    <directory>/<key[:2]>/<key>.json   {"size": ..., "metadata": {...}}
+
+Insertion writes both into temporary files next to their final names and
+renames them into place, the file last, so an entry only becomes visible
+once it is complete. The record's modification time is the entry's LRU
+timestamp: a hit touches it, and after each insertion the least recently
+used entries are deleted until the cache fits its size cap. The cached file
+itself is never touched, so with hard links its modification time, kept in
+the record, shows whether it was rewritten through a link. Several processes can share a
+cache: renames are atomic, an entry evicted by another process reads as a
+miss, and removing an entry that is already gone is not an error.
+
+``DecodeCache`` puts an in-process LRU of decoded payloads in front of a
+``FileCache``. It keys an image by its identity instead of hashing it: the
+resolved path, device, inode, size and modification and change times. Any
+rewrite or replacement of the image changes the key, so stale entries are
+never served and simply age out. An image modified within the last couple
+of seconds is not cached, since a second change inside the same timestamp
+tick would keep the key (the same guard git uses for its index). With
+``by_content`` the key is a hash of the image bytes instead.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+# Part of every key: bump when the cached files of the same parameters change
+CACHE_VERSION = 1
+
+DEFAULT_CACHE_SIZE = 1 << 30
+DEFAULT_MEMORY_CACHE_SIZE = 64 << 20
+
+_HASH_CHUNK = 1 << 20
+_META_SUFFIX = ".json"
+_TEMP_SUFFIX = ".tmp"
+
+# Temporary files older than this were left behind by a crashed process
+_STALE_SECONDS = 3600
+
+# Files modified more recently than this may change again without a new timestamp
+_RACY_SECONDS = 2
+
+
+@dataclass
+class CacheStats:
+    """
+    Counters of one cache instance.
+
+    Attributes:
+        hits (int): Lookups served from the cache
+        misses (int): Lookups that found no usable entry
+        stores (int): Entries inserted
+        evictions (int): Entries deleted to stay under the size cap
+    """
+    hits: int = 0
+    misses: int = 0
+    stores: int = 0
+    evictions: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        """Fraction of lookups that hit, 0.0 before the first lookup."""
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+def content_key(path: str, params: Dict, chunk_size: int = _HASH_CHUNK) -> str:
+    """
+    Cache key of a file's bytes and the parameters applied to them.
+
+    Args:
+        path (str): File whose content is hashed
+        params (dict): JSON-serialisable parameters that change the output
+        chunk_size (int): Read size while hashing
+
+    Returns:
+        str: Hex SHA-256
+    """
+    digest = hashlib.sha256()
+    digest.update(json.dumps({"cache_version": CACHE_VERSION, "params": params},
+                             sort_keys=True).encode("utf-8"))
+    digest.update(b"\0")
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def identity_key(path: str, params: Dict) -> Optional[str]:
+    """
+    Cache key of a file's identity and the parameters applied to it.
+
+    The key covers the resolved path, device, inode, size and the
+    modification and change times in nanoseconds, so it changes whenever
+    the file is rewritten or replaced, without reading the file.
+
+    Returns:
+        str | None: Hex SHA-256, or None if the file was modified too
+        recently for its timestamps to identify its content
+    """
+    stat = os.stat(path)
+    if time.time() - stat.st_mtime < _RACY_SECONDS:
+        return None
+    identity = {
+        "path": os.path.realpath(path),
+        "device": stat.st_dev,
+        "inode": stat.st_ino,
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "ctime_ns": stat.st_ctime_ns,
+    }
+    document = {"cache_version": CACHE_VERSION, "identity": identity, "params": params}
+    return hashlib.sha256(json.dumps(document, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def _remove(path: str) -> bool:
+    """Delete a file another process may already have deleted (or still holds open)."""
+    try:
+        os.remove(path)
+        return True
+    except OSError:
+        return False
+
+
+def _place(source: str, destination: str, link: bool):
+    """
+    Atomically replace ``destination`` with a copy of, or a hard link to, ``source``.
+
+    The new file is built under a temporary name and renamed over the
+    destination, so readers never see a partial file and a destination that
+    was itself a hard link into the cache is replaced rather than written
+    through. Hard links fall back to a copy across file systems.
+    """
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(destination)),
+                                     suffix=_TEMP_SUFFIX)
+    os.close(fd)
+    try:
+        linked = False
+        if link:
+            os.remove(temp_path)
+            try:
+                os.link(source, temp_path)
+                linked = True
+            except OSError:
+                pass
+        if not linked:
+            shutil.copyfile(source, temp_path)
+        os.replace(temp_path, destination)
+    except BaseException:
+        _remove(temp_path)
+        raise
+
+
+def _write_bytes(destination: str, data):
+    """Atomically replace ``destination`` with ``data``, like ``_place``."""
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(destination)),
+                                     suffix=_TEMP_SUFFIX)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(temp_path, destination)
+    except BaseException:
+        _remove(temp_path)
+        raise
+
+
+class FileCache:
+    """
+    Size-bounded LRU cache of files on disk.
+
+    Args:
+        directory (str): Cache directory, created on first insertion
+        max_size (int): Size cap in bytes for the cached files
+        link (bool): Hard-link entries to and from the callers' files instead
+            of copying them. Faster and uses no extra space, but a caller that
+            rewrites a linked file in place changes the cached entry too. The
+            entry's size and modification time are recorded when it is stored,
+            and an entry whose file no longer matches them is dropped on fetch
+            rather than served; only a rewrite that also restores the
+            modification time (``os.utime``) goes unnoticed
+    """
+
+    def __init__(self, directory: str, max_size: int = DEFAULT_CACHE_SIZE, link: bool = False):
+        if max_size <= 0:
+            raise ValueError(f"Cache size must be positive, got {max_size}")
+        self.directory = directory
+        self.max_size = max_size
+        self.link = link
+        self.stats = CacheStats()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key)
+
+    def fetch(self, key: str, destination: str) -> Optional[Dict]:
+        """
+        Write the cached file for a key to ``destination``.
+
+        Returns:
+            dict | None: The metadata stored with the entry, or None on a miss
+        """
+        path = self._path(key)
+        try:
+            with open(path + _META_SUFFIX, "r", encoding="utf-8") as f:
+                record = json.load(f)
+            stat = os.stat(path)
+            if (stat.st_size != record["size"]
+                    or record.get("mtime_ns", stat.st_mtime_ns) != stat.st_mtime_ns):
+                # Rewritten through a hard link: no longer what was stored
+                self._drop(path)
+                raise FileNotFoundError(path)
+            _place(path, destination, self.link)
+        except (OSError, ValueError, KeyError, TypeError):
+            self.stats.misses += 1
+            return None
+        try:
+            os.utime(path + _META_SUFFIX)
+        except OSError:
+            pass
+        self.stats.hits += 1
+        return record["metadata"]
+
+    def store(self, key: str, source: str, metadata: Dict = None) -> bool:
+        """
+        Insert a file under a key, then evict down to the size cap.
+
+        Returns:
+            bool: False if the file alone is larger than the cap and was not stored
+
+        Raises:
+            OSError: If the cache directory cannot be written
+        """
+        stat = os.stat(source)
+        if stat.st_size > self.max_size:
+            return False
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        record = {"size": stat.st_size, "metadata": metadata or {}}
+        if self.link:
+            record["mtime_ns"] = stat.st_mtime_ns
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=_TEMP_SUFFIX)
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(record, f)
+            os.replace(temp_path, path + _META_SUFFIX)
+        except BaseException:
+            _remove(temp_path)
+            raise
+        _place(source, path, self.link)
+        if self.link:
+            # A copy made where linking failed gets the recorded time as well
+            os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        self.stats.stores += 1
+        self.evict()
+        return True
+
+    def _drop(self, path: str):
+        # The file first: without it the entry is a miss even if its record remains
+        _remove(path)
+        _remove(path + _META_SUFFIX)
+
+    def _scan(self):
+        """Yield ``(last_used, size, path)`` of every entry, clearing stale leftovers."""
+        if not os.path.isdir(self.directory):
+            return
+        now = time.time()
+        for bucket in os.scandir(self.directory):
+            if not bucket.is_dir():
+                continue
+            for entry in os.scandir(bucket.path):
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                if entry.name.endswith(_TEMP_SUFFIX) or entry.name.endswith(_META_SUFFIX):
+                    # Interrupted insertions leave temporary files or records without a file
+                    orphan = (entry.name.endswith(_TEMP_SUFFIX)
+                              or not os.path.exists(entry.path[:-len(_META_SUFFIX)]))
+                    if orphan and now - stat.st_mtime > _STALE_SECONDS:
+                        _remove(entry.path)
+                    continue
+                try:
+                    last_used = os.stat(entry.path + _META_SUFFIX).st_mtime
+                except OSError:
+                    last_used = stat.st_mtime
+                yield last_used, stat.st_size, entry.path
+
+    def evict(self) -> int:
+        """
+        Delete least recently used entries until the cache fits ``max_size``.
+
+        Returns:
+            int: Number of entries deleted
+        """
+        entries = sorted(self._scan())
+        total = sum(size for _, size, _ in entries)
+        evicted = 0
+        for _, size, path in entries:
+            if total <= self.max_size:
+                break
+            self._drop(path)
+            total -= size
+            evicted += 1
+        self.stats.evictions += evicted
+        return evicted
+
+    def usage(self) -> Tuple[int, int]:
+        """
+        Current contents of the cache directory, across all processes.
+
+        Returns:
+            tuple: ``(entries, bytes)``
+        """
+        entries = list(self._scan())
+        return len(entries), sum(size for _, size, _ in entries)
+
+
+class MemoryCache:
+    """
+    Thread-safe in-process LRU of ``(data, metadata)`` entries with a byte cap.
+
+    A pickled copy (e.g. sent to a worker process) starts out empty.
+
+    Args:
+        max_size (int): Size cap in bytes for the cached data
+    """
+
+    def __init__(self, max_size: int = DEFAULT_MEMORY_CACHE_SIZE):
+        self.max_size = max_size
+        self.size = 0
+        self.stats = CacheStats()
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __reduce__(self):
+        return type(self), (self.max_size,)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[Tuple[bytes, Dict]]:
+        """Return ``(data, metadata)`` for a key and mark it recently used, or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.stats.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats.hits += 1
+            return entry
+
+    def put(self, key: str, data: bytes, metadata: Dict = None) -> bool:
+        """
+        Insert an entry, evicting least recently used ones to stay under the cap.
+
+        Returns:
+            bool: False if the data alone is larger than the cap and was not stored
+        """
+        if len(data) > self.max_size:
+            return False
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.size -= len(previous[0])
+            self._entries[key] = (data, metadata or {})
+            self.size += len(data)
+            self.stats.stores += 1
+            while self.size > self.max_size:
+                _, (evicted, _) = self._entries.popitem(last=False)
+                self.size -= len(evicted)
+                self.stats.evictions += 1
+        return True
+
+
+class DecodeCache:
+    """
+    Two-tier cache of decoded payloads: in-process memory, then disk.
+
+    A hit costs one file write (memory tier) or one file copy (disk tier);
+    disk hits are promoted to the memory tier.
+
+    Args:
+        directory (str, optional): Directory of the on-disk tier; None keeps
+            only the memory tier
+        max_size (int): Size cap in bytes of the on-disk tier
+        memory_size (int): Size cap in bytes of the memory tier; 0 disables it
+        link (bool): Hard-link entries of the on-disk tier, see ``FileCache``
+        by_content (bool): Key images by a hash of their bytes instead of their
+            identity. Costs a read of the image per lookup, but survives
+            copies and renames and does not depend on timestamps
+    """
+
+    def __init__(self, directory: str = None, max_size: int = DEFAULT_CACHE_SIZE,
+                 memory_size: int = DEFAULT_MEMORY_CACHE_SIZE, link: bool = False,
+                 by_content: bool = False):
+        self.memory = MemoryCache(memory_size) if memory_size else None
+        self.disk = FileCache(directory, max_size, link) if directory else None
+        self.by_content = by_content
+        self.stats = CacheStats()
+
+    def key(self, image_path: str, params: Dict) -> Optional[str]:
+        """Cache key of an image and the decode options, None if it cannot be cached yet."""
+        if self.by_content:
+            return content_key(image_path, params)
+        return identity_key(image_path, params)
+
+    def fetch(self, key: Optional[str], destination: str) -> Optional[Dict]:
+        """
+        Write the cached payload for a key to ``destination``.
+
+        Returns:
+            dict | None: The metadata stored with the entry, or None on a miss
+        """
+        if key is not None:
+            entry = self.memory.get(key) if self.memory is not None else None
+            if entry is not None:
+                _write_bytes(destination, entry[0])
+                self.stats.hits += 1
+                return entry[1]
+            metadata = self.disk.fetch(key, destination) if self.disk is not None else None
+            if metadata is not None:
+                self._remember(key, destination, metadata)
+                self.stats.hits += 1
+                return metadata
+        self.stats.misses += 1
+        return None
+
+    def store(self, key: Optional[str], source: str, metadata: Dict = None):
+        """
+        Insert a decoded file in both tiers; a None key is ignored.
+
+        Raises:
+            OSError: If the on-disk tier cannot be written
+        """
+        if key is None:
+            return
+        self.stats.stores += 1
+        self._remember(key, source, metadata)
+        if self.disk is not None:
+            self.disk.store(key, source, metadata)
+
+    def _remember(self, key: str, path: str, metadata: Dict):
+        if self.memory is not None and os.path.getsize(path) <= self.memory.max_size:
+            with open(path, "rb") as f:
+                self.memory.put(key, f.read(), metadata)
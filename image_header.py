@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Self-describing header stored in the first pixels of an encoded image.
+
+The header tells the decoder exactly how many payload bytes follow, so it
+never has to scan for white pixels to find the end of the data.
+
+Layout (big-endian):
+    magic           4 bytes   b"F2I\\x1a"
+    version         1 byte    format version (currently 1)
+    flags           1 byte    feature bits
+    header_length   2 bytes   total header size, including padding
+    payload_length  8 bytes   exact number of payload bytes
+    ext_length      2 bytes   size of the extension records
+    extensions      variable  (type: 1 byte, length: 2 bytes, value) records
+    crc32           4 bytes   CRC-32 of everything above
+    padding         variable  zero bytes up to a whole number of pixels
+
+Images without the magic are legacy images and are decoded by scanning.
+"""
+
+import struct
+import zlib
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+MAGIC = b"F2I\x1a"
+FORMAT_VERSION = 1
+
+_FIXED = struct.Struct(">4sBBHQH")
+_EXTENSION = struct.Struct(">BH")
+_CRC = struct.Struct(">I")
+
+# Number of leading bytes needed to recognise a header and read its length
+HEADER_FIXED_SIZE = _FIXED.size
+
+# Flag bits
+FLAG_COMPRESSED = 0x01  # payload was compressed before packing (see EXT_COMPRESSION)
+FLAG_DIGEST = 0x02      # an integrity digest trailer follows the payload (see EXT_DIGEST)
+FLAG_FEC = 0x04         # payload is Reed-Solomon coded in 255-byte blocks (see EXT_FEC)
+
+# Extension record types
+EXT_COMPRESSION = 1  # codec id (1 byte) and original length (8 bytes)
+EXT_DIGEST = 2       # digest algorithm id (1 byte); the digest itself is stored after the payload
+EXT_FEC = 3          # check bytes per block (1 byte)
+
+
+@dataclass
+class ImageHeader:
+    """
+    In-image format header.
+
+    Attributes:
+        payload_length (int): Exact number of payload bytes after the header
+        flags (int): Feature bits
+        extensions (dict[int, bytes]): Optional typed records
+        version (int): Format version
+        header_length (int): Size of the packed header, padding included
+    """
+    payload_length: int
+    flags: int = 0
+    extensions: Dict[int, bytes] = field(default_factory=dict)
+    version: int = FORMAT_VERSION
+    header_length: int = 0
+
+    def pack(self, alignment: int = 3) -> bytes:
+        """
+        Serialize the header, padded to a multiple of ``alignment`` bytes.
+
+        Args:
+            alignment (int): Bytes per pixel, so the payload starts on a pixel boundary
+
+        Returns:
+            bytes: Packed header
+        """
+        body = b"".join(
+            _EXTENSION.pack(ext_type, len(value)) + value
+            for ext_type, value in sorted(self.extensions.items())
+        )
+        unpadded = HEADER_FIXED_SIZE + len(body) + _CRC.size
+        header_length = unpadded + (-unpadded) % alignment
+        if header_length > 0xFFFF:
+            raise ValueError(f"Header too large: {header_length} bytes")
+
+        fixed = _FIXED.pack(MAGIC, self.version, self.flags, header_length,
+                            self.payload_length, len(body))
+        crc = _CRC.pack(zlib.crc32(fixed + body))
+        self.header_length = header_length
+        return fixed + body + crc + b"\x00" * (header_length - unpadded)
+
+
+def peek_header_length(data) -> Optional[int]:
+    """
+    Check for a header and return its total length.
+
+    Args:
+        data (bytes-like): At least ``HEADER_FIXED_SIZE`` leading image bytes
+
+    Returns:
+        int | None: Header length in bytes, or None for a legacy image
+    """
+    if len(data) < HEADER_FIXED_SIZE or bytes(data[:len(MAGIC)]) != MAGIC:
+        return None
+    return _FIXED.unpack_from(data)[3]
+
+
+def parse_header(data) -> Optional[ImageHeader]:
+    """
+    Parse the header at the start of the image bytes.
+
+    Args:
+        data (bytes-like): Leading image bytes, at least the full header
+
+    Returns:
+        ImageHeader | None: Parsed header, or None for a legacy image
+
+    Raises:
+        ValueError: If the header is truncated, corrupted or of an unknown version
+    """
+    header_length = peek_header_length(data)
+    if header_length is None:
+        return None
+    if header_length < HEADER_FIXED_SIZE + _CRC.size or len(data) < header_length:
+        raise ValueError("Image header is truncated")
+
+    _, version, flags, _, payload_length, ext_length = _FIXED.unpack_from(data)
+    if version > FORMAT_VERSION:
+        raise ValueError(f"Unsupported format version {version} (max {FORMAT_VERSION})")
+
+    crc_offset = HEADER_FIXED_SIZE + ext_length
+    if crc_offset + _CRC.size > header_length:
+        raise ValueError("Image header is corrupted")
+    (crc,) = _CRC.unpack_from(data, crc_offset)
+    if crc != zlib.crc32(bytes(data[:crc_offset])):
+        raise ValueError("Image header checksum mismatch")
+
+    extensions = {}
+    offset = HEADER_FIXED_SIZE
+    while offset < crc_offset:
+        ext_type, ext_size = _EXTENSION.unpack_from(data, offset)
+        offset += _EXTENSION.size
+        extensions[ext_type] = bytes(data[offset:offset + ext_size])
+        offset += ext_size
+    if offset != crc_offset:
+        raise ValueError("Image header is corrupted")
+
+    return ImageHeader(
+        payload_length=payload_length,
+        flags=flags,
+        extensions=extensions,
+        version=version,
+        header_length=header_length,
+    )
@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""
+Per-stage instrumentation for encoding and decoding.
+
+An ``Instrumentation`` records monotonic timings and byte counts for each
+stage of a run (reading, pixel packing, PNG compression, locating the data
+end, writing output, ...), optionally tracks peak memory with
+``tracemalloc``, and hands the finished record to its sinks:
+
+    JsonLinesSink         append one JSON object per run to a file
+    PrometheusTextfileSink  rewrite a node_exporter textfile-collector file
+    CallbackSink          call a function with the record (a plain callable works too)
+
+When no instrumentation is passed, the encoder and decoder use
+``NULL_INSTRUMENTATION``, whose stages are a shared no-op context manager,
+so the disabled cost is one method call per stage.
+
+Example:
+    metrics = Instrumentation([JsonLinesSink("metrics.jsonl")], trace_memory=True)
+    encode_file_to_image("backup.tar", "backup.png", instrumentation=metrics)
+    for stage in metrics.stages:
+        print(stage.name, stage.seconds, stage.bytes)
+"""
+
+import cProfile
+import json
+import os
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from typing import Callable, Dict, List
+
+METRIC_PREFIX = "file_to_image"
+
+
+@dataclass
+class StageTiming:
+    """
+    Timing of one stage.
+
+    Attributes:
+        name (str): Stage name, e.g. ``pack`` or ``write``
+        seconds (float): Monotonic time spent in the stage
+        bytes (int): Bytes the stage processed, 0 if not applicable
+        peak_memory (int): Peak traced memory during the stage in bytes,
+            0 unless memory tracing is enabled
+    """
+    name: str
+    seconds: float = 0.0
+    bytes: int = 0
+    peak_memory: int = 0
+
+
+class _NullStage:
+    """Reusable no-op stage context; the record it yields is discarded."""
+
+    def __init__(self):
+        self.record = StageTiming("")
+
+    def __enter__(self):
+        return self.record
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+class NullInstrumentation:
+    """Instrumentation that records nothing."""
+
+    enabled = False
+    stages = ()
+
+    def __init__(self):
+        self._stage = _NullStage()
+
+    def stage(self, name: str, nbytes: int = 0):
+        return self._stage
+
+    @contextmanager
+    def run(self, operation: str, **labels):
+        yield self
+
+
+NULL_INSTRUMENTATION = NullInstrumentation()
+
+
+class Instrumentation:
+    """
+    Collects stage timings for one run at a time and emits them to sinks.
+
+    Attributes:
+        sinks (list): Objects with an ``emit(record)`` method, or plain callables
+        trace_memory (bool): Track peak memory with ``tracemalloc``
+        stages (list[StageTiming]): Stages of the current or last run
+        record (dict): The last emitted record
+    """
+
+    enabled = True
+
+    def __init__(self, sinks=(), trace_memory: bool = False):
+        self.sinks = list(sinks)
+        self.trace_memory = trace_memory
+        self.stages: List[StageTiming] = []
+        self.record: Dict = {}
+        self._active = False
+        self._labels: Dict = {}
+
+    @contextmanager
+    def stage(self, name: str, nbytes: int = 0):
+        """
+        Time a stage. The yielded ``StageTiming`` can be given its byte count
+        once it is known.
+        """
+        record = StageTiming(name, bytes=nbytes)
+        if self.trace_memory and tracemalloc.is_tracing() and hasattr(tracemalloc, "reset_peak"):
+            tracemalloc.reset_peak()
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record.seconds = time.perf_counter() - start
+            if self.trace_memory and tracemalloc.is_tracing():
+                record.peak_memory = tracemalloc.get_traced_memory()[1]
+            self.stages.append(record)
+
+    @contextmanager
+    def run(self, operation: str, **labels):
+        """
+        Wrap one encode or decode run; the record is emitted when it ends,
+        with ``status`` ``ok`` or ``error``. Nested runs fold into the outer one.
+        """
+        if self._active:
+            self._labels.update(labels)
+            yield self
+            return
+
+        self._active = True
+        self._labels = dict(labels)
+        self.stages = []
+        started_tracing = self.trace_memory and not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        wall_start = time.time()
+        start = time.perf_counter()
+        status = "error"
+        try:
+            yield self
+            status = "ok"
+        finally:
+            seconds = time.perf_counter() - start
+            peak_memory = 0
+            if self.trace_memory and tracemalloc.is_tracing():
+                peak_memory = max([tracemalloc.get_traced_memory()[1]] +
+                                  [stage.peak_memory for stage in self.stages])
+            if started_tracing:
+                tracemalloc.stop()
+            self._active = False
+
+            self.record = {
+                "operation": operation,
+                "status": status,
+                "started_at": wall_start,
+                "seconds": seconds,
+                "peak_memory": peak_memory,
+                "stages": [asdict(stage) for stage in self.stages],
+            }
+            self.record.update(self._labels)
+            for sink in self.sinks:
+                emit = getattr(sink, "emit", sink)
+                emit(self.record)
+
+
+class JsonLinesSink:
+    """Append each run's record as one JSON line."""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def emit(self, record: Dict):
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, sort_keys=True) + "\n")
+
+
+class CallbackSink:
+    """Pass each run's record to a function."""
+
+    def __init__(self, callback: Callable[[Dict], None]):
+        self.callback = callback
+
+    def emit(self, record: Dict):
+        self.callback(record)
+
+
+def _label(value) -> str:
+    """Escape a Prometheus label value."""
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class PrometheusTextfileSink:
+    """
+    Write the last run as a Prometheus text-format file for node_exporter's
+    textfile collector. The file is replaced atomically on every run.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def format(self, record: Dict) -> str:
+        """Render a record in the Prometheus text exposition format."""
+        operation = _label(record["operation"])
+        run_labels = f'operation="{operation}"'
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f"# HELP {METRIC_PREFIX}_{name} {help_text}")
+            lines.append(f"# TYPE {METRIC_PREFIX}_{name} {kind}")
+            for labels, value in samples:
+                lines.append(f"{METRIC_PREFIX}_{name}{{{labels}}} {value}")
+
+        stage_labels = [(f'{run_labels},stage="{_label(stage["name"])}"', stage)
+                        for stage in record["stages"]]
+        metric("stage_seconds", "gauge", "Time spent in each stage of the last run",
+               [(labels, f'{stage["seconds"]:.6f}') for labels, stage in stage_labels])
+        metric("stage_bytes", "gauge", "Bytes processed by each stage of the last run",
+               [(labels, stage["bytes"]) for labels, stage in stage_labels])
+        metric("duration_seconds", "gauge", "Duration of the last run",
+               [(run_labels, f'{record["seconds"]:.6f}')])
+        metric("success", "gauge", "Whether the last run succeeded",
+               [(run_labels, int(record["status"] == "ok"))])
+        metric("last_run_timestamp_seconds", "gauge", "Start time of the last run",
+               [(run_labels, f'{record["started_at"]:.3f}')])
+        if record["peak_memory"]:
+            metric("peak_memory_bytes", "gauge", "Peak traced memory of the last run",
+                   [(run_labels, record["peak_memory"])])
+        return "\n".join(lines) + "\n"
+
+    def emit(self, record: Dict):
+        temporary = f"{self.path}.{os.getpid()}.tmp"
+        with open(temporary, "w", encoding="utf-8") as f:
+            f.write(self.format(record))
+        os.replace(temporary, self.path)
+
+
+def from_options(metrics_jsonl: str = None, metrics_prometheus: str = None,
+                 trace_memory: bool = False):
+    """
+    Build instrumentation from command-line options.
+
+    Returns:
+        Instrumentation | NullInstrumentation: ``NULL_INSTRUMENTATION`` if nothing was requested
+    """
+    sinks = []
+    if metrics_jsonl:
+        sinks.append(JsonLinesSink(metrics_jsonl))
+    if metrics_prometheus:
+        sinks.append(PrometheusTextfileSink(metrics_prometheus))
+    if not sinks and not trace_memory:
+        return NULL_INSTRUMENTATION
+    return Instrumentation(sinks, trace_memory=trace_memory)
+
+
+def print_stages(instrumentation, file=None):
+    """Print a human-readable stage breakdown of the last run."""
+    if instrumentation.stages:
+        print(f"Stage timings ({instrumentation.record.get('seconds', 0.0):.3f}s total):", file=file)
+    for stage in instrumentation.stages:
+        rate = f"  {stage.bytes / stage.seconds / 1e6:8.1f} MB/s" if stage.bytes and stage.seconds else ""
+        memory = f"  peak {stage.peak_memory / 1e6:.1f} MB" if stage.peak_memory else ""
+        print(f"  {stage.name:10s} {stage.seconds:8.3f}s{rate}{memory}", file=file)
+
+
+@contextmanager
+def cprofile_to(path: str = None):
+    """
+    Run the body under cProfile and dump the stats to ``path`` for ``pstats``
+    or snakeviz. Does nothing when ``path`` is empty.
+    """
+    if not path:
+        yield None
+        return
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path)
+        print(f"cProfile stats written to '{path}'", file=sys.stderr)
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+Integrity digests computed in the same pass as encoding and decoding.
+
+The encoder feeds every payload byte to a running digest while it packs
+(or compresses) the data, and stores the result as a trailer in the pixels
+right after the payload. The format header records the algorithm
+(``FLAG_DIGEST`` and an ``EXT_DIGEST`` record), so the decoder knows the
+trailer size. While writing the output, the decoder feeds the same digest and
+fails if it does not match. Neither side reads a file a second time.
+
+The digest always covers the original input, i.e. exactly the bytes the
+decoder writes, even when the payload was compressed before packing:
+
+    crc32    4 bytes   zlib.crc32, big-endian (fast, catches accidental damage)
+    sha256  32 bytes   hashlib.sha256, matches ``sha256sum``
+    blake2b 64 bytes   hashlib.blake2b, matches ``b2sum``
+"""
+
+import hashlib
+import struct
+import zlib
+from typing import Optional
+
+from image_header import EXT_DIGEST, FLAG_DIGEST, ImageHeader
+
+DIGEST_CRC32 = 1
+DIGEST_SHA256 = 2
+DIGEST_BLAKE2B = 3
+
+DIGEST_IDS = {"crc32": DIGEST_CRC32, "sha256": DIGEST_SHA256, "blake2b": DIGEST_BLAKE2B}
+DIGEST_NAMES = {algorithm: name for name, algorithm in DIGEST_IDS.items()}
+DIGEST_CHOICES = ("none",) + tuple(DIGEST_IDS)
+
+_RECORD = struct.Struct(">B")
+_CRC = struct.Struct(">I")
+
+
+class Crc32:
+    """
+    CRC-32 with the ``hashlib`` interface.
+
+    Unlike the ``hashlib`` digests it can be resumed from a finished value,
+    e.g. to extend a stored digest over appended data.
+    """
+
+    name = "crc32"
+    digest_size = _CRC.size
+
+    def __init__(self, crc: int = 0):
+        self._crc = crc
+
+    def update(self, data):
+        self._crc = zlib.crc32(data, self._crc)
+
+    def digest(self) -> bytes:
+        return _CRC.pack(self._crc)
+
+    def hexdigest(self) -> str:
+        return self.digest().hex()
+
+
+class FixedDigest:
+    """
+    A digest computed elsewhere, e.g. while compressing the input. ``update``
+    does nothing, so it can stand in for a running digest.
+    """
+
+    def __init__(self, name: str, value: bytes):
+        self.name = name
+        self.digest_size = len(value)
+        self._value = value
+
+    def update(self, data):
+        pass
+
+    def digest(self) -> bytes:
+        return self._value
+
+    def hexdigest(self) -> str:
+        return self._value.hex()
+
+
+def new_digest(algorithm: int):
+    """
+    Create a running digest for an algorithm id.
+
+    Raises:
+        ValueError: If the algorithm is unknown
+    """
+    if algorithm == DIGEST_CRC32:
+        return Crc32()
+    if algorithm == DIGEST_SHA256:
+        return hashlib.sha256()
+    if algorithm == DIGEST_BLAKE2B:
+        return hashlib.blake2b()
+    raise ValueError(f"Unknown digest algorithm {algorithm}")
+
+
+def digest_for(name: str, header: ImageHeader = None):
+    """
+    Create the running digest selected by name and record it in the header.
+
+    Args:
+        name (str): ``none``, ``crc32``, ``sha256`` or ``blake2b``
+        header (ImageHeader, optional): Header to record the algorithm in
+
+    Returns:
+        object | None: A ``hashlib``-style digest, or None for ``none``
+
+    Raises:
+        ValueError: If the name is unknown
+    """
+    if name == "none":
+        return None
+    if name not in DIGEST_IDS:
+        raise ValueError(f"Unknown digest algorithm '{name}'")
+    if header is not None:
+        header.flags |= FLAG_DIGEST
+        header.extensions[EXT_DIGEST] = _RECORD.pack(DIGEST_IDS[name])
+    return new_digest(DIGEST_IDS[name])
+
+
+def read_digest_record(header: ImageHeader) -> Optional[int]:
+    """
+    Return the digest algorithm id of a header, or None without a digest.
+
+    Raises:
+        ValueError: If the digest flag is set without a valid record
+    """
+    if not header.flags & FLAG_DIGEST:
+        return None
+    record = header.extensions.get(EXT_DIGEST)
+    if record is None or len(record) != _RECORD.size:
+        raise ValueError("Image header is missing its digest record")
+    (algorithm,) = _RECORD.unpack(record)
+    new_digest(algorithm)
+    return algorithm
+
+
+def trailer_length(header: ImageHeader) -> int:
+    """Size of the digest trailer following the payload, 0 without a digest."""
+    algorithm = read_digest_record(header)
+    return 0 if algorithm is None else new_digest(algorithm).digest_size
+
+
+def verify_digest(digest, expected) -> str:
+    """
+    Compare a finished digest with the trailer stored in the image.
+
+    Returns:
+        str: The verified digest in hex
+
+    Raises:
+        ValueError: On a mismatch
+    """
+    actual = digest.digest()
+    if actual != bytes(expected):
+        raise ValueError(f"Integrity check failed: {digest.name} of the decoded data is "
+                         f"{actual.hex()}, image records {bytes(expected).hex()}")
+    return actual.hex()
+
+
+class HashingWriter:
+    """File-like sink that feeds a digest with everything written through it."""
+
+    def __init__(self, f, digest):
+        self._f = f
+        self.digest = digest
+
+    def write(self, data) -> int:
+        self.digest.update(data)
+        return self._f.write(data)
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Pixel layouts for packing bytes into images.
+
+The classic layout stores 3 payload bytes per RGB pixel. Denser layouts
+carry more bytes per pixel, so the same payload needs fewer pixels,
+scanlines and filter bytes:
+
+    L       1 byte per pixel   8-bit grayscale
+    RGB     3 bytes per pixel  8-bit RGB (default)
+    RGBA    4 bytes per pixel  8-bit RGBA
+    RGB16   6 bytes per pixel  16-bit-per-channel RGB
+    RGBA16  8 bytes per pixel  16-bit-per-channel RGBA
+
+Whatever the layout, the image's scanline bytes are the header, the
+payload, zero padding up to a whole pixel and then 0xFF fill. Pillow holds
+the 8-bit layouts directly; it has no in-memory 16-bit RGB mode, so the
+16-bit layouts are written and read by the streaming PNG writer and reader.
+The decoder recognises the layout from the PNG's colour type and bit depth.
+"""
+
+import struct
+from dataclasses import dataclass
+from typing import Optional
+
+from png_stream import (COLOR_TYPE_GRAY, COLOR_TYPE_RGB, COLOR_TYPE_RGBA, PNG_SIGNATURE)
+
+DEFAULT_PIXEL_MODE = "RGB"
+
+
+@dataclass(frozen=True)
+class PixelMode:
+    """
+    One pixel layout.
+
+    Attributes:
+        name (str): Layout name, e.g. ``RGBA16``
+        bytes_per_pixel (int): Payload bytes stored in each pixel
+        color_type (int): PNG colour type
+        bit_depth (int): PNG bits per channel
+        pil_mode (str | None): Pillow mode holding the bytes unchanged, None
+            for layouts Pillow cannot hold in memory
+    """
+    name: str
+    bytes_per_pixel: int
+    color_type: int
+    bit_depth: int
+    pil_mode: Optional[str]
+
+    @property
+    def white(self):
+        """Pillow fill colour of an all-0xFF pixel."""
+        return 255 if self.pil_mode == "L" else (255,) * len(self.pil_mode)
+
+
+PIXEL_MODES = {
+    mode.name: mode for mode in (
+        PixelMode("L", 1, COLOR_TYPE_GRAY, 8, "L"),
+        PixelMode("RGB", 3, COLOR_TYPE_RGB, 8, "RGB"),
+        PixelMode("RGBA", 4, COLOR_TYPE_RGBA, 8, "RGBA"),
+        PixelMode("RGB16", 6, COLOR_TYPE_RGB, 16, None),
+        PixelMode("RGBA16", 8, COLOR_TYPE_RGBA, 16, None),
+    )
+}
+PIXEL_MODE_NAMES = tuple(PIXEL_MODES)
+
+_IHDR = struct.Struct(">I4sIIBB")
+
+
+def get_pixel_mode(name: str) -> PixelMode:
+    """
+    Look up a layout by name (case-insensitive).
+
+    Raises:
+        ValueError: If the name is unknown
+    """
+    mode = PIXEL_MODES.get(name.upper())
+    if mode is None:
+        raise ValueError(f"Unknown pixel mode '{name}' (choose from {', '.join(PIXEL_MODE_NAMES)})")
+    return mode
+
+
+def pixel_mode_for_png(color_type: int, bit_depth: int) -> Optional[PixelMode]:
+    """The layout matching a PNG colour type and bit depth, or None."""
+    for mode in PIXEL_MODES.values():
+        if (mode.color_type, mode.bit_depth) == (color_type, bit_depth):
+            return mode
+    return None
+
+
+def pixel_mode_for_image(image) -> Optional[PixelMode]:
+    """The 8-bit layout matching a Pillow image's mode, or None."""
+    for mode in PIXEL_MODES.values():
+        if mode.pil_mode is not None and mode.pil_mode == image.mode:
+            return mode
+    return None
+
+
+def peek_png_pixel_mode(f) -> Optional[PixelMode]:
+    """
+    Read a PNG's layout from its IHDR without consuming the file.
+
+    Args:
+        f: Seekable binary file object positioned at the start of the image
+
+    Returns:
+        PixelMode | None: The layout, or None if ``f`` is not a PNG in one of our layouts
+    """
+    start = f.tell()
+    try:
+        head = f.read(len(PNG_SIGNATURE) + _IHDR.size)
+    finally:
+        f.seek(start)
+    if len(head) < len(PNG_SIGNATURE) + _IHDR.size or not head.startswith(PNG_SIGNATURE):
+        return None
+    _, chunk_type, _, _, bit_depth, color_type = _IHDR.unpack_from(head, len(PNG_SIGNATURE))
+    if chunk_type != b"IHDR":
+        return None
+    return pixel_mode_for_png(color_type, bit_depth)
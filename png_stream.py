@@ -0,0 +1,1016 @@
+#!/usr/bin/env python3
+"""
+Incremental PNG writer and reader.
+
+The writer emits a PNG file scanline block by scanline block: the signature
+and IHDR go out first, rows are deflated through a single zlib stream and
+emitted as IDAT chunks whenever enough compressed data has accumulated, and
+IEND closes the file. Rows are written with PNG filter type 0 (None).
+
+With several threads the filtered stream is cut into blocks that are
+deflated in parallel (pigz-style): each block ends on a sync flush, is primed
+with the previous block's last 32 KiB as a dictionary, and the per-block
+Adler-32 checksums are combined, so the result is one ordinary zlib stream.
+
+With an index the writer also starts an independently decodable deflate
+segment every few rows: the stream is fully flushed (no back-references
+across the boundary), the segment starts a new IDAT chunk, and the IDAT
+offsets are recorded in a private ``fiDX`` chunk placed just before IEND.
+Other PNG decoders ignore the chunk and see one ordinary zlib stream.
+An indexed image can also keep its first rows (the format header) stored,
+uncompressed, in an IDAT chunk of their own, so that ``PngAppender`` can
+rewrite them in place and re-deflate only the segments from the end of the
+data onward when bytes are appended.
+
+The reader parses chunks, inflates IDAT data incrementally and un-filters
+one scanline at a time; with an index it can start at any segment. Both
+keep memory bounded by the buffer size and a few scanlines, not by the
+image size.
+"""
+
+import itertools
+import shutil
+import struct
+import tempfile
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import List
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+# IHDR colour types
+COLOR_TYPE_GRAY = 0
+COLOR_TYPE_RGB = 2
+COLOR_TYPE_GRAY_ALPHA = 4
+COLOR_TYPE_RGBA = 6
+
+_CHANNELS = {COLOR_TYPE_GRAY: 1, COLOR_TYPE_RGB: 3, COLOR_TYPE_GRAY_ALPHA: 2, COLOR_TYPE_RGBA: 4}
+
+_CHUNK_HEAD = struct.Struct(">I4s")
+
+DEFAULT_BUFFER_SIZE = 4 * 1024 * 1024
+
+# Uncompressed bytes per block when deflating in parallel
+DEFAULT_BLOCK_SIZE = 1024 * 1024
+
+# Deflate window size; parallel blocks are primed with this much history
+_WINDOW_SIZE = 32 * 1024
+
+_ADLER_BASE = 65521
+
+# Ancillary, private, unsafe-to-copy chunk holding the segment index
+INDEX_CHUNK_TYPE = b"fiDX"
+INDEX_VERSION = 2
+# Version 1: rows per segment; version 2 adds the number of stored head rows
+_INDEX_HEADS = {1: struct.Struct(">BI"), 2: struct.Struct(">BII")}
+_INDEX_OFFSET = struct.Struct(">Q")
+_INDEX_COUNT = struct.Struct(">I")
+_IEND_CHUNK = b"\x00\x00\x00\x00IEND\xaeB`\x82"
+
+
+def write_chunk(f, chunk_type: bytes, data=b"") -> int:
+    """
+    Write one PNG chunk (length, type, data, CRC).
+
+    Args:
+        f: Binary file object
+        chunk_type (bytes): Four-letter chunk type
+        data (bytes-like): Chunk payload
+
+    Returns:
+        int: Number of bytes written
+    """
+    crc = zlib.crc32(data, zlib.crc32(chunk_type))
+    f.write(struct.pack(">I", len(data)) + chunk_type)
+    f.write(data)
+    f.write(struct.pack(">I", crc))
+    return 12 + len(data)
+
+
+def adler32_combine(adler1: int, adler2: int, length2: int) -> int:
+    """
+    Combine two Adler-32 checksums as zlib's ``adler32_combine`` does.
+
+    Args:
+        adler1 (int): Checksum of the first sequence
+        adler2 (int): Checksum of the second sequence
+        length2 (int): Length of the second sequence in bytes
+
+    Returns:
+        int: Checksum of the two sequences concatenated
+    """
+    remainder = length2 % _ADLER_BASE
+    sum1 = adler1 & 0xFFFF
+    sum2 = (remainder * sum1) % _ADLER_BASE
+    sum1 = (sum1 + (adler2 & 0xFFFF) + _ADLER_BASE - 1) % _ADLER_BASE
+    sum2 = (sum2 + (adler1 >> 16) + (adler2 >> 16) + _ADLER_BASE - remainder) % _ADLER_BASE
+    return sum1 | (sum2 << 16)
+
+
+def adler32_prefix(combined: int, adler2: int, length2: int) -> int:
+    """
+    Checksum of the first sequence, given the checksum of both and of the second.
+
+    The inverse of ``adler32_combine`` for its first argument.
+    """
+    remainder = length2 % _ADLER_BASE
+    sum1 = ((combined & 0xFFFF) - (adler2 & 0xFFFF) + 1) % _ADLER_BASE
+    sum2 = ((combined >> 16) - (adler2 >> 16) - remainder * sum1 + remainder) % _ADLER_BASE
+    return sum1 | (sum2 << 16)
+
+
+def adler32_suffix(combined: int, adler1: int, length2: int) -> int:
+    """
+    Checksum of the second sequence, given the checksum of both and of the first.
+
+    The inverse of ``adler32_combine`` for its second argument.
+    """
+    remainder = length2 % _ADLER_BASE
+    sum1 = ((combined & 0xFFFF) - (adler1 & 0xFFFF) + 1) % _ADLER_BASE
+    sum2 = ((combined >> 16) - (adler1 >> 16) - remainder * (adler1 & 0xFFFF)
+            + remainder) % _ADLER_BASE
+    return sum1 | (sum2 << 16)
+
+
+def zlib_stream_header(level: int) -> bytes:
+    """Two-byte zlib header (32 KiB window, no preset dictionary) for a compression level."""
+    cmf = 0x78
+    flevel = 0 if level in (0, 1) else 1 if level < 6 else 2 if level == 6 else 3
+    flg = flevel << 6
+    flg |= 31 - ((cmf << 8) | flg) % 31
+    return bytes((cmf, flg))
+
+
+def _deflate_block(block: bytes, dictionary: bytes, level: int):
+    """Raw-deflate one block ending on a sync flush; runs in a worker thread."""
+    if dictionary:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -15, zdict=dictionary)
+    else:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+    compressed = compressor.compress(block) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    return compressed, zlib.adler32(block)
+
+
+def _filter_rows(view, row_bytes: int) -> bytes:
+    """Filter type 0 (None): a zero byte in front of every scanline."""
+    if not len(view):
+        return b""
+    return b"\x00" + b"\x00".join(view[i:i + row_bytes] for i in range(0, len(view), row_bytes))
+
+
+def _stored_block(data) -> bytes:
+    """Raw deflate of ``data`` in stored (uncompressed) blocks, ending on a full flush."""
+    compressor = zlib.compressobj(0, zlib.DEFLATED, -15)
+    return compressor.compress(data) + compressor.flush(zlib.Z_FULL_FLUSH)
+
+
+class _SerialDeflater:
+    """
+    Single zlib stream, compressed on the calling thread.
+
+    With a starting ``adler`` the stream continues one that was started
+    elsewhere: raw deflate without a zlib header, with the checksum kept here.
+    """
+
+    def __init__(self, level: int, adler: int = None):
+        self.adler = adler
+        if adler is None:
+            self._compressor = zlib.compressobj(level)
+        else:
+            self._compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+
+    def compress(self, data) -> bytes:
+        if self.adler is not None:
+            self.adler = zlib.adler32(data, self.adler)
+        return self._compressor.compress(data)
+
+    def finish(self) -> bytes:
+        out = self._compressor.flush()
+        if self.adler is not None:
+            out += struct.pack(">I", self.adler)
+        return out
+
+    def flush_point(self) -> bytes:
+        """End the data so far on a byte boundary with no history carried over."""
+        return self._compressor.flush(zlib.Z_FULL_FLUSH)
+
+    def abort(self):
+        pass
+
+
+class _ParallelDeflater:
+    """
+    Deflate fixed-size blocks on a thread pool and stitch them into one zlib stream.
+
+    zlib releases the GIL while compressing, so the blocks really run in
+    parallel. At most ``2 * threads`` blocks are in flight, which bounds memory.
+    With a starting ``adler`` the zlib header is left out, as for ``_SerialDeflater``.
+    """
+
+    def __init__(self, level: int, threads: int, block_size: int, adler: int = None):
+        self.level = level
+        self.block_size = block_size
+        self._pool = ThreadPoolExecutor(max_workers=threads)
+        self._max_in_flight = 2 * threads
+        self._in_flight = deque()
+        self._block = bytearray()
+        self._dictionary = b""
+        self.adler = 1 if adler is None else adler
+        self._header = zlib_stream_header(level) if adler is None else b""
+
+    def compress(self, data) -> bytes:
+        out = bytearray(self._header)
+        self._header = b""
+
+        self._block += data
+        if len(self._block) >= self.block_size:
+            view = memoryview(self._block)
+            full = len(self._block) - len(self._block) % self.block_size
+            for start in range(0, full, self.block_size):
+                out += self._submit(bytes(view[start:start + self.block_size]))
+            view.release()
+            del self._block[:full]
+
+        out += self._collect(wait=False)
+        return bytes(out)
+
+    def finish(self) -> bytes:
+        out = bytearray(self._header)
+        self._header = b""
+        if self._block:
+            out += self._submit(bytes(self._block))
+            self._block = bytearray()
+        out += self._collect(wait=True)
+        self._pool.shutdown()
+
+        # Empty final block, then the combined checksum
+        out += zlib.compressobj(self.level, zlib.DEFLATED, -15).flush()
+        out += struct.pack(">I", self.adler)
+        return bytes(out)
+
+    def flush_point(self) -> bytes:
+        """
+        End the data so far on a byte boundary with no history carried over.
+
+        Blocks already end on a sync flush, so it is enough to close the
+        current block early and not prime the next one with a dictionary.
+        """
+        out = bytearray(self._header)
+        self._header = b""
+        if self._block:
+            out += self._submit(bytes(self._block))
+            self._block = bytearray()
+        out += self._collect(wait=True)
+        self._dictionary = b""
+        return bytes(out)
+
+    def abort(self):
+        for future, _ in self._in_flight:
+            future.cancel()
+        self._pool.shutdown()
+
+    def _submit(self, block: bytes) -> bytes:
+        out = b""
+        if len(self._in_flight) >= self._max_in_flight:
+            out = self._collect_one()
+        self._in_flight.append((self._pool.submit(_deflate_block, block, self._dictionary, self.level),
+                                len(block)))
+        self._dictionary = block[-_WINDOW_SIZE:]
+        return out
+
+    def _collect_one(self) -> bytes:
+        future, length = self._in_flight.popleft()
+        compressed, adler = future.result()
+        self.adler = adler32_combine(self.adler, adler, length)
+        return compressed
+
+    def _collect(self, wait: bool) -> bytes:
+        out = bytearray()
+        while self._in_flight and (wait or self._in_flight[0][0].done()):
+            out += self._collect_one()
+        return bytes(out)
+
+
+@dataclass
+class ResumePoint:
+    """
+    Where ``PngStreamWriter`` continues the deflate stream of an existing indexed image.
+
+    Attributes:
+        row (int): First row to write, the first row of a segment
+        offset (int): File offset of that segment from the PNG signature;
+            everything before it is already in the file
+        adler (int): Adler-32 of the filtered scanlines before ``row``
+        index_offsets (list[int]): Offsets of the segments before ``row``
+    """
+    row: int
+    offset: int
+    adler: int
+    index_offsets: List[int] = field(default_factory=list)
+
+
+class PngStreamWriter:
+    """
+    Write a PNG image row block by row block.
+
+    Usage:
+        with open(path, "wb") as f, PngStreamWriter(f, width, height) as writer:
+            for block in blocks:
+                writer.write_rows(block)
+    """
+
+    def __init__(self, f, width: int, height: int, color_type: int = COLOR_TYPE_RGB,
+                 bit_depth: int = 8, compress_level: int = 6,
+                 buffer_size: int = DEFAULT_BUFFER_SIZE, threads: int = 1,
+                 block_size: int = DEFAULT_BLOCK_SIZE, index_rows: int = 0,
+                 head_rows: int = 0, resume: ResumePoint = None):
+        """
+        Write the PNG signature and IHDR chunk, unless resuming.
+
+        Args:
+            f: Binary file object opened for writing
+            width (int): Image width in pixels
+            height (int): Image height in pixels
+            color_type (int): PNG colour type (gray, RGB or RGBA)
+            bit_depth (int): Bits per channel (8 or 16)
+            compress_level (int): zlib compression level (0-9)
+            buffer_size (int): Compressed bytes collected before an IDAT chunk is written
+            threads (int): Deflate threads; above 1 the stream is compressed in parallel blocks
+            block_size (int): Uncompressed bytes per parallel block
+            index_rows (int): Start an independently decodable segment every
+                ``index_rows`` rows and record the segments in a ``fiDX``
+                chunk; 0 writes no index
+            head_rows (int): Store the first ``head_rows`` rows uncompressed in
+                an IDAT chunk of their own, so they can be rewritten in place
+                (see ``PngAppender``). Needs an index with at least as many
+                rows per segment
+            resume (ResumePoint, optional): Continue the deflate stream of an
+                existing image from a segment boundary instead of starting a
+                new file; what is written belongs at ``resume.offset`` of the
+                image, and ``f`` may be that image or a spool for it
+        """
+        if not 0 < width < 2 ** 31 or not 0 < height < 2 ** 31:
+            raise ValueError(f"Invalid PNG dimensions: {width}x{height}")
+        if color_type not in _CHANNELS or bit_depth not in (8, 16):
+            raise ValueError(f"Unsupported PNG format: color type {color_type}, bit depth {bit_depth}")
+        if head_rows and head_rows > index_rows:
+            raise ValueError("Stored head rows need an index with at least as many rows per segment")
+
+        self.f = f
+        self.width = width
+        self.height = height
+        self.row_bytes = width * _CHANNELS[color_type] * bit_depth // 8
+        self.buffer_size = buffer_size
+        self.compress_level = compress_level
+        self.rows_written = 0
+        self.bytes_written = 0
+        self.index_rows = index_rows
+        self.index_offsets = []
+        self.head_rows = head_rows
+        self._head = bytearray()
+
+        # A stored head or a resumed stream means the zlib header and checksum are handled here
+        adler = None
+        if resume is not None:
+            self.rows_written = resume.row
+            self.bytes_written = resume.offset
+            self.index_offsets = list(resume.index_offsets) + [resume.offset]
+            adler = resume.adler
+        elif head_rows:
+            adler = 1
+        if threads > 1:
+            self._deflater = _ParallelDeflater(compress_level, threads, block_size, adler)
+        else:
+            self._deflater = _SerialDeflater(compress_level, adler)
+        self._pending = bytearray()
+        if resume is not None:
+            return
+
+        f.write(PNG_SIGNATURE)
+        self.bytes_written += len(PNG_SIGNATURE)
+        ihdr = struct.pack(">IIBBBBB", width, height, bit_depth, color_type, 0, 0, 0)
+        self.bytes_written += write_chunk(f, b"IHDR", ihdr)
+        if index_rows:
+            self.index_offsets.append(self.bytes_written)
+
+    def write_rows(self, data):
+        """
+        Filter and compress whole scanlines.
+
+        Args:
+            data (bytes-like): Raw pixel bytes, a whole number of rows
+        """
+        view = memoryview(data)
+        rows, remainder = divmod(len(view), self.row_bytes)
+        if remainder:
+            raise ValueError(f"Row data must be a multiple of {self.row_bytes} bytes")
+        if self.rows_written + rows > self.height:
+            raise ValueError("More rows written than the image height")
+        if not rows:
+            return
+
+        start = 0
+        if self.rows_written < self.head_rows:
+            start = min(rows, self.head_rows - self.rows_written)
+            self._head += view[:start * self.row_bytes]
+            self.rows_written += start
+            if self.rows_written == self.head_rows:
+                self._store_head()
+        if not self.index_rows:
+            self._compress_rows(view)
+            return
+        while start < rows:
+            if self.rows_written // self.index_rows >= len(self.index_offsets):
+                self._start_segment()
+            count = min(rows - start, self.index_rows - self.rows_written % self.index_rows)
+            self._compress_rows(view[start * self.row_bytes:(start + count) * self.row_bytes])
+            start += count
+
+    def _compress_rows(self, view):
+        """Filter and compress a whole number of rows."""
+        self._pending += self._deflater.compress(_filter_rows(view, self.row_bytes))
+        self.rows_written += len(view) // self.row_bytes
+
+        if len(self._pending) >= self.buffer_size:
+            self._flush_idat()
+
+    def _store_head(self):
+        """Write the zlib header and the stored head rows as the first IDAT chunk."""
+        filtered = _filter_rows(self._head, self.row_bytes)
+        self._pending += zlib_stream_header(self.compress_level) + _stored_block(filtered)
+        self._deflater.adler = zlib.adler32(filtered)
+        self._head = bytearray()
+        self._flush_idat()
+
+    def _start_segment(self):
+        """Fully flush the deflate stream and start the next segment in a new IDAT chunk."""
+        self._pending += self._deflater.flush_point()
+        self._flush_idat()
+        self.index_offsets.append(self.bytes_written)
+
+    def close(self):
+        """Finish the deflate stream and write the final IDAT and IEND chunks."""
+        if self._deflater is None:
+            return
+        if self.rows_written != self.height:
+            raise ValueError(f"Image has {self.height} rows but {self.rows_written} were written")
+
+        self._pending += self._deflater.finish()
+        self._deflater = None
+        self._flush_idat()
+        if self.index_rows:
+            self.bytes_written += write_chunk(self.f, INDEX_CHUNK_TYPE,
+                                              pack_index(self.index_rows, self.index_offsets,
+                                                         self.head_rows))
+        self.bytes_written += write_chunk(self.f, b"IEND")
+
+    def _flush_idat(self):
+        """Write the collected compressed bytes as one IDAT chunk."""
+        if self._pending:
+            self.bytes_written += write_chunk(self.f, b"IDAT", self._pending)
+            self._pending = bytearray()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        elif self._deflater is not None:
+            self._deflater.abort()
+        return False
+
+
+def pack_index(index_rows: int, offsets, head_rows: int = 0) -> bytes:
+    """
+    Serialize a segment index as ``fiDX`` chunk data.
+
+    The count comes last so a reader can find the chunk from the end of the file.
+
+    Args:
+        index_rows (int): Rows per segment
+        offsets (list[int]): Offset of each segment's first IDAT chunk from the PNG signature
+        head_rows (int): Rows stored uncompressed in the first IDAT chunk
+
+    Returns:
+        bytes: Chunk data
+    """
+    return (_INDEX_HEADS[INDEX_VERSION].pack(INDEX_VERSION, index_rows, head_rows)
+            + b"".join(_INDEX_OFFSET.pack(offset) for offset in offsets)
+            + _INDEX_COUNT.pack(len(offsets)))
+
+
+def _index_data_length(count: int, version: int = INDEX_VERSION) -> int:
+    """Length of ``fiDX`` chunk data holding ``count`` offsets."""
+    return _INDEX_HEADS[version].size + count * _INDEX_OFFSET.size + _INDEX_COUNT.size
+
+
+def _swar_masks(length: int):
+    """Masks selecting the high bit and the low seven bits of every byte."""
+    return int.from_bytes(b"\x80" * length, "little"), int.from_bytes(b"\x7f" * length, "little")
+
+
+def _add_bytes(a: int, b: int, high: int, low: int) -> int:
+    """Byte-wise addition modulo 256 of two byte strings packed into ints."""
+    return ((a & low) + (b & low)) ^ ((a ^ b) & high)
+
+
+def _unfilter_sub(raw, bpp: int, masks):
+    """Sub filter: running byte-wise sum along each channel (log-step scan)."""
+    length = len(raw)
+    high, low = masks
+    full = high | low
+    value = int.from_bytes(raw, "little")
+    shift = bpp
+    while shift < length:
+        value = _add_bytes(value, (value << (8 * shift)) & full, high, low)
+        shift *= 2
+    return value.to_bytes(length, "little")
+
+
+def _unfilter_up(raw, prior, masks):
+    """Up filter: byte-wise sum with the previous row."""
+    high, low = masks
+    value = _add_bytes(int.from_bytes(raw, "little"), int.from_bytes(prior, "little"), high, low)
+    return value.to_bytes(len(raw), "little")
+
+
+def _unfilter_average(raw, prior, bpp: int):
+    """Average filter: add the mean of the left and upper bytes."""
+    out = bytearray(raw)
+    for i in range(bpp):
+        out[i] = (out[i] + (prior[i] >> 1)) & 0xFF
+    for i in range(bpp, len(out)):
+        out[i] = (out[i] + ((out[i - bpp] + prior[i]) >> 1)) & 0xFF
+    return out
+
+
+def _unfilter_paeth(raw, prior, bpp: int):
+    """Paeth filter: add whichever of left, up and upper-left predicts best."""
+    out = bytearray(raw)
+    for i in range(bpp):
+        out[i] = (out[i] + prior[i]) & 0xFF
+    for i in range(bpp, len(out)):
+        a = out[i - bpp]
+        b = prior[i]
+        c = prior[i - bpp]
+        pa = abs(b - c)
+        pb = abs(a - c)
+        pc = abs(a + b - 2 * c)
+        if pa <= pb and pa <= pc:
+            predictor = a
+        elif pb <= pc:
+            predictor = b
+        else:
+            predictor = c
+        out[i] = (out[i] + predictor) & 0xFF
+    return out
+
+
+class PngStreamReader:
+    """
+    Read a non-interlaced PNG image one scanline at a time.
+
+    Usage:
+        with open(path, "rb") as f:
+            reader = PngStreamReader(f)
+            for row in reader.iter_rows():
+                ...
+
+    Filter types None, Sub and Up are undone with whole-row integer
+    arithmetic; Average and Paeth need a per-byte loop and are much slower.
+    Images written by ``PngStreamWriter`` only use filter type None.
+    """
+
+    def __init__(self, f, read_size: int = DEFAULT_BUFFER_SIZE):
+        """
+        Read the signature and every chunk up to the first IDAT.
+
+        Args:
+            f: Binary file object opened for reading
+            read_size (int): Bytes read and inflated per step
+
+        Raises:
+            ValueError: If the file is not a PNG or uses an unsupported layout
+        """
+        self.f = f
+        self.read_size = read_size
+        self._start = f.tell()
+
+        if f.read(len(PNG_SIGNATURE)) != PNG_SIGNATURE:
+            raise ValueError("Not a PNG file")
+
+        chunk_type, data = self._read_chunk()
+        if chunk_type != b"IHDR" or len(data) != 13:
+            raise ValueError("PNG file does not start with an IHDR chunk")
+        (self.width, self.height, self.bit_depth, self.color_type,
+         _, _, interlace) = struct.unpack(">IIBBBBB", data)
+
+        if self.color_type not in _CHANNELS or self.bit_depth not in (8, 16):
+            raise ValueError(f"Unsupported PNG format: color type {self.color_type}, "
+                             f"bit depth {self.bit_depth}")
+        if interlace:
+            raise ValueError("Interlaced PNG images are not supported")
+
+        self.channels = _CHANNELS[self.color_type]
+        self.bytes_per_pixel = self.channels * self.bit_depth // 8
+        self.row_bytes = self.width * self.bytes_per_pixel
+
+        # Skip ancillary chunks until the image data starts
+        while True:
+            length, chunk_type = self._read_chunk_head()
+            if chunk_type == b"IDAT":
+                self._idat_remaining = length
+                break
+            if chunk_type == b"IEND":
+                raise ValueError("PNG file has no image data")
+            self._skip_chunk_data(length)
+
+    def _read_exact(self, size: int) -> bytes:
+        """Read exactly ``size`` bytes or fail on truncation."""
+        data = self.f.read(size)
+        if len(data) != size:
+            raise ValueError("PNG file is truncated")
+        return data
+
+    def _read_chunk_head(self):
+        """Read a chunk's length and type."""
+        return _CHUNK_HEAD.unpack(self._read_exact(_CHUNK_HEAD.size))
+
+    def _read_chunk(self):
+        """Read a whole (small) chunk and verify its CRC."""
+        length, chunk_type = self._read_chunk_head()
+        data = self._read_exact(length)
+        (crc,) = struct.unpack(">I", self._read_exact(4))
+        if crc != zlib.crc32(data, zlib.crc32(chunk_type)):
+            raise ValueError(f"CRC mismatch in PNG {chunk_type.decode('latin-1')} chunk")
+        return chunk_type, data
+
+    def _skip_chunk_data(self, length: int):
+        """Skip a chunk's data and CRC."""
+        self.f.seek(length + 4, 1)
+
+    def _iter_idat_data(self):
+        """Yield the compressed image data, chunk piece by chunk piece."""
+        crc = zlib.crc32(b"IDAT")
+        while True:
+            remaining = self._idat_remaining
+            while remaining:
+                piece = self._read_exact(min(remaining, self.read_size))
+                crc = zlib.crc32(piece, crc)
+                remaining -= len(piece)
+                yield piece
+            (expected,) = struct.unpack(">I", self._read_exact(4))
+            if crc != expected:
+                raise ValueError("CRC mismatch in PNG IDAT chunk")
+
+            length, chunk_type = self._read_chunk_head()
+            if chunk_type != b"IDAT":
+                return
+            self._idat_remaining = length
+            crc = zlib.crc32(b"IDAT")
+
+    def read_index(self):
+        """
+        Read the segment index written by ``PngStreamWriter(index_rows=...)``.
+
+        The ``fiDX`` chunk sits just before IEND and is found from the end of
+        the file; the read position is restored afterwards.
+
+        Returns:
+            tuple[int, list[int]] | None: Rows per segment and each segment's
+            offset from the PNG signature, or None if the image has no index
+        """
+        index = self._read_index_chunk()
+        return None if index is None else (index[0], index[2])
+
+    def _read_index_chunk(self):
+        """
+        Read the ``fiDX`` chunk of any version.
+
+        Returns:
+            tuple[int, int, list[int]] | None: Rows per segment, stored head
+            rows (0 before version 2) and segment offsets, or None without an index
+        """
+        position = self.f.tell()
+        try:
+            end = self.f.seek(0, 2)
+            tail_size = _INDEX_COUNT.size + 4 + len(_IEND_CHUNK)
+            if end - self._start < len(PNG_SIGNATURE) + tail_size:
+                return None
+            self.f.seek(end - tail_size)
+            tail = self.f.read(tail_size)
+            if tail[-len(_IEND_CHUNK):] != _IEND_CHUNK:
+                return None
+            (count,) = _INDEX_COUNT.unpack_from(tail)
+            # The count is the same in every version; the head before the offsets is not
+            for version in sorted(_INDEX_HEADS, reverse=True):
+                length = _index_data_length(count, version)
+                chunk_start = end - len(_IEND_CHUNK) - 4 - length - _CHUNK_HEAD.size
+                if chunk_start < self._start + len(PNG_SIGNATURE):
+                    continue
+                self.f.seek(chunk_start)
+                if self._read_chunk_head() == (length, INDEX_CHUNK_TYPE):
+                    break
+            else:
+                return None
+            self.f.seek(chunk_start)
+            _, data = self._read_chunk()
+        finally:
+            self.f.seek(position)
+
+        if data[0] != version:
+            raise ValueError(f"Unsupported PNG segment index version {data[0]}")
+        head = _INDEX_HEADS[version]
+        fields = head.unpack_from(data)
+        index_rows, head_rows = fields[1], fields[2] if version >= 2 else 0
+        if not index_rows:
+            raise ValueError("PNG segment index has no rows per segment")
+        offsets = [offset for (offset,) in _INDEX_OFFSET.iter_unpack(
+            data[head.size:-_INDEX_COUNT.size])]
+        return index_rows, head_rows, offsets
+
+    def _iter_inflated(self, raw: bool = False):
+        """
+        Yield decompressed filtered scanline bytes in bounded pieces.
+
+        Args:
+            raw (bool): The data starts mid-stream at a segment boundary, with no zlib header
+        """
+        inflater = zlib.decompressobj(-15 if raw else 15)
+        for piece in self._iter_idat_data():
+            data = piece
+            while data:
+                out = inflater.decompress(data, self.read_size)
+                if out:
+                    yield out
+                data = inflater.unconsumed_tail
+            if inflater.eof:
+                return
+        tail = inflater.flush()
+        if tail:
+            yield tail
+
+    def iter_rows(self, start_row: int = 0):
+        """
+        Yield un-filtered scanlines from ``start_row`` to the bottom.
+
+        With a segment index, inflating starts at the segment holding
+        ``start_row``, so only the rows of that segment before it are
+        decoded and dropped; without one every earlier row is. A reader
+        yields its rows once.
+
+        Args:
+            start_row (int): First row to yield
+
+        Yields:
+            bytes-like: Raw pixel bytes of one row (``row_bytes`` long)
+
+        Raises:
+            ValueError: If the image data is corrupt or ends early
+        """
+        stride = self.row_bytes + 1
+        bpp = self.bytes_per_pixel
+        masks = _swar_masks(self.row_bytes)
+        prior = bytes(self.row_bytes)
+        row_number = 0
+        pieces = None
+
+        index = self.read_index() if start_row else None
+        if index is not None and start_row // index[0]:
+            segment = min(start_row // index[0], len(index[1]) - 1)
+            self.f.seek(self._start + index[1][segment])
+            length, chunk_type = self._read_chunk_head()
+            if chunk_type != b"IDAT":
+                raise ValueError("PNG segment index does not point at image data")
+            self._idat_remaining = length
+            pieces = self._iter_inflated(raw=True)
+            row_number = segment * index[0]
+            # The row above the segment is not decoded
+            prior = None
+        if pieces is None:
+            pieces = self._iter_inflated()
+        rows_left = self.height - row_number
+        pending = bytearray()
+
+        for piece in pieces:
+            pending += piece
+            offset = 0
+            while rows_left and len(pending) - offset >= stride:
+                filter_type = pending[offset]
+                raw = bytes(pending[offset + 1:offset + stride])
+                offset += stride
+
+                if filter_type == 0:
+                    row = raw
+                elif filter_type == 1:
+                    row = _unfilter_sub(raw, bpp, masks)
+                elif prior is None:
+                    raise ValueError("First row of an indexed PNG segment refers to the row above")
+                elif filter_type == 2:
+                    row = _unfilter_up(raw, prior, masks)
+                elif filter_type == 3:
+                    row = _unfilter_average(raw, prior, bpp)
+                elif filter_type == 4:
+                    row = _unfilter_paeth(raw, prior, bpp)
+                else:
+                    raise ValueError(f"Invalid PNG filter type {filter_type}")
+
+                rows_left -= 1
+                prior = row
+                row_number += 1
+                if row_number > start_row:
+                    yield row
+            del pending[:offset]
+            if not rows_left:
+                return
+
+        raise ValueError("PNG image data ended before the last row")
+
+
+class PngAppender:
+    """
+    Rewrite the bottom of an indexed PNG in place, keeping the segments above it.
+
+    The image must have a segment index with stored head rows (see
+    ``PngStreamWriter(index_rows=..., head_rows=...)``). ``rewrite`` replaces
+    the rows from a given row down, optionally growing the image in height:
+    the segments before the one holding that row are kept byte for byte, the
+    stored head rows and IHDR are rewritten in place (same size), and only the
+    rows from that segment's start are deflated again. The stream's Adler-32
+    is derived from the old checksum and those of the rewritten parts, so the
+    kept segments are not even read. The new rows are deflated into a spool
+    file first; the image itself is only changed once they are all written,
+    so a failing row source leaves it as it was.
+
+    Usage:
+        with open(path, "r+b") as f:
+            appender = PngAppender(f)
+            head = appender.read_rows(0, appender.head_rows)
+            appender.rewrite(new_head, first_row, blocks, new_height)
+    """
+
+    def __init__(self, f, read_size: int = DEFAULT_BUFFER_SIZE):
+        """
+        Read the image layout and its segment index.
+
+        Args:
+            f: Binary file object opened for reading and writing, holding only the PNG
+            read_size (int): Bytes read and inflated per step
+
+        Raises:
+            ValueError: If the file is not a PNG or has no index with stored head rows
+        """
+        self.f = f
+        self.read_size = read_size
+        f.seek(0)
+        reader = PngStreamReader(f, read_size)
+        index = reader._read_index_chunk()
+        if index is None or not index[1]:
+            raise ValueError("PNG image has no segment index with stored head rows")
+        self.index_rows, self.head_rows, self.offsets = index
+        self.width = reader.width
+        self.height = reader.height
+        self.color_type = reader.color_type
+        self.bit_depth = reader.bit_depth
+        self.row_bytes = reader.row_bytes
+
+    def _reader_at(self, offset: int) -> "PngStreamReader":
+        """A reader whose IDAT data starts at the chunk at ``offset``."""
+        self.f.seek(0)
+        reader = PngStreamReader(self.f, self.read_size)
+        self.f.seek(offset)
+        length, chunk_type = reader._read_chunk_head()
+        if chunk_type != b"IDAT":
+            raise ValueError("PNG segment index does not point at image data")
+        reader._idat_remaining = length
+        return reader
+
+    def read_rows(self, start_row: int, count: int) -> bytes:
+        """Raw pixel bytes of up to ``count`` rows from ``start_row``."""
+        self.f.seek(0)
+        rows = PngStreamReader(self.f, self.read_size).iter_rows(start_row)
+        return b"".join(itertools.islice(rows, count))
+
+    def _scan_segments(self, segment: int, keep_rows: int):
+        """
+        Inflate the old stream from a segment to its end.
+
+        Returns:
+            tuple: Raw bytes of the segment's first ``keep_rows`` rows, Adler-32
+            of the inflated data and the stream's stored Adler-32
+        """
+        stride = self.row_bytes + 1
+        inflater = zlib.decompressobj(-15)
+        kept = bytearray()
+        adler = 1
+        length = 0
+        trailer = b""
+        for piece in self._reader_at(self.offsets[segment])._iter_idat_data():
+            if inflater.eof:
+                trailer += piece
+            data = piece
+            while data and not inflater.eof:
+                out = inflater.decompress(data, self.read_size)
+                adler = zlib.adler32(out, adler)
+                if len(kept) < keep_rows * stride:
+                    kept += out[:keep_rows * stride - len(kept)]
+                length += len(out)
+                data = inflater.unconsumed_tail
+                if inflater.eof:
+                    trailer = inflater.unused_data
+            if len(trailer) >= 4:
+                break
+        if len(trailer) < 4 or length != (self.height - segment * self.index_rows) * stride:
+            raise ValueError("PNG image data ends early")
+        if any(kept[::stride]):
+            raise ValueError("Rows to keep use PNG filters other than None")
+        del kept[::stride]
+        return kept, adler, struct.unpack(">I", trailer[:4])[0]
+
+    def _splice(self, spool, offset: int):
+        """Replace the image from ``offset`` to its end with the spool's contents."""
+        spool.seek(0)
+        self.f.seek(offset)
+        shutil.copyfileobj(spool, self.f, self.read_size)
+        self.f.truncate()
+
+    def rewrite(self, head, first_row: int, blocks, height: int, compress_level: int = 6,
+                buffer_size: int = DEFAULT_BUFFER_SIZE, threads: int = 1, spool_dir: str = None):
+        """
+        Replace the head rows and every row from ``first_row`` down.
+
+        Args:
+            head (bytes-like): New raw bytes of the stored head rows
+            first_row (int): First row supplied by ``blocks``
+            blocks (iterable): Raw bytes of the rows from ``first_row`` to
+                ``height``, in blocks of whole rows
+            height (int): New image height, at least ``first_row``
+            compress_level (int): zlib level for the rewritten rows
+            buffer_size (int): Compressed bytes collected before an IDAT chunk is written
+            threads (int): Deflate threads for the rewritten rows
+            spool_dir (str, optional): Directory of the spool file holding the
+                new rows until they are complete (default: the system temp directory)
+
+        Raises:
+            ValueError: If the arguments do not fit the image or its data is corrupt
+        """
+        stride = self.row_bytes + 1
+        if len(head) != self.head_rows * self.row_bytes:
+            raise ValueError(f"Head must be {self.head_rows} rows")
+        if not 0 <= first_row <= min(self.height, height):
+            raise ValueError(f"Cannot rewrite from row {first_row} of {self.height}")
+        segment = min(first_row // self.index_rows, len(self.offsets) - 1)
+        start_row = segment * self.index_rows
+        options = dict(compress_level=compress_level, buffer_size=buffer_size, threads=threads,
+                       index_rows=self.index_rows, head_rows=self.head_rows)
+
+        if not segment:
+            # The change starts in the first segment: rewrite the whole, small, image
+            rows = bytearray(self.read_rows(0, first_row))
+            rows[:len(head)] = head[:len(rows)]
+            with tempfile.TemporaryFile(dir=spool_dir) as spool:
+                with PngStreamWriter(spool, self.width, height, self.color_type, self.bit_depth,
+                                     **options) as writer:
+                    writer.write_rows(rows)
+                    for block in blocks:
+                        writer.write_rows(block)
+                self._splice(spool, 0)
+            return
+
+        kept, tail_adler, stream_adler = self._scan_segments(segment, first_row - start_row)
+
+        # The stored head chunk keeps its size, so it is rewritten where it is
+        self.f.seek(self.offsets[0])
+        length, chunk_type = _CHUNK_HEAD.unpack(self.f.read(_CHUNK_HEAD.size))
+        old_chunk = self.f.read(length)
+        old_head = zlib.decompressobj().decompress(old_chunk)
+        new_head = _filter_rows(memoryview(head), self.row_bytes)
+        new_chunk = old_chunk[:2] + _stored_block(new_head)
+        if chunk_type != b"IDAT" or len(old_head) != len(new_head) or len(new_chunk) != length:
+            raise ValueError("PNG image does not start with stored head rows")
+
+        # Checksum of the kept middle segments from the old stream's, then the new prefix's
+        middle_length = (start_row - self.head_rows) * stride
+        head_and_middle = adler32_prefix(stream_adler, tail_adler,
+                                         (self.height - start_row) * stride)
+        middle = adler32_suffix(head_and_middle, zlib.adler32(old_head), middle_length)
+        prefix_adler = adler32_combine(zlib.adler32(new_head), middle, middle_length)
+
+        resume = ResumePoint(start_row, self.offsets[segment], prefix_adler, self.offsets[:segment])
+        with tempfile.TemporaryFile(dir=spool_dir) as spool:
+            with PngStreamWriter(spool, self.width, height, self.color_type, self.bit_depth,
+                                 resume=resume, **options) as writer:
+                if kept:
+                    writer.write_rows(kept)
+                for block in blocks:
+                    writer.write_rows(block)
+            # Every new row is written: only now is the image itself changed
+            self._splice(spool, self.offsets[segment])
+        self.f.seek(self.offsets[0])
+        write_chunk(self.f, b"IDAT", new_chunk)
+        self.f.seek(len(PNG_SIGNATURE))
+        write_chunk(self.f, b"IHDR", struct.pack(">IIBBBBB", self.width, height, self.bit_depth,
+                                                 self.color_type, 0, 0, 0))
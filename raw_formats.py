@@ -0,0 +1,440 @@
+#!/usr/bin/env python3
+"""
+Uncompressed image containers: BMP, binary PPM and TIFF.
+
+On fast local disks PNG's mandatory deflate is pure CPU overhead. These
+containers store the pixel bytes as they are, so encoding is a copy and
+decoding can memory-map the file and slice the payload straight out of the
+pixel region without a Pillow decode.
+
+Supported layouts (all 8 bits per channel, RGB):
+    BMP   24-bit BI_RGB, bottom-up or top-down rows, BGR order, rows padded to 4 bytes
+    PPM   binary P6 with maxval 255
+    TIFF  uncompressed, chunky RGB, any number of strips, either byte order
+
+The writer produces standard files that Pillow and other viewers open.
+"""
+
+import mmap
+import os
+import struct
+from typing import Optional
+
+RAW_FORMATS = ("bmp", "ppm", "tiff")
+IMAGE_FORMATS = ("png",) + RAW_FORMATS
+
+_EXTENSIONS = {
+    ".bmp": "bmp",
+    ".dib": "bmp",
+    ".ppm": "ppm",
+    ".pnm": "ppm",
+    ".tif": "tiff",
+    ".tiff": "tiff",
+}
+
+# Classic BMP and TIFF use 32-bit file offsets
+_MAX_FILE_SIZE = 2 ** 32 - 1
+
+_BMP_FILE_HEADER = struct.Struct("<2sIHHI")
+_BMP_INFO_HEADER = struct.Struct("<IiiHHIIiiII")
+
+# TIFF tags
+_TIFF_TYPES = {3: ("H", 2), 4: ("I", 4)}  # SHORT, LONG
+_IMAGE_WIDTH = 256
+_IMAGE_LENGTH = 257
+_BITS_PER_SAMPLE = 258
+_COMPRESSION = 259
+_PHOTOMETRIC = 262
+_STRIP_OFFSETS = 273
+_SAMPLES_PER_PIXEL = 277
+_ROWS_PER_STRIP = 278
+_STRIP_BYTE_COUNTS = 279
+_PLANAR_CONFIG = 284
+
+
+def format_from_extension(path: str) -> str:
+    """Image format implied by a file name; anything unknown is PNG."""
+    return _EXTENSIONS.get(os.path.splitext(path)[1].lower(), "png")
+
+
+def detect_raw_format(path: str) -> Optional[str]:
+    """
+    Identify a raw container by its leading bytes.
+
+    Returns:
+        str | None: ``bmp``, ``ppm`` or ``tiff``, or None for anything else
+    """
+    with open(path, "rb") as f:
+        magic = f.read(4)
+    if magic[:2] == b"BM":
+        return "bmp"
+    if magic[:2] == b"P6":
+        return "ppm"
+    if magic in (b"II*\x00", b"MM\x00*"):
+        return "tiff"
+    return None
+
+
+def _bmp_stride(width: int) -> int:
+    return (width * 3 + 3) & ~3
+
+
+def _rgb_to_bgr(data) -> bytearray:
+    """Swap the red and blue bytes of packed pixels (the swap is its own inverse)."""
+    out = bytearray(data)
+    # Slice the bytearray rather than ``data``: strided memoryview copies are slow
+    red = out[0::3]
+    out[0::3] = out[2::3]
+    out[2::3] = red
+    return out
+
+
+class RawImageWriter:
+    """
+    Write rows of RGB pixels into an uncompressed BMP, PPM or TIFF file.
+
+    Mirrors ``PngStreamWriter``: the container header is written up front and
+    rows are appended block by block, so memory stays bounded by one block.
+    BMP rows are stored bottom-up, so each block is placed by seeking; ``f``
+    must be seekable for BMP output.
+
+    Example:
+        with open("out.bmp", "wb") as f, RawImageWriter(f, "bmp", width, height) as writer:
+            writer.write_rows(pixel_bytes)
+    """
+
+    def __init__(self, f, image_format: str, width: int, height: int):
+        """
+        Write the container header.
+
+        Args:
+            f (file): Binary file opened for writing
+            image_format (str): ``bmp``, ``ppm`` or ``tiff``
+            width (int): Image width in pixels
+            height (int): Image height in pixels
+
+        Raises:
+            ValueError: If the format is unknown or the image is too large for it
+        """
+        if image_format not in RAW_FORMATS:
+            raise ValueError(f"Unsupported raw image format '{image_format}'")
+        if width <= 0 or height <= 0:
+            raise ValueError(f"Invalid image size {width}x{height}")
+
+        self.f = f
+        self.image_format = image_format
+        self.width = width
+        self.height = height
+        self.row_bytes = width * 3
+        self.rows_written = 0
+        self._closed = False
+
+        if image_format == "bmp":
+            self._stride = _bmp_stride(width)
+            header = self._bmp_header()
+        elif image_format == "ppm":
+            self._stride = self.row_bytes
+            header = b"P6\n%d %d\n255\n" % (width, height)
+        else:
+            self._stride = self.row_bytes
+            header = self._tiff_header()
+
+        if len(header) + self._stride * height > _MAX_FILE_SIZE and image_format != "ppm":
+            raise ValueError(f"Image too large for {image_format.upper()} (4 GiB limit)")
+        f.write(header)
+        self._pixel_offset = len(header)
+
+    def _bmp_header(self) -> bytes:
+        pixel_offset = _BMP_FILE_HEADER.size + _BMP_INFO_HEADER.size
+        image_size = self._stride * self.height
+        return (
+            _BMP_FILE_HEADER.pack(b"BM", min(pixel_offset + image_size, _MAX_FILE_SIZE), 0, 0,
+                                  pixel_offset)
+            + _BMP_INFO_HEADER.pack(_BMP_INFO_HEADER.size, self.width, self.height, 1, 24, 0,
+                                    min(image_size, _MAX_FILE_SIZE), 2835, 2835, 0, 0)
+        )
+
+    def _tiff_header(self) -> bytes:
+        entry_count = 10
+        ifd_size = 2 + entry_count * 12 + 4
+        bits_offset = 8 + ifd_size
+        pixel_offset = bits_offset + 6
+        entries = [
+            (_IMAGE_WIDTH, 4, 1, self.width),
+            (_IMAGE_LENGTH, 4, 1, self.height),
+            (_BITS_PER_SAMPLE, 3, 3, bits_offset),
+            (_COMPRESSION, 3, 1, 1),
+            (_PHOTOMETRIC, 3, 1, 2),
+            (_STRIP_OFFSETS, 4, 1, pixel_offset),
+            (_SAMPLES_PER_PIXEL, 3, 1, 3),
+            (_ROWS_PER_STRIP, 4, 1, self.height),
+            (_STRIP_BYTE_COUNTS, 4, 1, min(self.row_bytes * self.height, _MAX_FILE_SIZE)),
+            (_PLANAR_CONFIG, 3, 1, 1),
+        ]
+        ifd = struct.pack("<H", entry_count)
+        for tag, field_type, count, value in entries:
+            # SHORT values are left-justified in the 4-byte value field
+            packed = struct.pack("<HH", value, 0) if field_type == 3 and count == 1 else struct.pack("<I", value)
+            ifd += struct.pack("<HHI", tag, field_type, count) + packed
+        ifd += struct.pack("<I", 0)
+        return b"II*\x00" + struct.pack("<I", 8) + ifd + struct.pack("<HHH", 8, 8, 8)
+
+    def write_rows(self, data):
+        """
+        Append one or more complete RGB rows.
+
+        Args:
+            data (bytes-like): Row data, a whole number of rows
+
+        Raises:
+            ValueError: If the data is not whole rows or exceeds the image height
+        """
+        if len(data) % self.row_bytes:
+            raise ValueError(f"Row data must be a multiple of {self.row_bytes} bytes")
+        rows = len(data) // self.row_bytes
+        if self.rows_written + rows > self.height:
+            raise ValueError(f"Too many rows: image height is {self.height}")
+        if not rows:
+            return
+
+        if self.image_format != "bmp":
+            self.f.write(data)
+        else:
+            bgr = memoryview(_rgb_to_bgr(memoryview(data)))
+            # Bottom-up: the last row of the block comes first in the file
+            block = bytearray(rows * self._stride)
+            for row in range(rows):
+                dst = (rows - 1 - row) * self._stride
+                block[dst:dst + self.row_bytes] = bgr[row * self.row_bytes:(row + 1) * self.row_bytes]
+            self.f.seek(self._pixel_offset + (self.height - self.rows_written - rows) * self._stride)
+            self.f.write(block)
+        self.rows_written += rows
+
+    def close(self):
+        """
+        Finish the file.
+
+        Raises:
+            ValueError: If fewer rows than the image height were written
+        """
+        if self._closed:
+            return
+        if self.rows_written != self.height:
+            raise ValueError(f"Image has {self.height} rows but {self.rows_written} were written")
+        if self.image_format == "bmp":
+            self.f.seek(0, os.SEEK_END)
+        self._closed = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        return False
+
+
+class RawImage:
+    """
+    Memory-mapped view of an uncompressed BMP, PPM or TIFF image.
+
+    Pixel bytes are addressed as one logical top-down RGB buffer of
+    ``width * height * 3`` bytes. Where the file stores exactly that (PPM,
+    single-strip TIFF) ``read`` returns a memoryview into the mapping, so
+    nothing is copied until the bytes are written out; BMP rows are
+    reordered and converted from BGR one row at a time.
+    """
+
+    def __init__(self, path: str):
+        """
+        Map the file and parse its header.
+
+        Raises:
+            ValueError: If the file is not a supported uncompressed RGB image
+        """
+        self.path = path
+        self.image_format = detect_raw_format(path)
+        if self.image_format is None:
+            raise ValueError(f"'{path}' is not a BMP, PPM or TIFF image")
+
+        self._file = open(path, "rb")
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise ValueError(f"'{path}' is empty")
+        self._view = memoryview(self._map)
+
+        try:
+            if self.image_format == "bmp":
+                self._parse_bmp()
+            elif self.image_format == "ppm":
+                self._parse_ppm()
+            else:
+                self._parse_tiff()
+        except (struct.error, IndexError):
+            self.close()
+            raise ValueError(f"'{path}' has a truncated {self.image_format.upper()} header")
+        except ValueError:
+            self.close()
+            raise
+
+        self.row_bytes = self.width * 3
+        self.size = self.row_bytes * self.height
+
+    def _parse_bmp(self):
+        magic, _, _, _, pixel_offset = _BMP_FILE_HEADER.unpack_from(self._view, 0)
+        (info_size, width, height, _, bits, compression,
+         _, _, _, _, _) = _BMP_INFO_HEADER.unpack_from(self._view, _BMP_FILE_HEADER.size)
+        if info_size < _BMP_INFO_HEADER.size:
+            raise ValueError("Unsupported BMP header (OS/2 bitmaps are not supported)")
+        if bits != 24 or compression != 0:
+            raise ValueError(f"Only uncompressed 24-bit BMP is supported (got {bits}-bit, "
+                             f"compression {compression})")
+        self.width = width
+        self.height = abs(height)
+        self._top_down = height < 0
+        self._stride = _bmp_stride(width)
+        self._segments = None
+        self._pixel_offset = pixel_offset
+        if pixel_offset + self._stride * self.height > len(self._map):
+            raise ValueError("BMP pixel data is truncated")
+
+    def _parse_ppm(self):
+        # Header: "P6" then width, height and maxval separated by whitespace and comments
+        fields = []
+        offset = 2
+        while len(fields) < 3:
+            while self._map[offset:offset + 1].isspace():
+                offset += 1
+            if self._map[offset:offset + 1] == b"#":
+                offset = self._map.find(b"\n", offset) + 1
+                if offset == 0:
+                    raise ValueError("PPM header is truncated")
+                continue
+            start = offset
+            while self._map[offset:offset + 1].isdigit():
+                offset += 1
+            if start == offset:
+                raise ValueError("PPM header is malformed")
+            fields.append(int(self._map[start:offset]))
+        width, height, maxval = fields
+        if maxval != 255:
+            raise ValueError(f"Only 8-bit PPM is supported (maxval {maxval})")
+        self.width = width
+        self.height = height
+        # Exactly one whitespace byte separates the header from the pixels
+        self._segments = [(0, offset + 1, width * height * 3)]
+
+    def _parse_tiff(self):
+        endian = "<" if self._map[:2] == b"II" else ">"
+        (ifd_offset,) = struct.unpack_from(endian + "I", self._view, 4)
+        (count,) = struct.unpack_from(endian + "H", self._view, ifd_offset)
+
+        tags = {}
+        for index in range(count):
+            entry = ifd_offset + 2 + index * 12
+            tag, field_type, value_count = struct.unpack_from(endian + "HHI", self._view, entry)
+            if field_type not in _TIFF_TYPES:
+                continue
+            code, size = _TIFF_TYPES[field_type]
+            value_offset = entry + 8
+            if value_count * size > 4:
+                (value_offset,) = struct.unpack_from(endian + "I", self._view, entry + 8)
+            tags[tag] = list(struct.unpack_from(f"{endian}{value_count}{code}", self._view, value_offset))
+
+        def tag_value(tag, default=None):
+            values = tags.get(tag)
+            if values is None:
+                if default is None:
+                    raise ValueError(f"TIFF is missing tag {tag}")
+                return default
+            return values[0]
+
+        if tag_value(_COMPRESSION, 1) != 1:
+            raise ValueError("Only uncompressed TIFF is supported")
+        if (tag_value(_PHOTOMETRIC) != 2 or tag_value(_SAMPLES_PER_PIXEL, 1) != 3
+                or tags.get(_BITS_PER_SAMPLE, [1]) != [8, 8, 8] or tag_value(_PLANAR_CONFIG, 1) != 1):
+            raise ValueError("Only 8-bit chunky RGB TIFF is supported")
+
+        self.width = tag_value(_IMAGE_WIDTH)
+        self.height = tag_value(_IMAGE_LENGTH)
+        offsets = tags.get(_STRIP_OFFSETS, [])
+        counts = tags.get(_STRIP_BYTE_COUNTS, [])
+        if not offsets or len(offsets) != len(counts):
+            raise ValueError("TIFF strip table is malformed")
+
+        # Logical offset, file offset and length of every strip
+        self._segments = []
+        logical = 0
+        for file_offset, length in zip(offsets, counts):
+            self._segments.append((logical, file_offset, length))
+            logical += length
+        if logical < self.width * self.height * 3:
+            raise ValueError("TIFF pixel data is truncated")
+
+    def read(self, start: int, end: int):
+        """
+        Pixel bytes ``[start, end)`` of the logical top-down RGB buffer.
+
+        Returns:
+            memoryview | bytes: A view into the mapping when the range is stored
+            contiguously as RGB, otherwise a copy
+        """
+        start = max(0, start)
+        end = min(end, self.size)
+        if end <= start:
+            return b""
+        if self._segments is None:
+            return self._read_bmp(start, end)
+
+        pieces = []
+        for logical, file_offset, length in self._segments:
+            if logical + length <= start or logical >= end:
+                continue
+            piece_start = max(start, logical) - logical + file_offset
+            piece_end = min(end, logical + length) - logical + file_offset
+            if piece_end > len(self._map):
+                raise ValueError("Image pixel data is truncated")
+            pieces.append(self._view[piece_start:piece_end])
+        return pieces[0] if len(pieces) == 1 else b"".join(pieces)
+
+    def _read_bmp(self, start: int, end: int) -> bytes:
+        out = bytearray()
+        first_row, last_row = start // self.row_bytes, (end - 1) // self.row_bytes
+        for row in range(first_row, last_row + 1):
+            stored_row = row if self._top_down else self.height - 1 - row
+            row_start = self._pixel_offset + stored_row * self._stride
+            out += self._view[row_start:row_start + self.row_bytes]
+        out = _rgb_to_bgr(out)
+        skip = start - first_row * self.row_bytes
+        return bytes(out[skip:skip + end - start])
+
+    def iter_chunks(self, start: int, end: int, chunk_size: int = 1 << 24):
+        """
+        Yield the pixel bytes ``[start, end)`` in pieces of at most ``chunk_size`` bytes.
+
+        Each piece is only valid until the next one is requested; views into
+        the mapping are released as the iteration moves on.
+        """
+        chunk_size = max(chunk_size - chunk_size % self.row_bytes, self.row_bytes)
+        for chunk_start in range(start, min(end, self.size), chunk_size):
+            chunk = self.read(chunk_start, min(chunk_start + chunk_size, end))
+            yield chunk
+            if isinstance(chunk, memoryview):
+                chunk.release()
+
+    def close(self):
+        """Release the mapping and the file."""
+        if self._view is not None:
+            self._view.release()
+            self._view = None
+            self._map.close()
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
@@ -46,7 +46,9 @@ setup(
         "Topic :: System :: Archiving",
     ],
     keywords="encoding, decoding, image, steganography, data, conversion",
-    py_modules=["Encode", "Decode"],
+    py_modules=["Encode", "Decode", "async_api", "batch", "compression", "compression_profile", "fec",
+                "file_cache", "image_header", "instrumentation", "integrity", "pixel_modes", "png_stream",
+                "raw_formats", "shard_manifest", "sizes"],
     python_requires=">=3.8",
     install_requires=requirements,
     extras_require={
@@ -57,6 +59,7 @@ setup(
         "console_scripts": [
             "file-to-image-encode=Encode:main",
             "file-to-image-decode=Decode:main",
+            "file-to-image-batch=batch:main",
         ],
     },
 )
\ No newline at end of file
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Manifest for files encoded as several shard images.
+
+A large input is split into fixed-size byte ranges, each encoded into its own
+image. The manifest is a small JSON document next to the shards that records
+their order, byte offsets, sizes and SHA-256 checksums, so the shards can be
+decoded in parallel and written straight to their offsets in the output.
+
+Example:
+    {
+        "format": "file-to-image-shards",
+        "version": 1,
+        "file_size": 150000000,
+        "shard_size": 67108864,
+        "shards": [
+            {"index": 0, "file": "backup.00000.png", "offset": 0,
+             "size": 67108864, "sha256": "..."},
+            ...
+        ]
+    }
+"""
+
+import json
+import os
+from dataclasses import asdict, dataclass, field
+from typing import List
+
+MANIFEST_FORMAT = "file-to-image-shards"
+MANIFEST_VERSION = 1
+
+DEFAULT_SHARD_SIZE = 64 * 1024 * 1024
+
+
+@dataclass
+class ShardEntry:
+    """
+    One shard of a sharded file.
+
+    Attributes:
+        index (int): Position of the shard in the file
+        file (str): Shard image path, relative to the manifest
+        offset (int): Byte offset of the shard's payload in the original file
+        size (int): Payload size in bytes
+        sha256 (str): Hex SHA-256 of the payload
+    """
+    index: int
+    file: str
+    offset: int
+    size: int
+    sha256: str = ""
+
+
+@dataclass
+class ShardManifest:
+    """
+    Ordered list of shards making up one file.
+
+    Attributes:
+        file_size (int): Size of the original file in bytes
+        shard_size (int): Maximum payload bytes per shard
+        shards (list[ShardEntry]): Shards in file order
+    """
+    file_size: int
+    shard_size: int
+    shards: List[ShardEntry] = field(default_factory=list)
+
+    def save(self, path: str):
+        """Write the manifest as JSON."""
+        document = {
+            "format": MANIFEST_FORMAT,
+            "version": MANIFEST_VERSION,
+            "file_size": self.file_size,
+            "shard_size": self.shard_size,
+            "shards": [asdict(shard) for shard in self.shards],
+        }
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(document, f, indent=2)
+            f.write("\n")
+
+    @classmethod
+    def load(cls, path: str) -> "ShardManifest":
+        """
+        Read and validate a manifest.
+
+        Raises:
+            ValueError: If the file is not a valid shard manifest
+        """
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                document = json.load(f)
+        except (OSError, UnicodeDecodeError, json.JSONDecodeError) as e:
+            raise ValueError(f"Cannot read shard manifest '{path}': {e}")
+
+        if not isinstance(document, dict) or document.get("format") != MANIFEST_FORMAT:
+            raise ValueError(f"'{path}' is not a shard manifest")
+        if document.get("version", 0) > MANIFEST_VERSION:
+            raise ValueError(f"Unsupported shard manifest version {document['version']}")
+
+        manifest = cls(
+            file_size=document["file_size"],
+            shard_size=document["shard_size"],
+            shards=[ShardEntry(**shard) for shard in document["shards"]],
+        )
+
+        # Shards must tile the file exactly, in order
+        expected_offset = 0
+        for position, shard in enumerate(manifest.shards):
+            if shard.index != position or shard.offset != expected_offset:
+                raise ValueError(f"Shard manifest '{path}' is out of order at shard {position}")
+            expected_offset += shard.size
+        if expected_offset != manifest.file_size:
+            raise ValueError(f"Shard manifest '{path}' does not cover the whole file")
+
+        return manifest
+
+
+def is_manifest(path: str) -> bool:
+    """Check whether a path looks like a shard manifest (by extension)."""
+    return os.path.splitext(path)[1].lower() == ".json"
+
+
+def shard_file_name(manifest_path: str, index: int, extension: str = ".png") -> str:
+    """Shard image file name derived from the manifest name, e.g. ``backup.00003.png``."""
+    stem = os.path.splitext(os.path.basename(manifest_path))[0]
+    return f"{stem}.{index:05d}{extension}"
@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+"""
+Byte sizes on the command line.
+
+``Encode.py`` and ``Decode.py`` accept sizes such as ``4096``, ``64K`` or
+``2G`` for buffers, segments, shards and caches, and ``OFFSET:LENGTH`` byte
+ranges. The parsers here are used as argparse ``type`` callables so a
+malformed value is reported as a usage error.
+"""
+
+import argparse
+
+
+def parse_size(text: str) -> int:
+    """
+    Parse a byte size such as ``4096``, ``64K``, ``64M`` or ``2G``.
+
+    Raises:
+        argparse.ArgumentTypeError: If the size cannot be parsed
+    """
+    units = {"K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+    text = text.strip().upper().rstrip("B")
+    multiplier = units.get(text[-1:], 1)
+    number = text[:-1] if text[-1:] in units else text
+    try:
+        return int(float(number) * multiplier)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid size: '{text}'")
+
+
+def parse_range(text: str) -> tuple:
+    """
+    Parse a byte range ``OFFSET:LENGTH`` whose parts are sizes, e.g. ``100M:4K``.
+
+    Returns:
+        tuple[int, int]: Offset and length
+
+    Raises:
+        argparse.ArgumentTypeError: If the range cannot be parsed or is negative
+    """
+    offset, separator, length = text.partition(":")
+    if not separator:
+        raise argparse.ArgumentTypeError(f"invalid range: '{text}' (expected OFFSET:LENGTH)")
+    offset, length = parse_size(offset), parse_size(length)
+    if offset < 0 or length < 0:
+        raise argparse.ArgumentTypeError(f"invalid range: '{text}' (must not be negative)")
+    return offset, length
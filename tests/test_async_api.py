@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the asyncio API.
+"""
+
+import asyncio
+import contextlib
+import io
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+# Add the project root to the path to import our modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from async_api import AsyncFileImageCodec, decode_image_async, encode_file_async
+
+
+class TestAsyncApi(unittest.TestCase):
+    """Test cases for the async encode/decode wrappers."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        self.test_dir = tempfile.mkdtemp()
+        self.input_files = []
+        for index in range(6):
+            path = os.path.join(self.test_dir, f"input{index}.bin")
+            with open(path, "wb") as f:
+                f.write(os.urandom(1000 + index * 500))
+            self.input_files.append(path)
+
+    def tearDown(self):
+        """Clean up test fixtures."""
+        shutil.rmtree(self.test_dir)
+
+    def test_concurrent_round_trip(self):
+        """Test many concurrent requests with structured results and no printing."""
+        async def round_trip(codec, path):
+            image = path + ".png"
+            encoded = await codec.encode(path, image)
+            decoded = await codec.decode(image, path + ".out")
+            return encoded, decoded
+        
+        async def run():
+            async with AsyncFileImageCodec(max_concurrency=3) as codec:
+                return await asyncio.gather(*(round_trip(codec, path) for path in self.input_files))
+        
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            results = asyncio.run(run())
+        self.assertEqual(output.getvalue(), "")
+        
+        for path, (encoded, decoded) in zip(self.input_files, results):
+            self.assertEqual(encoded.input_size, os.path.getsize(path))
+            self.assertEqual(encoded.image_format, "png")
+            self.assertEqual(decoded.data_length, encoded.input_size)
+            with open(path, "rb") as original, open(path + ".out", "rb") as restored:
+                self.assertEqual(original.read(), restored.read())
+
+    def test_module_functions(self):
+        """Test the single-call helpers and error propagation."""
+        path = self.input_files[0]
+        result = asyncio.run(encode_file_async(path, path + ".png"))
+        self.assertGreater(result.output_size, 0)
+        asyncio.run(decode_image_async(path + ".png", path + ".out", method="smart"))
+        with open(path, "rb") as original, open(path + ".out", "rb") as restored:
+            self.assertEqual(original.read(), restored.read())
+        
+        with self.assertRaises(FileNotFoundError):
+            asyncio.run(encode_file_async(os.path.join(self.test_dir, "missing"), path + ".png"))
+
+    def test_concurrency_limit_and_cancellation(self):
+        """Test that at most max_concurrency calls run and queued requests can be cancelled."""
+        lock = threading.Lock()
+        active = [0, 0]  # current, peak
+        
+        def slow_encode(input_file, output_image, **options):
+            with lock:
+                active[0] += 1
+                active[1] = max(active[1], active[0])
+            time.sleep(0.05)
+            with open(output_image, "wb") as f:
+                f.write(b"partial")
+            with lock:
+                active[0] -= 1
+        
+        async def run():
+            async with AsyncFileImageCodec(max_concurrency=2) as codec:
+                tasks = [asyncio.ensure_future(codec.encode(path, path + ".png"))
+                         for path in self.input_files]
+                await asyncio.sleep(0.01)
+                tasks[-1].cancel()
+                return await asyncio.gather(*tasks, return_exceptions=True)
+        
+        with patch("async_api.encode_file_to_image", slow_encode):
+            results = asyncio.run(run())
+        
+        self.assertEqual(active[1], 2)
+        self.assertIsInstance(results[-1], asyncio.CancelledError)
+        self.assertFalse(os.path.exists(self.input_files[-1] + ".png"))
+        self.assertTrue(os.path.exists(self.input_files[0] + ".png"))
+
+    def test_cancelled_running_call_keeps_its_slot(self):
+        """Test that a cancelled call still running on a shared executor holds its slot."""
+        started = []
+        release = threading.Event()
+        
+        def blocking_encode(input_file, output_image, **options):
+            started.append(input_file)
+            release.wait(5)
+        
+        async def run(executor):
+            codec = AsyncFileImageCodec(max_concurrency=1, executor=executor)
+            first_path, second_path = self.input_files[:2]
+            first = asyncio.ensure_future(codec.encode(first_path, first_path + ".png"))
+            while not started:
+                await asyncio.sleep(0.005)
+            first.cancel()
+            second = asyncio.ensure_future(codec.encode(second_path, second_path + ".png"))
+            await asyncio.sleep(0.1)
+            admitted_early = len(started) > 1
+            release.set()
+            await second
+            return admitted_early, first.cancelled()
+        
+        with ThreadPoolExecutor(max_workers=4) as executor, \
+                patch("async_api.encode_file_to_image", blocking_encode):
+            admitted_early, cancelled = asyncio.run(run(executor))
+        
+        self.assertTrue(cancelled)
+        self.assertFalse(admitted_early)
+        self.assertEqual(started, self.input_files[:2])
+
+
+if __name__ == "__main__":
+    unittest.main()
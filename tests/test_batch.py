@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the batch module.
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+# Add the project root to the path to import our modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from batch import collect_inputs, output_path_for, run_batch
+
+
+class TestBatch(unittest.TestCase):
+    """Test cases for batch encoding and decoding."""
+
+    def setUp(self):
+        """Set up a small input tree."""
+        self.test_dir = tempfile.mkdtemp()
+        self.input_dir = os.path.join(self.test_dir, "input")
+        self.files = {
+            "a.txt": b"first file",
+            os.path.join("sub", "b.bin"): os.urandom(2000),
+            os.path.join("sub", "deep", "c.csv"): b"x,y\n1,2\n" * 100,
+        }
+        for relative, content in self.files.items():
+            path = os.path.join(self.input_dir, relative)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "wb") as f:
+                f.write(content)
+
+    def tearDown(self):
+        """Clean up test fixtures."""
+        shutil.rmtree(self.test_dir)
+
+    def test_collect_inputs(self):
+        """Test expanding directories, globs and file lists."""
+        from_dir = collect_inputs([self.input_dir])
+        self.assertEqual(sorted(relative for _, relative in from_dir), sorted(self.files))
+        
+        from_glob = collect_inputs([os.path.join(self.input_dir, "**", "*.csv")])
+        self.assertEqual([relative for _, relative in from_glob], [os.path.join("sub", "deep", "c.csv")])
+        
+        file_list = os.path.join(self.test_dir, "list.txt")
+        with open(file_list, "w", encoding="utf-8") as f:
+            f.write("# comment\n\n" + os.path.join(self.input_dir, "a.txt") + "\n")
+        self.assertEqual(collect_inputs(["@" + file_list]),
+                         [(os.path.join(self.input_dir, "a.txt"), "a.txt")])
+        
+        with self.assertRaises(FileNotFoundError):
+            collect_inputs([os.path.join(self.test_dir, "missing")])
+
+    def test_output_path_for(self):
+        """Test mirrored output names."""
+        self.assertEqual(output_path_for(os.path.join("d", "x.txt"), "out", "encode"),
+                         os.path.join("out", "d", "x.txt.png"))
+        self.assertEqual(output_path_for(os.path.join("d", "x.txt.png"), "out", "decode"),
+                         os.path.join("out", "d", "x.txt"))
+        self.assertEqual(output_path_for("x.dat", "out", "decode"), os.path.join("out", "x.dat.out"))
+
+    def test_round_trip_mirrors_layout(self):
+        """Test encoding and decoding a tree, with one failing file that does not abort the run."""
+        open(os.path.join(self.input_dir, "empty.txt"), "wb").close()
+        encoded_dir = os.path.join(self.test_dir, "encoded")
+        restored_dir = os.path.join(self.test_dir, "restored")
+        
+        results = run_batch("encode", [self.input_dir], encoded_dir, workers=2)
+        self.assertEqual(len(results), 4)
+        failed = [result for result in results if not result.ok]
+        self.assertEqual([os.path.basename(result.input_path) for result in failed], ["empty.txt"])
+        self.assertIn("empty", failed[0].error)
+        
+        results = run_batch("decode", [encoded_dir], restored_dir, workers=2)
+        self.assertTrue(all(result.ok for result in results))
+        for relative, content in self.files.items():
+            with open(os.path.join(restored_dir, relative), "rb") as f:
+                self.assertEqual(f.read(), content)
+
+
+if __name__ == "__main__":
+    unittest.main()
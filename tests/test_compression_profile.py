@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the compression profile selection.
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+# Add the project root to the path to import our modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from compression_profile import choose_profile, sample_compression_ratio
+
+
+class TestCompressionProfile(unittest.TestCase):
+    """Test cases for picking PNG compression settings."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        self.test_dir = tempfile.mkdtemp()
+        self.random_file = os.path.join(self.test_dir, "random.bin")
+        self.text_file = os.path.join(self.test_dir, "text.txt")
+        with open(self.random_file, "wb") as f:
+            f.write(os.urandom(1024 * 1024))
+        with open(self.text_file, "wb") as f:
+            f.write(b"The quick brown fox jumps over the lazy dog.\n" * 20000)
+
+    def tearDown(self):
+        """Clean up test fixtures."""
+        shutil.rmtree(self.test_dir)
+
+    def test_sample_ratio(self):
+        """Test that random data samples as incompressible and text does not."""
+        self.assertGreater(sample_compression_ratio(self.random_file), 0.97)
+        self.assertLess(sample_compression_ratio(self.text_file), 0.1)
+
+    def test_auto_profile(self):
+        """Test that auto stores incompressible data and deflates the rest."""
+        stored = choose_profile("auto", self.random_file)
+        self.assertEqual(stored.name, "auto/stored")
+        self.assertEqual(stored.compress_level, 0)
+        self.assertFalse(stored.adaptive_filter)
+        self.assertIn("sample ratio", stored.describe())
+        
+        deflated = choose_profile("auto", self.text_file)
+        self.assertEqual(deflated.name, "auto/balanced")
+        self.assertTrue(deflated.adaptive_filter)
+        
+        # Random payload in a mostly white image still deflates
+        mostly_white = choose_profile("auto", self.random_file, image_bytes=20 * 1024 * 1024)
+        self.assertNotEqual(mostly_white.name, "auto/stored")
+
+    def test_fixed_profiles(self):
+        """Test that fixed profiles ignore the input."""
+        self.assertEqual(choose_profile("fast", self.text_file).compress_level, 1)
+        self.assertEqual(choose_profile("small", self.random_file).compress_level, 9)
+        self.assertIsNone(choose_profile("balanced", self.random_file).sample_ratio)
+        with self.assertRaises(ValueError):
+            choose_profile("tiny", self.text_file)
+
+
+if __name__ == "__main__":
+    unittest.main()
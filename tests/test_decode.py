@@ -3,6 +3,7 @@
 Unit tests for the Decode.py module.
 """
 
+import io
 import os
 import tempfile
 import unittest
@@ -13,8 +14,11 @@ import shutil
 # Add the project root to the path to import our modules
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from Decode import decode_image_to_file, count_non_white_pixels, find_data_end_smart
-from Encode import encode_file_to_image
+from Decode import (decode_image_bytes, decode_image_into, decode_image_range, decode_image_to_file,
+                    decode_shards_to_file, count_non_white_pixels, find_data_end_smart,
+                    find_data_end_in_buffer, trailing_strip_length, trusted_image_size)
+from Encode import encode_bytes_to_png, encode_file_to_image, encode_file_to_shards, write_encoded_image
+from image_header import parse_header
 
 
 class TestDecode(unittest.TestCase):
@@ -64,6 +68,28 @@ class TestDecode(unittest.TestCase):
         data_pixels = find_data_end_smart(img)
         self.assertEqual(data_pixels, 36)
 
+    def test_data_end_near_white_and_band_edges(self):
+        """Test that smart detection treats near-white pixels as data at any band edge."""
+        img = Image.new("RGB", (7, 40), color=(255, 255, 255))
+        img.putpixel((0, 0), (1, 2, 3))
+        img.putpixel((6, 31), (255, 255, 254))  # Only the blue channel differs
+        
+        expected = 31 * 7 + 6 + 1
+        for band_rows in (1, 8, 9, 64):
+            self.assertEqual(find_data_end_smart(img, band_rows=band_rows), expected)
+        self.assertEqual(find_data_end_in_buffer(img.tobytes()), expected)
+        self.assertEqual(count_non_white_pixels(img), 2)
+
+    def test_trailing_strip_length(self):
+        """Test chunked trailing-byte stripping against bytes.rstrip."""
+        samples = [b"", b"\x00\x00", b"AB\x00", b"A" + b"\x00" * 100, b"\x00A\x00B" + b"\x00" * 7]
+        for sample in samples:
+            for chunk_size in (1, 2, 3, 64):
+                self.assertEqual(
+                    trailing_strip_length(memoryview(sample), b"\x00", chunk_size),
+                    len(sample.rstrip(b"\x00"))
+                )
+
     def test_round_trip_encoding_decoding(self):
         """Test complete round-trip: encode then decode."""
         # Encode the test file
@@ -179,6 +205,217 @@ class TestDecode(unittest.TestCase):
         
         self.assertEqual(decoded, padded_data)
 
+    def test_decode_trailing_zero_and_white_bytes(self):
+        """Test that the header keeps payloads ending in 0x00 or FF FF FF intact."""
+        for payload in (b"data\x00\x00\x00\x00", b"data\xff\xff\xff\xff\xff\xff", b"\x00"):
+            data_file = os.path.join(self.test_dir, "edge.dat")
+            with open(data_file, "wb") as f:
+                f.write(payload)
+            
+            encode_file_to_image(data_file, self.test_image)
+            decode_image_to_file(self.test_image, self.decoded_file)
+            
+            with open(self.decoded_file, "rb") as f:
+                self.assertEqual(f.read(), payload)
+
+    def test_decode_legacy_image_without_header(self):
+        """Test that headerless images still decode with both scan methods."""
+        encode_file_to_image(self.test_file, self.test_image, header=False)
+        
+        for method in ("smart", "count"):
+            decode_image_to_file(self.test_image, self.decoded_file, method=method)
+            with open(self.decoded_file, "r", encoding="utf-8") as f:
+                self.assertEqual(f.read(), self.test_data)
+
+    def test_decode_stream_matches_bulk(self):
+        """Test that streaming decode writes the same bytes as the bulk decoder."""
+        binary_file = os.path.join(self.test_dir, "stream.dat")
+        stream_file = os.path.join(self.test_dir, "stream_decoded.dat")
+        with open(binary_file, "wb") as f:
+            f.write(os.urandom(2000) + b"\x00\x00" + b"\xff" * 6)
+        
+        for header in (True, False):
+            encode_file_to_image(binary_file, self.test_image, 40, 40, header=header)
+            for method in ("smart", "count"):
+                decode_image_to_file(self.test_image, self.decoded_file, method=method)
+                decode_image_to_file(self.test_image, stream_file, method=method,
+                                     stream=True, buffer_size=64)
+                with open(self.decoded_file, "rb") as bulk, open(stream_file, "rb") as streamed:
+                    self.assertEqual(streamed.read(), bulk.read())
+
+    def test_compressed_round_trip(self):
+        """Test that every codec is reversed by both decoders."""
+        log_file = os.path.join(self.test_dir, "server.log")
+        stream_file = os.path.join(self.test_dir, "stream_decoded.log")
+        content = b"".join(b"2025-10-03 12:00:%02d INFO request %d served\n" % (i % 60, i)
+                           for i in range(3000))
+        with open(log_file, "wb") as f:
+            f.write(content)
+        
+        for codec in ("zlib", "lzma", "bz2", "auto"):
+            encode_file_to_image(log_file, self.test_image, compression=codec)
+            with Image.open(self.test_image) as img:
+                self.assertLess(img.width * img.height * 3, len(content) // 4)
+            
+            decode_image_to_file(self.test_image, self.decoded_file)
+            decode_image_to_file(self.test_image, stream_file, stream=True, buffer_size=64)
+            for path in (self.decoded_file, stream_file):
+                with open(path, "rb") as f:
+                    self.assertEqual(f.read(), content)
+
+    def test_compression_bypassed_for_random_data(self):
+        """Test that incompressible input is stored as-is."""
+        binary_file = os.path.join(self.test_dir, "random.bin")
+        data = os.urandom(30000)
+        with open(binary_file, "wb") as f:
+            f.write(data)
+        
+        encode_file_to_image(binary_file, self.test_image, compression="auto")
+        with Image.open(self.test_image) as img:
+            header = parse_header(img.tobytes()[:64])
+        self.assertEqual(header.flags, 0)
+        self.assertEqual(header.payload_length, len(data))
+        
+        decode_image_to_file(self.test_image, self.decoded_file)
+        with open(self.decoded_file, "rb") as f:
+            self.assertEqual(f.read(), data)
+
+    def test_raw_container_round_trip(self):
+        """Test BMP, PPM and TIFF output decoded through the memory map."""
+        binary_file = os.path.join(self.test_dir, "raw.dat")
+        data = os.urandom(3001) + b"\x00" + b"\xff" * 3
+        with open(binary_file, "wb") as f:
+            f.write(data)
+        
+        for extension in (".bmp", ".ppm", ".tiff"):
+            image_path = os.path.join(self.test_dir, "raw" + extension)
+            encode_file_to_image(binary_file, image_path, 33, 33)
+            with Image.open(image_path) as img:
+                self.assertEqual(img.format, {".bmp": "BMP", ".ppm": "PPM", ".tiff": "TIFF"}[extension])
+            
+            for method in ("smart", "count"):
+                decode_image_to_file(image_path, self.decoded_file, method=method)
+                with open(self.decoded_file, "rb") as f:
+                    self.assertEqual(f.read(), data)
+
+    def test_in_memory_round_trip(self):
+        """Test decoding from bytes and file objects, including raw containers and compression."""
+        data = b"in-memory payload " * 300 + b"\x00"
+        
+        for options in ({}, {"compression": "zlib"}):
+            png = encode_bytes_to_png(data, **options)
+            self.assertEqual(decode_image_bytes(png), data)
+            self.assertEqual(decode_image_bytes(memoryview(png)), data)
+            self.assertEqual(decode_image_bytes(io.BytesIO(png)), data)
+        
+        for image_format in ("bmp", "ppm", "tiff"):
+            output = io.BytesIO()
+            write_encoded_image(data, output, image_format=image_format)
+            self.assertEqual(decode_image_bytes(output.getvalue()), data)
+
+    def test_decode_into_buffer(self):
+        """Test readinto-style decoding into preallocated buffers."""
+        data = os.urandom(2000)
+        png = encode_bytes_to_png(data)
+        
+        buffer = bytearray(4096)
+        self.assertEqual(decode_image_into(png, buffer), len(data))
+        self.assertEqual(bytes(buffer[:len(data)]), data)
+        
+        target = bytearray(len(data) + 10)
+        self.assertEqual(decode_image_into(png, memoryview(target)[10:]), len(data))
+        self.assertEqual(bytes(target[10:]), data)
+        
+        with self.assertRaises(ValueError):
+            decode_image_into(png, bytearray(len(data) - 1))
+
+    def test_decode_stream_all_white_image(self):
+        """Test that streaming decode rejects an all-white image and leaves no output."""
+        Image.new("RGB", (50, 50), color=(255, 255, 255)).save(self.test_image)
+        
+        with self.assertRaises(ValueError):
+            decode_image_to_file(self.test_image, self.decoded_file, stream=True)
+        self.assertFalse(os.path.exists(self.decoded_file))
+
+    def test_shard_round_trip(self):
+        """Test encoding into shards and decoding them back in parallel."""
+        binary_file = os.path.join(self.test_dir, "sharded.dat")
+        manifest = os.path.join(self.test_dir, "shards", "sharded.json")
+        data = os.urandom(10000) + b"\x00\x00"
+        with open(binary_file, "wb") as f:
+            f.write(data)
+        
+        result = encode_file_to_shards(binary_file, manifest, shard_size=3000, workers=2)
+        self.assertEqual([shard.size for shard in result.shards], [3000, 3000, 3000, 1002])
+        
+        decode_shards_to_file(manifest, self.decoded_file, workers=2)
+        with open(self.decoded_file, "rb") as f:
+            self.assertEqual(f.read(), data)
+
+    def test_shard_checksum_mismatch(self):
+        """Test that a shard swapped for different data is rejected."""
+        binary_file = os.path.join(self.test_dir, "sharded.dat")
+        manifest = os.path.join(self.test_dir, "sharded.json")
+        with open(binary_file, "wb") as f:
+            f.write(b"A" * 500 + b"B" * 500)
+        
+        encode_file_to_shards(binary_file, manifest, shard_size=500, workers=1)
+        shard_0 = os.path.join(self.test_dir, "sharded.00000.png")
+        shard_1 = os.path.join(self.test_dir, "sharded.00001.png")
+        shutil.copyfile(shard_1, shard_0)
+        
+        with self.assertRaises(ValueError):
+            decode_shards_to_file(manifest, self.decoded_file, workers=1)
+        self.assertFalse(os.path.exists(self.decoded_file))
+
+    def test_decode_range(self):
+        """Test byte-range reads from indexed, plain, raw and compressed images."""
+        data = os.urandom(50000) + b"compressible text " * 3000
+        with open(self.test_file, "wb") as f:
+            f.write(data)
+        
+        images = {
+            "indexed.png": {"index_chunk": 4096},
+            "plain.png": {},
+            "raw.ppm": {},
+            "compressed.png": {"compression": "zlib", "index_chunk": 4096},
+        }
+        for name, options in images.items():
+            image = os.path.join(self.test_dir, name)
+            encode_file_to_image(self.test_file, image, quiet=True, **options)
+            for offset, length in ((0, 10), (12345, 4096), (len(data) - 5, 100), (len(data), 1)):
+                self.assertEqual(decode_image_range(image, offset, length),
+                                 data[offset:offset + length], (name, offset))
+        
+        with self.assertRaises(ValueError):
+            decode_image_range(os.path.join(self.test_dir, "plain.png"), -1, 10)
+        encode_file_to_image(self.test_file, self.test_image, header=False, quiet=True)
+        with self.assertRaises(ValueError):
+            decode_image_range(self.test_image, 0, 10)
+        with self.assertRaises(ValueError):
+            encode_file_to_image(self.test_file, self.test_image, header=False, index_chunk=4096,
+                                 quiet=True)
+
+    def test_trusted_image_size(self):
+        """Test that images over Pillow's pixel limit decode only when trusted."""
+        data = os.urandom(30000)
+        png = encode_bytes_to_png(data)
+        limit = Image.MAX_IMAGE_PIXELS
+        try:
+            Image.MAX_IMAGE_PIXELS = 1000
+            with self.assertRaises(ValueError) as error:
+                decode_image_bytes(png)
+            self.assertIn("--trusted", str(error.exception))
+            
+            self.assertEqual(decode_image_bytes(png, trusted=True), data)
+            with trusted_image_size():
+                with trusted_image_size():
+                    self.assertIsNone(Image.MAX_IMAGE_PIXELS)
+                self.assertIsNone(Image.MAX_IMAGE_PIXELS)
+            self.assertEqual(Image.MAX_IMAGE_PIXELS, 1000)
+        finally:
+            Image.MAX_IMAGE_PIXELS = limit
+
     def test_decode_large_file(self):
         """Test round-trip with a larger file."""
         # Create a larger test file
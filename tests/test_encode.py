@@ -3,9 +3,12 @@
 Unit tests for the Encode.py module.
 """
 
+import io
+import mmap
 import os
 import tempfile
 import unittest
+import zlib
 from unittest.mock import patch
 from PIL import Image
 import sys
@@ -14,7 +17,12 @@ import shutil
 # Add the project root to the path to import our modules
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from Encode import encode_file_to_image, calculate_optimal_dimensions
+from Decode import decode_image_range, decode_image_to_file
+from Encode import (append_bytes_to_image, append_file_to_image, encode_bytes_to_image,
+                    encode_bytes_to_png, encode_file_to_image, calculate_optimal_dimensions, iter_pixel_blocks, pack_bytes_to_image,
+                    parse_size, write_encoded_image)
+from file_cache import FileCache
+from image_header import parse_header
 
 
 class TestEncode(unittest.TestCase):
@@ -111,7 +119,7 @@ class TestEncode(unittest.TestCase):
         with open(padded_file, "wb") as f:
             f.write(test_data)
         
-        encode_file_to_image(padded_file, self.test_image, 10, 10)
+        encode_file_to_image(padded_file, self.test_image, 10, 10, header=False)
         
         # Check that encoding succeeded
         self.assertTrue(os.path.exists(self.test_image))
@@ -123,6 +131,163 @@ class TestEncode(unittest.TestCase):
             self.assertEqual(first_pixel[1], ord('B'))  # 66
             self.assertEqual(first_pixel[2], 0)        # Padding
 
+    def test_encode_writes_header(self):
+        """Test that the format header precedes the payload by default."""
+        test_data = b"AB"
+        header_file = os.path.join(self.test_dir, "header.dat")
+        
+        with open(header_file, "wb") as f:
+            f.write(test_data)
+        
+        encode_file_to_image(header_file, self.test_image, 10, 10)
+        
+        with Image.open(self.test_image) as img:
+            raw = img.tobytes()
+        header = parse_header(raw)
+        self.assertIsNotNone(header)
+        self.assertEqual(header.payload_length, len(test_data))
+        self.assertEqual(header.header_length % 3, 0)
+        self.assertEqual(raw[header.header_length:header.header_length + 3], b"AB\x00")
+
+    def test_pack_bytes_matches_putpixel(self):
+        """Test that bulk packing produces the same pixels as putpixel."""
+        data = bytes(range(256)) * 3  # 768 bytes = 256 pixels
+        width, height = 20, 15
+        
+        expected = Image.new("RGB", (width, height), color=(255, 255, 255))
+        for i in range(0, len(data), 3):
+            pixel = i // 3
+            expected.putpixel((pixel % width, pixel // width), tuple(data[i:i+3]))
+        
+        image = pack_bytes_to_image(data, width, height)
+        self.assertEqual(image.tobytes(), expected.tobytes())
+
+    def test_pack_bytes_from_mapping(self):
+        """Test packing from a memory-mapped file in small blocks, partial pixels included."""
+        data_file = os.path.join(self.test_dir, "mapped.dat")
+        for size in (1, 2, 100, 5000, 5001):
+            data = os.urandom(size)
+            with open(data_file, "wb") as f:
+                f.write(data)
+            
+            with open(data_file, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                mapped_image = pack_bytes_to_image(mapped, 50, 40, b"H" * 24, block_size=300)
+            expected = bytearray(b"\xff") * (50 * 40 * 3)
+            padded = b"H" * 24 + data + bytes((-(24 + size)) % 3)
+            expected[:len(padded)] = padded
+            self.assertEqual(mapped_image.tobytes(), bytes(expected))
+
+    def test_pixel_blocks_match_bulk_layout(self):
+        """Test that streamed row blocks reproduce the bulk pixel layout."""
+        header = b"HEADER-BYTES"
+        for payload in (b"x", b"ab", bytes(range(256)) * 3):
+            for width, rows_per_block in ((1, 1), (2, 3), (7, 2), (40, 100)):
+                height = -(-(len(header) + len(payload) + 2) // (width * 3)) + 1
+                expected = pack_bytes_to_image(payload, width, height, header).tobytes()
+                
+                blocks = iter_pixel_blocks(io.BytesIO(payload), len(payload), header,
+                                           width, height, rows_per_block)
+                self.assertEqual(b"".join(blocks), expected)
+
+    def test_encode_stream_matches_bulk(self):
+        """Test that streaming encoding produces the same pixels as the bulk path."""
+        stream_image = os.path.join(self.test_dir, "stream.png")
+        data_file = os.path.join(self.test_dir, "stream.dat")
+        with open(data_file, "wb") as f:
+            f.write(os.urandom(5000))
+        
+        encode_file_to_image(data_file, self.test_image, 30, 60)
+        encode_file_to_image(data_file, stream_image, 30, 60, stream=True, buffer_size=256)
+        
+        with Image.open(self.test_image) as bulk, Image.open(stream_image) as streamed:
+            self.assertEqual(streamed.mode, "RGB")
+            self.assertEqual(streamed.size, bulk.size)
+            self.assertEqual(streamed.tobytes(), bulk.tobytes())
+
+    def test_encode_threads_matches_bulk(self):
+        """Test that parallel deflate produces the same pixels as the bulk path."""
+        threaded_image = os.path.join(self.test_dir, "threaded.png")
+        data_file = os.path.join(self.test_dir, "threaded.dat")
+        with open(data_file, "wb") as f:
+            f.write(os.urandom(5000) + b"\x00" * 5000)
+        
+        encode_file_to_image(data_file, self.test_image)
+        encode_file_to_image(data_file, threaded_image, threads=4)
+        
+        with Image.open(self.test_image) as bulk, Image.open(threaded_image) as threaded:
+            self.assertEqual(threaded.size, bulk.size)
+            self.assertEqual(threaded.tobytes(), bulk.tobytes())
+
+    def test_encode_profiles(self):
+        """Test that every profile round-trips the same pixels."""
+        data_file = os.path.join(self.test_dir, "profile.dat")
+        with open(data_file, "wb") as f:
+            f.write(b"abcdefgh" * 2000)
+        
+        pixels = set()
+        for profile in ("fast", "balanced", "small", "auto"):
+            output = os.path.join(self.test_dir, f"{profile}.png")
+            encode_file_to_image(data_file, output, profile=profile)
+            with Image.open(output) as img:
+                pixels.add(img.tobytes())
+        self.assertEqual(len(pixels), 1)
+
+    def test_encode_from_buffers_matches_file(self):
+        """Test that every buffer type encodes to the same pixels as the file path."""
+        data = os.urandom(4000) + b"text" * 500
+        data_file = os.path.join(self.test_dir, "buffer.dat")
+        with open(data_file, "wb") as f:
+            f.write(data)
+        encode_file_to_image(data_file, self.test_image)
+        with Image.open(self.test_image) as img:
+            expected = img.tobytes()
+        
+        for buffer in (data, bytearray(data), memoryview(data)):
+            png = encode_bytes_to_png(buffer)
+            with Image.open(io.BytesIO(png)) as img:
+                self.assertEqual(img.format, "PNG")
+                self.assertEqual(img.tobytes(), expected)
+            self.assertEqual(encode_bytes_to_image(buffer).tobytes(), expected)
+        
+        for profile in ("fast", "balanced"):
+            with open(data_file, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                output = io.BytesIO()
+                result = write_encoded_image(mapped, output, profile=profile)
+            self.assertEqual(result.input_size, len(data))
+            self.assertEqual(result.output_size, len(output.getvalue()))
+            self.assertIsNone(result.input_file)
+            with Image.open(output) as img:
+                self.assertEqual(img.tobytes(), expected)
+
+    def test_encode_empty_buffer(self):
+        """Test that an empty buffer is rejected."""
+        with self.assertRaises(ValueError):
+            encode_bytes_to_png(b"")
+
+    def test_parse_size(self):
+        """Test parsing of human-readable byte sizes."""
+        self.assertEqual(parse_size("4096"), 4096)
+        self.assertEqual(parse_size("64K"), 64 * 1024)
+        self.assertEqual(parse_size("64M"), 64 * 1024 ** 2)
+        self.assertEqual(parse_size("1.5g"), int(1.5 * 1024 ** 3))
+        self.assertEqual(parse_size("8MB"), 8 * 1024 ** 2)
+
+    def test_calculate_dimensions_uncapped(self):
+        """Test that auto-sizing fits large payloads near-square with little padding."""
+        width, height = calculate_optimal_dimensions(300 * 1024 * 1024)
+        self.assertEqual((width, height), (10240, 10240))
+        
+        for size in (1, 2, 7, 1000, 123457, 10 ** 9):
+            pixels = -(-size // 3)
+            width, height = calculate_optimal_dimensions(size)
+            self.assertGreaterEqual(width * height, pixels)
+            self.assertLess(width * height - pixels, width)
+            self.assertLessEqual(max(width, height), 2 * min(width, height))
+        
+        # Scanlines stay bounded however wide the image is allowed to be
+        width, _ = calculate_optimal_dimensions(10 ** 9, max_height=10, max_row_bytes=3 << 20)
+        self.assertLessEqual(width * 3, 3 << 20)
+
     def test_file_too_large_for_dimensions(self):
         """Test error when file is too large for given dimensions."""
         large_file = os.path.join(self.test_dir, "large.txt")
@@ -134,6 +299,161 @@ class TestEncode(unittest.TestCase):
         # Try to encode into a 1x1 image (capacity: 3 bytes)
         with self.assertRaises(ValueError):
             encode_file_to_image(large_file, self.test_image, 1, 1)
+        
+        # A failed encode leaves an existing output alone, on both paths
+        encode_file_to_image(self.test_file, self.test_image, quiet=True)
+        with open(self.test_image, "rb") as f:
+            before = f.read()
+        for stream in (False, True):
+            with self.assertRaises(ValueError):
+                encode_file_to_image(large_file, self.test_image, 1, 1, stream=stream, quiet=True)
+            with open(self.test_image, "rb") as f:
+                self.assertEqual(f.read(), before)
+        self.assertEqual(sorted(os.listdir(self.test_dir)),
+                         ["large.txt", "test_input.txt", "test_output.png"])
+
+
+class _FailingReader:
+    """Buffer reader whose reads fail once ``limit`` bytes have been served."""
+
+    limit = 0
+
+    def __init__(self, data):
+        self._data = bytes(data)
+        self._offset = 0
+
+    def readinto(self, buffer) -> int:
+        if self._offset >= self.limit:
+            raise OSError("simulated read error")
+        count = min(len(buffer), self.limit - self._offset, len(self._data) - self._offset)
+        buffer[:count] = self._data[self._offset:self._offset + count]
+        self._offset += count
+        return count
+
+    def close(self):
+        pass
+
+
+class TestAppend(unittest.TestCase):
+    """Test cases for appending to indexed PNGs in place."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        self.test_dir = tempfile.mkdtemp()
+        self.input_file = os.path.join(self.test_dir, "input.bin")
+        self.output_file = os.path.join(self.test_dir, "output.bin")
+        self.image = os.path.join(self.test_dir, "input.png")
+
+    def tearDown(self):
+        """Clean up test fixtures."""
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def encode(self, data: bytes, **options):
+        with open(self.input_file, "wb") as f:
+            f.write(data)
+        return encode_file_to_image(self.input_file, self.image, quiet=True, **options)
+
+    def assert_decodes_to(self, data: bytes):
+        """Check every decode path and the zlib stream's own checksum."""
+        for stream in (False, True):
+            decode_image_to_file(self.image, self.output_file, stream=stream, quiet=True)
+            with open(self.output_file, "rb") as f:
+                self.assertEqual(f.read(), data)
+        for offset in (0, len(data) // 2, max(0, len(data) - 50)):
+            self.assertEqual(decode_image_range(self.image, offset, 100), data[offset:offset + 100])
+        with open(self.image, "rb") as f:
+            png = f.read()
+        idat, offset = b"", 8
+        while offset < len(png):
+            length = int.from_bytes(png[offset:offset + 4], "big")
+            if png[offset + 4:offset + 8] == b"IDAT":
+                idat += png[offset + 8:offset + 8 + length]
+            offset += 12 + length
+        zlib.decompress(idat)
+
+    def test_append_round_trip(self):
+        """Test repeated appends, growth in height and pixel modes."""
+        for options in ({}, {"pixel_mode": "RGBA16", "digest": "crc32"}, {"threads": 2}):
+            with self.subTest(**options):
+                data = os.urandom(60000)
+                first = self.encode(data, index_chunk=4096, **options)
+                for extra in (b"tail" * 100, os.urandom(20000), b"!"):
+                    result = append_bytes_to_image(extra, self.image)
+                    data += extra
+                    self.assertEqual((result.width, result.input_size), (first.width, len(extra)))
+                    self.assertEqual(result.payload_length, len(data))
+                    self.assert_decodes_to(data)
+                self.assertGreater(result.height, first.height)
+                if "digest" in options:
+                    self.assertEqual(result.digest, f"{zlib.crc32(data):08x}")
+
+    def test_append_to_small_image(self):
+        """Test an image of a single segment, rewritten from its first row."""
+        data = b"small"
+        self.encode(data, index_chunk=1 << 20)
+        extra_file = os.path.join(self.test_dir, "extra.bin")
+        with open(extra_file, "wb") as f:
+            f.write(b"more bytes" * 30)
+        result = append_file_to_image(extra_file, self.image, quiet=True)
+        self.assertEqual(result.input_file, extra_file)
+        self.assert_decodes_to(data + b"more bytes" * 30)
+
+    def test_append_to_hard_linked_image(self):
+        """Test that other hard links to the image, e.g. a linked cache entry, keep their bytes."""
+        data = os.urandom(50000)
+        cache = FileCache(os.path.join(self.test_dir, "cache"), link=True)
+        self.encode(data, index_chunk=4096, cache=cache)
+        linked = os.path.join(self.test_dir, "linked.png")
+        self.assertTrue(encode_file_to_image(self.input_file, linked, index_chunk=4096,
+                                             cache=cache, quiet=True).cached)
+        self.assertEqual(os.stat(self.image).st_nlink, 3)
+
+        append_bytes_to_image(b"more" * 250, self.image)
+        self.assert_decodes_to(data + b"more" * 250)
+        self.assertEqual(os.stat(self.image).st_nlink, 1)
+        decode_image_to_file(linked, self.output_file, quiet=True)
+        with open(self.output_file, "rb") as f:
+            self.assertEqual(f.read(), data)
+        self.assertEqual([name for name in os.listdir(self.test_dir) if name.endswith(".tmp")], [])
+
+    def test_failed_append_leaves_image_intact(self):
+        """Test that an input failing or ending early partway leaves the original image."""
+        for size in (50, 60000):
+            data = os.urandom(size)
+            self.encode(data, index_chunk=4096)
+            with open(self.image, "rb") as f:
+                before = f.read()
+            with self.subTest(size=size, failure="read error"):
+                _FailingReader.limit = 30000
+                with patch("Encode._BufferReader", _FailingReader):
+                    with self.assertRaises(OSError):
+                        append_bytes_to_image(os.urandom(80000), self.image, buffer_size=4096)
+            with self.subTest(size=size, failure="short input"):
+                extra_file = os.path.join(self.test_dir, "extra.bin")
+                with open(extra_file, "wb") as f:
+                    f.write(os.urandom(30000))
+                with patch("Encode.os.path.getsize", return_value=80000):
+                    with self.assertRaises(ValueError):
+                        append_file_to_image(extra_file, self.image, buffer_size=4096, quiet=True)
+            with open(self.image, "rb") as f:
+                self.assertEqual(f.read(), before)
+            self.assert_decodes_to(data)
+            self.assertEqual([name for name in os.listdir(self.test_dir) if name.endswith(".tmp")],
+                             [])
+
+    def test_append_rejects_unsupported_images(self):
+        """Test that images without an index, compressed payloads and other digests are refused."""
+        data = b"x" * 5000
+        for options in ({}, {"index_chunk": 4096, "compression": "zlib"},
+                        {"index_chunk": 4096, "digest": "sha256"}):
+            with self.subTest(**options):
+                self.encode(data, **options)
+                with open(self.image, "rb") as f:
+                    before = f.read()
+                with self.assertRaises(ValueError):
+                    append_bytes_to_image(b"more", self.image)
+                with open(self.image, "rb") as f:
+                    self.assertEqual(f.read(), before)
 
 
 if __name__ == "__main__":
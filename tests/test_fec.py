@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the Reed-Solomon forward error correction (fec.py).
+"""
+
+import io
+import os
+import random
+import shutil
+import sys
+import tempfile
+import unittest
+
+from PIL import Image
+
+# Add the project root to the path to import our modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Decode import decode_image_range, decode_image_to_file
+from Encode import encode_file_to_image
+from fec import (FEC_BLOCK_SIZE, FecDecodingWriter, decode_buffer, decoded_length, encode_buffer,
+                 encode_file, encoded_length)
+
+
+def damage(coded: bytes, errors_per_block: int, seed: int = 7) -> bytearray:
+    """Change ``errors_per_block`` random bytes in every codeword."""
+    rng = random.Random(seed)
+    damaged = bytearray(coded)
+    for start in range(0, len(coded), FEC_BLOCK_SIZE):
+        length = min(FEC_BLOCK_SIZE, len(coded) - start)
+        for position in rng.sample(range(length), min(errors_per_block, length)):
+            damaged[start + position] ^= rng.randrange(1, 256)
+    return damaged
+
+
+class TestCodec(unittest.TestCase):
+    """Test cases for coding and repairing blocks."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        rng = random.Random(1)
+        self.data = bytes(rng.getrandbits(8) for _ in range(5000))
+
+    def test_round_trip_and_repair(self):
+        """Test that up to parity/2 damaged bytes per block are repaired."""
+        for parity in (2, 16, 32, 128):
+            with self.subTest(parity=parity):
+                coded = encode_buffer(self.data, parity, workers=1)
+                self.assertEqual(len(coded), encoded_length(len(self.data), parity))
+                self.assertEqual(decoded_length(len(coded), parity), len(self.data))
+                self.assertEqual(coded[:FEC_BLOCK_SIZE - parity], self.data[:FEC_BLOCK_SIZE - parity])
+                self.assertEqual(decode_buffer(coded, parity, workers=1), (self.data, 0))
+
+                data, corrected = decode_buffer(damage(coded, parity // 2), parity, workers=1)
+                self.assertEqual(data, self.data)
+                self.assertEqual(corrected, -(-len(coded) // FEC_BLOCK_SIZE))
+
+    def test_too_much_damage(self):
+        """Test that blocks past the repair budget are reported, not passed on."""
+        coded = encode_buffer(self.data, 16, workers=1)
+        with self.assertRaises(ValueError):
+            decode_buffer(damage(coded, 12), 16, workers=1)
+        with self.assertRaises(ValueError):
+            decode_buffer(coded[:-20], 16, workers=1)
+        with self.assertRaises(ValueError):
+            encode_buffer(self.data, 7)
+
+    def test_chunks_and_workers(self):
+        """Test that chunked, parallel and streamed coding give the same bytes."""
+        coded = encode_buffer(self.data, 32, workers=1)
+        self.assertEqual(encode_buffer(self.data, 32, workers=2, chunk_blocks=3), coded)
+        destination = io.BytesIO()
+        self.assertEqual(encode_file(io.BytesIO(self.data), destination, 32, workers=1,
+                                     chunk_blocks=2), len(coded))
+        self.assertEqual(destination.getvalue(), coded)
+
+        damaged = damage(coded, 10)
+        self.assertEqual(decode_buffer(damaged, 32, workers=2, chunk_blocks=3)[0], self.data)
+        out = io.BytesIO()
+        writer = FecDecodingWriter(out, 32, workers=2, chunk_blocks=2)
+        for start in range(0, len(damaged), 1000):
+            writer.write(damaged[start:start + 1000])
+        self.assertEqual(writer.close(), -(-len(coded) // FEC_BLOCK_SIZE))
+        self.assertEqual(out.getvalue(), self.data)
+
+
+class TestImages(unittest.TestCase):
+    """Test cases for FEC through the encoder and decoder."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        self.test_dir = tempfile.mkdtemp()
+        self.input_file = os.path.join(self.test_dir, "input.bin")
+        self.output_file = os.path.join(self.test_dir, "output.bin")
+        self.data = b"forward error correction " * 600
+        with open(self.input_file, "wb") as f:
+            f.write(self.data)
+
+    def tearDown(self):
+        """Clean up test fixtures."""
+        shutil.rmtree(self.test_dir)
+
+    def read_output(self):
+        with open(self.output_file, "rb") as f:
+            return f.read()
+
+    def test_damaged_pixels_are_repaired(self):
+        """Test that changed pixels are repaired on every decode path."""
+        image = os.path.join(self.test_dir, "input.png")
+        for options in ({}, {"stream": True}, {"compression": "zlib", "digest": "sha256"}):
+            with self.subTest(**options):
+                encode_file_to_image(self.input_file, image, fec_parity=16, quiet=True, **options)
+                with Image.open(image) as original:
+                    damaged = original.convert("RGB")
+                width, height = damaged.size
+                for pixel in range(20, width * height // 2, 150):
+                    damaged.putpixel((pixel % width, pixel // width), (0, 0, 0))
+                damaged.save(image)
+
+                for stream in (False, True):
+                    result = decode_image_to_file(image, self.output_file, stream=stream,
+                                                  fec_workers=1, quiet=True)
+                    self.assertEqual(self.read_output(), self.data)
+                    self.assertGreater(result.corrected_blocks, 0)
+
+    def test_raw_container_and_range(self):
+        """Test repairs in an uncompressed container and range reads of coded payloads."""
+        image = os.path.join(self.test_dir, "input.ppm")
+        encode_file_to_image(self.input_file, image, fec_parity=8, quiet=True)
+        with open(image, "r+b") as f:
+            f.seek(100)
+            f.write(b"\x00\x00\x00")
+        result = decode_image_to_file(image, self.output_file, quiet=True)
+        self.assertEqual(self.read_output(), self.data)
+        self.assertEqual(result.corrected_blocks, 1)
+        self.assertEqual(decode_image_range(image, 1000, 600), self.data[1000:1600])
+
+        png = os.path.join(self.test_dir, "input.png")
+        for compression in ("none", "zlib"):
+            encode_file_to_image(self.input_file, png, fec_parity=8, compression=compression,
+                                 quiet=True)
+            self.assertEqual(decode_image_range(png, 5000, 300), self.data[5000:5300])
+            self.assertEqual(decode_image_range(png, len(self.data) - 10, 100), self.data[-10:])
+
+    def test_fec_needs_header(self):
+        """Test that FEC is rejected without the format header."""
+        with self.assertRaises(ValueError):
+            encode_file_to_image(self.input_file, os.path.join(self.test_dir, "input.png"),
+                                 header=False, fec_parity=16, quiet=True)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the file caches (file_cache.py) and the encode and decode caches.
+"""
+
+import os
+import pickle
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+from concurrent.futures import ProcessPoolExecutor
+
+# Add the project root to the path to import our modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Decode import decode_image_to_file
+from Encode import encode_file_to_image
+from file_cache import DecodeCache, FileCache, MemoryCache, content_key, identity_key
+
+
+def _store_entry(directory: str, key: str, source: str) -> bool:
+    """Insert one entry from a worker process."""
+    return FileCache(directory).store(key, source, {"key": key})
+
+
+class TestFileCache(unittest.TestCase):
+    """Test cases for storing, fetching and evicting entries."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        self.test_dir = tempfile.mkdtemp()
+        self.cache_dir = os.path.join(self.test_dir, "cache")
+
+    def tearDown(self):
+        """Clean up test fixtures."""
+        shutil.rmtree(self.test_dir)
+
+    def write(self, name: str, data: bytes) -> str:
+        path = os.path.join(self.test_dir, name)
+        with open(path, "wb") as f:
+            f.write(data)
+        return path
+
+    def read(self, path: str) -> bytes:
+        with open(path, "rb") as f:
+            return f.read()
+
+    def test_content_key(self):
+        """Test that keys follow the content and parameters, not the file name."""
+        a = self.write("a.bin", b"same bytes")
+        b = self.write("b.bin", b"same bytes")
+        c = self.write("c.bin", b"other bytes")
+        self.assertEqual(content_key(a, {"width": 10}), content_key(b, {"width": 10}))
+        self.assertNotEqual(content_key(a, {"width": 10}), content_key(a, {"width": 11}))
+        self.assertNotEqual(content_key(a, {}), content_key(c, {}))
+
+    def test_store_fetch_and_stats(self):
+        """Test a miss, an insertion and a hit, by copy and by hard link."""
+        source = self.write("entry.png", b"image bytes")
+        for link in (False, True):
+            with self.subTest(link=link):
+                cache = FileCache(os.path.join(self.cache_dir, str(link)), link=link)
+                destination = os.path.join(self.test_dir, f"out{link}.png")
+                self.assertIsNone(cache.fetch("ab" * 32, destination))
+                self.assertTrue(cache.store("ab" * 32, source, {"width": 3}))
+                self.assertEqual(cache.fetch("ab" * 32, destination), {"width": 3})
+                self.assertEqual(self.read(destination), b"image bytes")
+                self.assertEqual((cache.stats.hits, cache.stats.misses, cache.stats.stores),
+                                 (1, 1, 1))
+                self.assertEqual(cache.stats.hit_rate, 0.5)
+                self.assertEqual(cache.usage(), (1, len(b"image bytes")))
+
+        # An entry rewritten in place through a hard link is dropped, not served,
+        # also when the rewrite keeps its size
+        for key, data in (("ab" * 32, b"changed"), ("cd" * 32, b"IMAGE BYTES")):
+            source = self.write(f"{key}.png", b"image bytes")
+            stamp = time.time() - 60
+            os.utime(source, (stamp, stamp))
+            cache.store(key, source)
+            cache.fetch(key, destination)
+            with open(destination, "wb") as f:
+                f.write(data)
+            self.assertIsNone(cache.fetch(key, os.path.join(self.test_dir, "again.png")))
+            self.assertEqual(cache.usage(), (0, 0))
+
+    def test_lru_eviction(self):
+        """Test that the least recently used entries go first and the cap holds."""
+        cache = FileCache(self.cache_dir, max_size=250)
+        keys = [f"{index:02d}" * 32 for index in range(3)]
+        for age, key in enumerate(keys):
+            cache.store(key, self.write(key, bytes(100)))
+            record = os.path.join(self.cache_dir, key[:2], key + ".json")
+            os.utime(record, (time.time() - 100 + age, time.time() - 100 + age))
+        # keys[0] was evicted when keys[2] arrived; touching keys[1] makes keys[2] the oldest
+        self.assertIsNone(cache.fetch(keys[0], os.path.join(self.test_dir, "x")))
+        self.assertIsNotNone(cache.fetch(keys[1], os.path.join(self.test_dir, "x")))
+        cache.store("99" * 32, self.write("new", bytes(100)))
+        self.assertIsNone(cache.fetch(keys[2], os.path.join(self.test_dir, "x")))
+        self.assertIsNotNone(cache.fetch(keys[1], os.path.join(self.test_dir, "x")))
+        self.assertEqual(cache.usage(), (2, 200))
+        self.assertEqual(cache.stats.evictions, 2)
+
+        self.assertFalse(cache.store("aa" * 32, self.write("big", bytes(300))))
+        with self.assertRaises(ValueError):
+            FileCache(self.cache_dir, max_size=0)
+
+    def test_concurrent_insertion(self):
+        """Test that processes inserting the same and different keys leave whole entries."""
+        source = self.write("entry.png", os.urandom(200000))
+        keys = ["cd" * 32, "cd" * 32, "ef" * 32, "cd" * 32]
+        with ProcessPoolExecutor(max_workers=2) as pool:
+            self.assertTrue(all(pool.map(_store_entry, [self.cache_dir] * 4, keys,
+                                         [source] * 4)))
+        cache = FileCache(self.cache_dir)
+        self.assertEqual(cache.usage(), (2, 400000))
+        destination = os.path.join(self.test_dir, "out.png")
+        self.assertEqual(cache.fetch("ef" * 32, destination), {"key": "ef" * 32})
+        self.assertEqual(self.read(destination), self.read(source))
+        self.assertEqual([name for name in os.listdir(os.path.join(self.cache_dir, "cd"))
+                          if name.endswith(".tmp")], [])
+
+
+class TestEncodeCache(unittest.TestCase):
+    """Test cases for the encode cache through encode_file_to_image."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        self.test_dir = tempfile.mkdtemp()
+        self.input_file = os.path.join(self.test_dir, "input.bin")
+        self.data = b"encode cache " * 500
+        with open(self.input_file, "wb") as f:
+            f.write(self.data)
+
+    def tearDown(self):
+        """Clean up test fixtures."""
+        shutil.rmtree(self.test_dir)
+
+    def test_hit_returns_same_image(self):
+        """Test that a repeated encode is served from the cache with the same result."""
+        for link in (False, True):
+            with self.subTest(link=link):
+                cache = FileCache(os.path.join(self.test_dir, f"cache{link}"), link=link)
+                first = os.path.join(self.test_dir, "first.png")
+                second = os.path.join(self.test_dir, "second.png")
+                miss = encode_file_to_image(self.input_file, first, digest="crc32", cache=cache,
+                                            quiet=True)
+                hit = encode_file_to_image(self.input_file, second, digest="crc32", cache=cache,
+                                           quiet=True)
+                self.assertFalse(miss.cached)
+                self.assertTrue(hit.cached)
+                self.assertEqual(hit.output_image, second)
+                self.assertEqual((hit.width, hit.height, hit.digest, hit.output_size),
+                                 (miss.width, miss.height, miss.digest, miss.output_size))
+                with open(first, "rb") as a, open(second, "rb") as b:
+                    self.assertEqual(a.read(), b.read())
+
+                # Re-encoding over a linked output must not write through into the cache
+                encode_file_to_image(self.input_file, second, stream=True, cache=cache, quiet=True)
+                output = os.path.join(self.test_dir, "output.bin")
+                decode_image_to_file(second, output, quiet=True)
+                encode_file_to_image(self.input_file, first, digest="crc32", cache=cache,
+                                     quiet=True)
+                decode_image_to_file(first, output, quiet=True)
+                with open(output, "rb") as f:
+                    self.assertEqual(f.read(), self.data)
+                self.assertEqual((cache.stats.hits, cache.stats.misses), (2, 2))
+
+    def test_options_and_content_change_the_key(self):
+        """Test that different options or input bytes miss."""
+        cache = FileCache(os.path.join(self.test_dir, "cache"))
+        image = os.path.join(self.test_dir, "input.png")
+        encode_file_to_image(self.input_file, image, cache=cache, quiet=True)
+        self.assertFalse(encode_file_to_image(self.input_file, image, compression="zlib",
+                                              cache=cache, quiet=True).cached)
+        with open(self.input_file, "ab") as f:
+            f.write(b"!")
+        self.assertFalse(encode_file_to_image(self.input_file, image, cache=cache,
+                                              quiet=True).cached)
+        self.assertEqual(cache.stats.misses, 3)
+
+
+class TestDecodeCache(unittest.TestCase):
+    """Test cases for the two-tier decode cache."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        self.test_dir = tempfile.mkdtemp()
+        self.input_file = os.path.join(self.test_dir, "input.bin")
+        self.output_file = os.path.join(self.test_dir, "output.bin")
+        self.image = os.path.join(self.test_dir, "input.png")
+        self.data = b"decode cache " * 500
+        with open(self.input_file, "wb") as f:
+            f.write(self.data)
+        self.encode(self.data)
+
+    def tearDown(self):
+        """Clean up test fixtures."""
+        shutil.rmtree(self.test_dir)
+
+    def encode(self, data: bytes):
+        """Encode data and backdate the image past the recent-modification guard."""
+        with open(self.input_file, "wb") as f:
+            f.write(data)
+        encode_file_to_image(self.input_file, self.image, quiet=True)
+        stamp = time.time() - 60
+        os.utime(self.image, (stamp, stamp))
+
+    def decode(self, cache):
+        result = decode_image_to_file(self.image, self.output_file, cache=cache, quiet=True)
+        with open(self.output_file, "rb") as f:
+            return result, f.read()
+
+    def test_memory_and_disk_tiers(self):
+        """Test hits from memory, from disk in a new process-like instance, and promotion."""
+        directory = os.path.join(self.test_dir, "cache")
+        cache = DecodeCache(directory)
+        first, data = self.decode(cache)
+        self.assertFalse(first.cached)
+        second, data = self.decode(cache)
+        self.assertTrue(second.cached)
+        self.assertEqual(data, self.data)
+        self.assertEqual((second.data_length, second.total_bytes),
+                         (first.data_length, first.total_bytes))
+        self.assertEqual((cache.memory.stats.hits, cache.stats.hits, cache.stats.misses), (1, 1, 1))
+
+        fresh = DecodeCache(directory)
+        os.remove(self.output_file)
+        self.assertTrue(self.decode(fresh)[0].cached)
+        self.assertEqual((fresh.disk.stats.hits, len(fresh.memory)), (1, 1))
+        self.assertEqual(self.decode(fresh)[1], self.data)
+        self.assertEqual(fresh.memory.stats.hits, 1)
+
+        # Worker processes get an empty memory tier and the same disk tier
+        copy = pickle.loads(pickle.dumps(fresh))
+        self.assertEqual((len(copy.memory), copy.disk.directory), (0, directory))
+
+    def test_changed_image_invalidates(self):
+        """Test that a rewritten or recently modified image is decoded again."""
+        for by_content in (False, True):
+            with self.subTest(by_content=by_content):
+                self.encode(self.data)
+                cache = DecodeCache(memory_size=1 << 20, by_content=by_content)
+                self.decode(cache)
+                self.assertTrue(self.decode(cache)[0].cached)
+                self.encode(b"other bytes" * 300)
+                result, data = self.decode(cache)
+                self.assertFalse(result.cached)
+                self.assertEqual(data, b"other bytes" * 300)
+
+        os.utime(self.image)
+        self.assertIsNone(identity_key(self.image, {}))
+        cache = DecodeCache(memory_size=1 << 20)
+        self.decode(cache)
+        self.assertFalse(self.decode(cache)[0].cached)
+        self.assertEqual(cache.stats.stores, 0)
+
+    def test_linked_output_is_not_written_through(self):
+        """Test that decoding another image over a linked output leaves the cached entry."""
+        directory = os.path.join(self.test_dir, "cache")
+        cache = DecodeCache(directory, memory_size=0, link=True)
+        self.decode(cache)
+        self.assertTrue(self.decode(cache)[0].cached)
+
+        other = os.path.join(self.test_dir, "other.png")
+        with open(self.input_file, "wb") as f:
+            f.write(b"DECODE CACHE " * 500)
+        encode_file_to_image(self.input_file, other, quiet=True)
+        for stream in (False, True):
+            decode_image_to_file(other, self.output_file, stream=stream, cache=cache, quiet=True)
+            result, data = self.decode(DecodeCache(directory, memory_size=0, link=True))
+            self.assertTrue(result.cached)
+            self.assertEqual(data, self.data)
+
+    def test_memory_cache_lru(self):
+        """Test the byte cap and LRU order of the memory tier."""
+        cache = MemoryCache(max_size=10)
+        cache.put("a", b"1234")
+        cache.put("b", b"5678")
+        self.assertIsNotNone(cache.get("a"))
+        cache.put("c", b"90")
+        cache.put("d", b"ab")
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), (b"1234", {}))
+        self.assertEqual((cache.size, cache.stats.evictions), (8, 1))
+        self.assertFalse(cache.put("e", bytes(11)))
+
+
+if __name__ == "__main__":
+    unittest.main()
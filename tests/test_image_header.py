@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the image_header.py module.
+"""
+
+import os
+import sys
+import unittest
+
+# Add the project root to the path to import our modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from image_header import HEADER_FIXED_SIZE, ImageHeader, parse_header, peek_header_length
+
+
+class TestImageHeader(unittest.TestCase):
+    """Test cases for packing and parsing the format header."""
+
+    def test_round_trip(self):
+        """Test that a packed header parses back to the same fields."""
+        header = ImageHeader(payload_length=123456789, flags=0x05, extensions={7: b"abc", 2: b""})
+        packed = header.pack()
+        
+        self.assertEqual(len(packed) % 3, 0)
+        self.assertEqual(peek_header_length(packed), len(packed))
+        
+        parsed = parse_header(packed + b"payload")
+        self.assertEqual(parsed.payload_length, 123456789)
+        self.assertEqual(parsed.flags, 0x05)
+        self.assertEqual(parsed.extensions, {7: b"abc", 2: b""})
+        self.assertEqual(parsed.header_length, len(packed))
+
+    def test_alignment(self):
+        """Test that the header is padded to whole pixels of any size."""
+        for alignment in (1, 2, 3, 4, 6, 8):
+            packed = ImageHeader(payload_length=1).pack(alignment)
+            self.assertEqual(len(packed) % alignment, 0)
+
+    def test_legacy_data_has_no_header(self):
+        """Test that ordinary data is not mistaken for a header."""
+        self.assertIsNone(parse_header(b"Hello, World! This is plain data."))
+        self.assertIsNone(parse_header(b"F2I"))
+        self.assertIsNone(peek_header_length(b"\xff" * HEADER_FIXED_SIZE))
+
+    def test_corrupted_header(self):
+        """Test that a damaged header is rejected instead of misread."""
+        packed = bytearray(ImageHeader(payload_length=42).pack())
+        packed[10] ^= 0x01  # Flip a bit in the payload length
+        
+        with self.assertRaises(ValueError):
+            parse_header(packed)
+
+    def test_truncated_header(self):
+        """Test that a header cut short is rejected."""
+        packed = ImageHeader(payload_length=42).pack()
+        
+        with self.assertRaises(ValueError):
+            parse_header(packed[:HEADER_FIXED_SIZE + 1])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the instrumentation module.
+"""
+
+import json
+import os
+import pstats
+import shutil
+import sys
+import tempfile
+import unittest
+from unittest.mock import patch
+
+# Add the project root to the path to import our modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Decode import decode_image_to_file
+from Encode import encode_file_to_image
+from instrumentation import (NULL_INSTRUMENTATION, CallbackSink, Instrumentation, JsonLinesSink,
+                             PrometheusTextfileSink, cprofile_to, from_options)
+
+
+class TestInstrumentation(unittest.TestCase):
+    """Test cases for stage timings, sinks and profiling."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        self.test_dir = tempfile.mkdtemp()
+        self.input_file = os.path.join(self.test_dir, "input.bin")
+        self.image = os.path.join(self.test_dir, "input.png")
+        self.output_file = os.path.join(self.test_dir, "output.bin")
+        with open(self.input_file, "wb") as f:
+            f.write(b"instrumented " * 1000)
+
+    def tearDown(self):
+        """Clean up test fixtures."""
+        shutil.rmtree(self.test_dir)
+
+    def test_encode_and_decode_stages(self):
+        """Test that both directions record their stages and emit one record per run."""
+        records = []
+        metrics = Instrumentation([CallbackSink(records.append)], trace_memory=True)
+
+        encode_file_to_image(self.input_file, self.image, profile="balanced",
+                             quiet=True, instrumentation=metrics)
+        self.assertEqual([stage.name for stage in metrics.stages], ["sample", "pack", "png"])
+        self.assertTrue(all(stage.seconds >= 0 for stage in metrics.stages))
+        self.assertGreater(metrics.record["peak_memory"], 0)
+
+        decode_image_to_file(self.image, self.output_file, quiet=True, instrumentation=metrics)
+        self.assertEqual([stage.name for stage in metrics.stages], ["load", "locate", "write"])
+        self.assertEqual(metrics.stages[-1].bytes, os.path.getsize(self.input_file))
+
+        self.assertEqual([(r["operation"], r["status"]) for r in records],
+                         [("encode", "ok"), ("decode", "ok")])
+        self.assertEqual(records[0]["input_file"], self.input_file)
+        self.assertEqual(records[0]["image_format"], "png")
+
+    def test_failed_run_is_reported(self):
+        """Test that a failing run is emitted with an error status."""
+        records = []
+        with self.assertRaises(FileNotFoundError):
+            encode_file_to_image(os.path.join(self.test_dir, "missing"), self.image, quiet=True,
+                                 instrumentation=Instrumentation([records.append]))
+        self.assertEqual(records[0]["status"], "error")
+
+    def test_file_sinks(self):
+        """Test the JSON lines and Prometheus textfile sinks."""
+        jsonl = os.path.join(self.test_dir, "metrics.jsonl")
+        prom = os.path.join(self.test_dir, "metrics.prom")
+        metrics = from_options(jsonl, prom)
+
+        for _ in range(2):
+            encode_file_to_image(self.input_file, self.image, stream=True, quiet=True,
+                                 instrumentation=metrics)
+
+        with open(jsonl, encoding="utf-8") as f:
+            lines = [json.loads(line) for line in f]
+        self.assertEqual(len(lines), 2)
+        self.assertEqual(lines[0]["stages"][-1]["name"], "write")
+
+        with open(prom, encoding="utf-8") as f:
+            text = f.read()
+        self.assertIn('file_to_image_stage_seconds{operation="encode",stage="write"}', text)
+        self.assertIn('file_to_image_success{operation="encode"} 1', text)
+        self.assertNotIn("peak_memory", text)
+
+    def test_sinks_emit_records(self):
+        """Test the exact output of each file sink for one record."""
+        record = {"operation": "encode", "status": "ok", "started_at": 1700000000.25,
+                  "seconds": 0.5, "peak_memory": 2048, "input_file": 'a "b".bin',
+                  "stages": [{"name": "pack", "seconds": 0.125, "bytes": 300}]}
+
+        jsonl = os.path.join(self.test_dir, "metrics.jsonl")
+        sink = JsonLinesSink(jsonl)
+        sink.emit(record)
+        sink.emit(dict(record, status="error"))
+        with open(jsonl, encoding="utf-8") as f:
+            lines = f.read().splitlines()
+        self.assertEqual(lines[0], json.dumps(record, sort_keys=True))
+        self.assertEqual(json.loads(lines[1])["status"], "error")
+
+        prom = os.path.join(self.test_dir, "metrics.prom")
+        with open(prom, "w", encoding="utf-8") as f:
+            f.write("stale\n")
+        sink = PrometheusTextfileSink(prom)
+        with patch("instrumentation.os.replace", wraps=os.replace) as replace:
+            sink.emit(record)
+        temporary, target = replace.call_args[0]
+        self.assertEqual(target, prom)
+        self.assertTrue(temporary.startswith(prom) and temporary.endswith(".tmp"))
+        self.assertEqual([name for name in os.listdir(self.test_dir) if name.endswith(".tmp")], [])
+        with open(prom, encoding="utf-8") as f:
+            text = f.read()
+        labels = 'operation="encode"'
+        self.assertEqual(text, "\n".join([
+            "# HELP file_to_image_stage_seconds Time spent in each stage of the last run",
+            "# TYPE file_to_image_stage_seconds gauge",
+            f'file_to_image_stage_seconds{{{labels},stage="pack"}} 0.125000',
+            "# HELP file_to_image_stage_bytes Bytes processed by each stage of the last run",
+            "# TYPE file_to_image_stage_bytes gauge",
+            f'file_to_image_stage_bytes{{{labels},stage="pack"}} 300',
+            "# HELP file_to_image_duration_seconds Duration of the last run",
+            "# TYPE file_to_image_duration_seconds gauge",
+            f"file_to_image_duration_seconds{{{labels}}} 0.500000",
+            "# HELP file_to_image_success Whether the last run succeeded",
+            "# TYPE file_to_image_success gauge",
+            f"file_to_image_success{{{labels}}} 1",
+            "# HELP file_to_image_last_run_timestamp_seconds Start time of the last run",
+            "# TYPE file_to_image_last_run_timestamp_seconds gauge",
+            f"file_to_image_last_run_timestamp_seconds{{{labels}}} 1700000000.250",
+            "# HELP file_to_image_peak_memory_bytes Peak traced memory of the last run",
+            "# TYPE file_to_image_peak_memory_bytes gauge",
+            f"file_to_image_peak_memory_bytes{{{labels}}} 2048",
+        ]) + "\n")
+
+    def test_disabled_by_default(self):
+        """Test that no options give the shared no-op instrumentation."""
+        self.assertIs(from_options(), NULL_INSTRUMENTATION)
+        with NULL_INSTRUMENTATION.run("encode"), NULL_INSTRUMENTATION.stage("pack") as stage:
+            stage.bytes = 10
+        self.assertEqual(len(NULL_INSTRUMENTATION.stages), 0)
+
+    def test_cprofile(self):
+        """Test that profiling dumps readable stats."""
+        stats_file = os.path.join(self.test_dir, "encode.prof")
+        with cprofile_to(stats_file):
+            encode_file_to_image(self.input_file, self.image, quiet=True)
+        self.assertGreater(pstats.Stats(stats_file).total_calls, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
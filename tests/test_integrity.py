@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the integrity digests (integrity.py) through the encoder and decoder.
+"""
+
+import hashlib
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+import zlib
+
+from PIL import Image
+
+# Add the project root to the path to import our modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Decode import decode_image_bytes, decode_image_to_file
+from Encode import encode_bytes_to_png, encode_file_to_image
+from integrity import DIGEST_IDS, digest_for
+
+
+class TestIntegrity(unittest.TestCase):
+    """Test cases for storing and verifying integrity digests."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        self.test_dir = tempfile.mkdtemp()
+        self.input_file = os.path.join(self.test_dir, "input.bin")
+        self.output_file = os.path.join(self.test_dir, "output.bin")
+        self.data = b"integrity check " * 700 + bytes(range(256))
+        with open(self.input_file, "wb") as f:
+            f.write(self.data)
+
+    def tearDown(self):
+        """Clean up test fixtures."""
+        shutil.rmtree(self.test_dir)
+
+    def read_output(self):
+        with open(self.output_file, "rb") as f:
+            return f.read()
+
+    def test_digest_matches_hashlib(self):
+        """Test that stored digests match the standard tools' values."""
+        expected = {
+            "crc32": "%08x" % zlib.crc32(self.data),
+            "sha256": hashlib.sha256(self.data).hexdigest(),
+            "blake2b": hashlib.blake2b(self.data).hexdigest(),
+        }
+        image = os.path.join(self.test_dir, "input.png")
+        for name in DIGEST_IDS:
+            with self.subTest(digest=name):
+                for compression in ("none", "zlib"):
+                    result = encode_file_to_image(self.input_file, image, digest=name,
+                                                  compression=compression, quiet=True)
+                    self.assertEqual(result.digest, expected[name])
+
+    def test_round_trip(self):
+        """Test bulk, streaming, compressed, 16-bit and raw paths with a digest."""
+        cases = [
+            ("input.png", {}),
+            ("input.png", {"stream": True}),
+            ("input.png", {"compression": "zlib"}),
+            ("input.png", {"compression": "zlib", "stream": True}),
+            ("input.png", {"pixel_mode": "RGBA16"}),
+            ("input.png", {"threads": 2, "pixel_mode": "L"}),
+            ("input.bmp", {}),
+        ]
+        for name, options in cases:
+            with self.subTest(image=name, **options):
+                image = os.path.join(self.test_dir, name)
+                encode_file_to_image(self.input_file, image, digest="sha256", quiet=True,
+                                     **options)
+                for stream in (False, True):
+                    decode_image_to_file(image, self.output_file, stream=stream, quiet=True)
+                    self.assertEqual(self.read_output(), self.data)
+
+        png = encode_bytes_to_png(self.data, digest="crc32", compression="zlib")
+        self.assertEqual(decode_image_bytes(png), self.data)
+
+    def test_damaged_image_fails(self):
+        """Test that a changed payload byte fails verification and leaves no output."""
+        image = os.path.join(self.test_dir, "input.png")
+        encode_file_to_image(self.input_file, image, digest="crc32", quiet=True)
+        with Image.open(image) as original:
+            damaged = original.convert("RGB")
+        r, g, b = damaged.getpixel((20, 0))
+        damaged.putpixel((20, 0), (r ^ 1, g, b))
+        damaged.save(image)
+
+        for stream in (False, True):
+            with self.assertRaises(ValueError):
+                decode_image_to_file(image, self.output_file, stream=stream, quiet=True)
+            self.assertFalse(os.path.exists(self.output_file))
+
+        raw = os.path.join(self.test_dir, "input.ppm")
+        encode_file_to_image(self.input_file, raw, digest="crc32", quiet=True)
+        with open(raw, "r+b") as f:
+            f.seek(200)
+            f.write(b"\x00")
+        with self.assertRaises(ValueError):
+            decode_image_to_file(raw, self.output_file, quiet=True)
+        self.assertFalse(os.path.exists(self.output_file))
+
+    def test_digest_needs_header(self):
+        """Test that a digest is rejected without the format header."""
+        with self.assertRaises(ValueError):
+            encode_file_to_image(self.input_file, os.path.join(self.test_dir, "input.png"),
+                                 header=False, digest="sha256", quiet=True)
+        with self.assertRaises(ValueError):
+            digest_for("md5")
+
+
+if __name__ == "__main__":
+    unittest.main()
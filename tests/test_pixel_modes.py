@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the pixel layouts (pixel_modes.py) through the encoder and decoder.
+"""
+
+import io
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+# Add the project root to the path to import our modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Decode import decode_image_bytes, decode_image_to_file
+from Encode import calculate_optimal_dimensions, encode_bytes_to_png, encode_file_to_image
+from pixel_modes import PIXEL_MODE_NAMES, get_pixel_mode, peek_png_pixel_mode
+
+
+class TestPixelModes(unittest.TestCase):
+    """Test cases for encoding and decoding in every pixel layout."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        self.test_dir = tempfile.mkdtemp()
+        self.input_file = os.path.join(self.test_dir, "input.bin")
+        self.image = os.path.join(self.test_dir, "input.png")
+        self.output_file = os.path.join(self.test_dir, "output.bin")
+        self.data = bytes(range(256)) * 40 + b"\xff\xff\xff\x00\x00"
+        with open(self.input_file, "wb") as f:
+            f.write(self.data)
+
+    def tearDown(self):
+        """Clean up test fixtures."""
+        shutil.rmtree(self.test_dir)
+
+    def read_output(self):
+        with open(self.output_file, "rb") as f:
+            return f.read()
+
+    def test_round_trip_every_mode(self):
+        """Test bulk, streaming and in-memory round trips in each layout."""
+        for name in PIXEL_MODE_NAMES:
+            with self.subTest(mode=name):
+                mode = get_pixel_mode(name)
+                for stream in (False, True):
+                    result = encode_file_to_image(self.input_file, self.image, stream=stream,
+                                                  pixel_mode=name, quiet=True)
+                    self.assertEqual(result.pixel_mode, name)
+                    with open(self.image, "rb") as f:
+                        self.assertEqual(peek_png_pixel_mode(f), mode)
+                        self.assertEqual(f.tell(), 0)
+
+                    for decode_stream in (False, True):
+                        decode_image_to_file(self.image, self.output_file, stream=decode_stream,
+                                             quiet=True)
+                        self.assertEqual(self.read_output(), self.data)
+
+                png = encode_bytes_to_png(self.data, pixel_mode=name)
+                self.assertEqual(decode_image_bytes(png), self.data)
+                self.assertEqual(decode_image_bytes(io.BytesIO(png)), self.data)
+
+    def test_denser_modes_use_fewer_pixels(self):
+        """Test that more bytes per pixel give smaller images."""
+        pixels = []
+        for name in PIXEL_MODE_NAMES:
+            mode = get_pixel_mode(name)
+            width, height = calculate_optimal_dimensions(
+                len(self.data), bytes_per_pixel=mode.bytes_per_pixel
+            )
+            self.assertGreaterEqual(width * height * mode.bytes_per_pixel, len(self.data))
+            pixels.append(width * height)
+        self.assertEqual(pixels, sorted(pixels, reverse=True))
+
+    def test_legacy_images_without_header(self):
+        """Test headerless decoding in the non-RGB layouts."""
+        data = self.data.rstrip(b"\x00")
+        for name in ("RGBA", "RGB16"):
+            with self.subTest(mode=name):
+                encode_file_to_image(self.input_file, self.image, header=False, pixel_mode=name,
+                                     quiet=True)
+                for stream in (False, True):
+                    decode_image_to_file(self.image, self.output_file, method="smart",
+                                         stream=stream, quiet=True)
+                    self.assertEqual(self.read_output(), data)
+
+    def test_raw_formats_are_rgb_only(self):
+        """Test that uncompressed containers reject other layouts."""
+        with self.assertRaises(ValueError):
+            encode_file_to_image(self.input_file, os.path.join(self.test_dir, "out.bmp"),
+                                 pixel_mode="RGBA", quiet=True)
+
+    def test_unknown_mode(self):
+        """Test that mode names are case-insensitive and validated."""
+        self.assertEqual(get_pixel_mode("rgba16").bytes_per_pixel, 8)
+        with self.assertRaises(ValueError):
+            get_pixel_mode("CMYK")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the png_stream.py module.
+"""
+
+import io
+import os
+import struct
+import sys
+import unittest
+import zlib
+from PIL import Image
+
+# Add the project root to the path to import our modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from png_stream import (COLOR_TYPE_RGB, PNG_SIGNATURE, PngAppender, PngStreamReader,
+                        PngStreamWriter, adler32_combine, adler32_prefix, adler32_suffix,
+                        write_chunk)
+
+
+def paeth(a, b, c):
+    """Reference Paeth predictor from the PNG specification."""
+    p = a + b - c
+    pa, pb, pc = abs(p - a), abs(p - b), abs(p - c)
+    if pa <= pb and pa <= pc:
+        return a
+    return b if pb <= pc else c
+
+
+def filter_row(filter_type, row, prior, bpp):
+    """Reference forward filter for one scanline."""
+    out = bytearray()
+    for i, value in enumerate(row):
+        a = row[i - bpp] if i >= bpp else 0
+        b = prior[i]
+        c = prior[i - bpp] if i >= bpp else 0
+        predictor = [0, a, b, (a + b) // 2, paeth(a, b, c)][filter_type]
+        out.append((value - predictor) & 0xFF)
+    return bytes([filter_type]) + out
+
+
+def build_png(rows, width, filter_types):
+    """Build an RGB PNG whose scanlines use the given filter types."""
+    prior = bytes(len(rows[0]))
+    filtered = b""
+    for row, filter_type in zip(rows, filter_types):
+        filtered += filter_row(filter_type, row, prior, 3)
+        prior = row
+    
+    f = io.BytesIO()
+    f.write(PNG_SIGNATURE)
+    write_chunk(f, b"IHDR", struct.pack(">IIBBBBB", width, len(rows), 8, COLOR_TYPE_RGB, 0, 0, 0))
+    compressed = zlib.compress(filtered)
+    # Split the data over several IDAT chunks
+    for i in range(0, len(compressed), 10):
+        write_chunk(f, b"IDAT", compressed[i:i + 10])
+    write_chunk(f, b"IEND")
+    f.seek(0)
+    return f
+
+
+class TestPngStream(unittest.TestCase):
+    """Test cases for the incremental PNG writer and reader."""
+
+    def test_writer_output_reads_in_pillow(self):
+        """Test that streamed PNGs are standard images."""
+        width, height = 13, 9
+        raw = os.urandom(width * height * 3)
+        
+        f = io.BytesIO()
+        with PngStreamWriter(f, width, height, buffer_size=16) as writer:
+            writer.write_rows(raw[:width * 3 * 4])
+            writer.write_rows(raw[width * 3 * 4:])
+        f.seek(0)
+        
+        with Image.open(f) as img:
+            self.assertEqual(img.mode, "RGB")
+            self.assertEqual(img.tobytes(), raw)
+
+    def test_parallel_writer_matches_serial(self):
+        """Test that block-parallel deflate yields one valid zlib stream."""
+        width, height = 17, 40
+        # Half repetitive, half random, so blocks compress very differently
+        raw = bytes(i * 31 % 7 for i in range(width * 3 * 20)) + os.urandom(width * 3 * 20)
+        
+        f = io.BytesIO()
+        with PngStreamWriter(f, width, height, buffer_size=64, threads=3, block_size=100) as writer:
+            for i in range(0, len(raw), width * 3 * 3):
+                writer.write_rows(raw[i:i + width * 3 * 3])
+        f.seek(0)
+        
+        with Image.open(f) as img:
+            self.assertEqual(img.tobytes(), raw)
+        f.seek(0)
+        self.assertEqual(b"".join(PngStreamReader(f).iter_rows()), raw)
+        
+        # Collect the IDAT data and check the zlib trailer as well
+        data = f.getvalue()
+        offset, idat = len(PNG_SIGNATURE), b""
+        while offset < len(data):
+            length, chunk_type = struct.unpack_from(">I4s", data, offset)
+            if chunk_type == b"IDAT":
+                idat += data[offset + 8:offset + 8 + length]
+            offset += 12 + length
+        self.assertEqual(len(zlib.decompress(idat)), height * (width * 3 + 1))
+
+    def test_segment_index(self):
+        """Test that indexed PNGs stay standard and rows can be read from any segment."""
+        width, height = 11, 30
+        raw = os.urandom(width * 3 * height)
+        
+        for threads in (1, 3):
+            f = io.BytesIO()
+            with PngStreamWriter(f, width, height, buffer_size=64, threads=threads,
+                                 block_size=50, index_rows=7) as writer:
+                for i in range(0, len(raw), width * 3 * 4):
+                    writer.write_rows(raw[i:i + width * 3 * 4])
+            f.seek(0)
+            
+            with Image.open(f) as img:
+                self.assertEqual(img.tobytes(), raw)
+            f.seek(0)
+            index_rows, offsets = PngStreamReader(f).read_index()
+            self.assertEqual((index_rows, len(offsets)), (7, 5))
+            for start_row in (0, 6, 7, 15, 29):
+                f.seek(0)
+                rows = b"".join(PngStreamReader(f).iter_rows(start_row))
+                self.assertEqual(rows, raw[start_row * width * 3:])
+        
+        # Images without an index still read from any row
+        f = io.BytesIO()
+        with PngStreamWriter(f, width, height) as writer:
+            writer.write_rows(raw)
+        f.seek(0)
+        reader = PngStreamReader(f)
+        self.assertIsNone(reader.read_index())
+        self.assertEqual(b"".join(reader.iter_rows(12)), raw[12 * width * 3:])
+
+    def test_adler32_combine(self):
+        """Test combining checksums of concatenated data."""
+        for first, second in [(b"", b"abc"), (b"abc", b""), (os.urandom(300), os.urandom(70000))]:
+            self.assertEqual(
+                adler32_combine(zlib.adler32(first), zlib.adler32(second), len(second)),
+                zlib.adler32(first + second)
+            )
+
+    def test_adler32_prefix_and_suffix(self):
+        """Test recovering either half's checksum from the whole and the other half."""
+        for first, second in [(b"", b"abc"), (b"abc", b""), (os.urandom(300), os.urandom(70000))]:
+            whole = zlib.adler32(first + second)
+            self.assertEqual(adler32_prefix(whole, zlib.adler32(second), len(second)),
+                             zlib.adler32(first))
+            self.assertEqual(adler32_suffix(whole, zlib.adler32(first), len(second)),
+                             zlib.adler32(second))
+
+    def test_appender_rewrites_only_the_tail(self):
+        """Test that rewriting keeps earlier segments byte for byte and grows the image."""
+        width, height = 10, 40
+        raw = os.urandom(width * 3 * height)
+        f = io.BytesIO()
+        with PngStreamWriter(f, width, height, index_rows=8, head_rows=2) as writer:
+            writer.write_rows(raw)
+        original = f.getvalue()
+        f.seek(0)
+        appender = PngAppender(f)
+        self.assertEqual((appender.index_rows, appender.head_rows), (8, 2))
+        self.assertEqual(appender.read_rows(30, 3), raw[30 * 30:33 * 30])
+        offsets = appender.offsets
+
+        head = os.urandom(2 * 30)
+        tail = os.urandom(20 * 30)
+        appender.rewrite(head, 35, [tail], 55)
+        f.seek(0)
+        expected = head + raw[60:35 * 30] + tail
+        self.assertEqual(b"".join(PngStreamReader(f).iter_rows()), expected)
+        self.assertEqual(f.getvalue()[offsets[1]:offsets[4]], original[offsets[1]:offsets[4]])
+        f.seek(0)
+        with Image.open(f) as img:
+            self.assertEqual((img.size, img.tobytes()), ((width, 55), expected))
+        for start_row in (9, 33, 48):
+            f.seek(0)
+            self.assertEqual(b"".join(PngStreamReader(f).iter_rows(start_row)),
+                             expected[start_row * 30:])
+
+        # Images without stored head rows cannot be rewritten in place
+        f = io.BytesIO()
+        with PngStreamWriter(f, width, height, index_rows=8) as writer:
+            writer.write_rows(raw)
+        f.seek(0)
+        with self.assertRaises(ValueError):
+            PngAppender(f)
+
+    def test_writer_ignores_empty_writes(self):
+        """Test that writing zero rows adds nothing to the image data."""
+        width, height = 6, 9
+        raw = os.urandom(width * 3 * height)
+        for options in ({}, {"index_rows": 4, "head_rows": 2}, {"threads": 2, "block_size": 40}):
+            with self.subTest(**options):
+                f = io.BytesIO()
+                with PngStreamWriter(f, width, height, **options) as writer:
+                    writer.write_rows(b"")
+                    writer.write_rows(raw[:width * 3 * 5])
+                    writer.write_rows(memoryview(b""))
+                    writer.write_rows(raw[width * 3 * 5:])
+                    writer.write_rows(b"")
+                f.seek(0)
+                with Image.open(f) as img:
+                    self.assertEqual(img.tobytes(), raw)
+                f.seek(0)
+                self.assertEqual(b"".join(PngStreamReader(f).iter_rows()), raw)
+
+    def test_writer_rejects_partial_rows(self):
+        """Test that row data must be whole scanlines and match the height."""
+        writer = PngStreamWriter(io.BytesIO(), 4, 2)
+        with self.assertRaises(ValueError):
+            writer.write_rows(b"\x00" * 5)
+        writer.write_rows(b"\x00" * 12)
+        with self.assertRaises(ValueError):
+            writer.close()
+
+    def test_reader_undoes_every_filter_type(self):
+        """Test un-filtering of None, Sub, Up, Average and Paeth scanlines."""
+        width = 11
+        rows = [os.urandom(width * 3) for _ in range(10)]
+        f = build_png(rows, width, [0, 1, 2, 3, 4, 4, 3, 2, 1, 0])
+        
+        reader = PngStreamReader(f, read_size=7)
+        self.assertEqual((reader.width, reader.height), (width, 10))
+        self.assertEqual([bytes(row) for row in reader.iter_rows()], rows)
+
+    def test_reader_matches_pillow(self):
+        """Test reading a Pillow-written PNG (adaptive filters) row by row."""
+        img = Image.frombytes("RGB", (20, 30), bytes(i * 7 % 251 for i in range(20 * 30 * 3)))
+        f = io.BytesIO()
+        img.save(f, format="PNG")
+        f.seek(0)
+        
+        reader = PngStreamReader(f, read_size=100)
+        self.assertEqual(b"".join(reader.iter_rows()), img.tobytes())
+
+    def test_reader_detects_corruption(self):
+        """Test that damaged chunk data is reported instead of decoded."""
+        f = build_png([b"\x01" * 9, b"\x02" * 9], 3, [0, 0])
+        data = bytearray(f.getvalue())
+        data[45] ^= 0xFF  # Inside the first IDAT chunk
+        
+        reader = PngStreamReader(io.BytesIO(bytes(data)))
+        with self.assertRaises((ValueError, zlib.error)):
+            list(reader.iter_rows())
+
+    def test_reader_rejects_non_png(self):
+        """Test that non-PNG input is rejected."""
+        with self.assertRaises(ValueError):
+            PngStreamReader(io.BytesIO(b"This is not an image file"))
+
+
+if __name__ == "__main__":
+    unittest.main()
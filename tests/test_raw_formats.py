@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the uncompressed BMP/PPM/TIFF containers.
+"""
+
+import os
+import shutil
+import struct
+import sys
+import tempfile
+import unittest
+from PIL import Image
+
+# Add the project root to the path to import our modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from raw_formats import RAW_FORMATS, RawImage, RawImageWriter, detect_raw_format, format_from_extension
+
+
+class TestRawFormats(unittest.TestCase):
+    """Test cases for writing and memory-mapping uncompressed images."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        self.test_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        """Clean up test fixtures."""
+        shutil.rmtree(self.test_dir)
+
+    def test_format_from_extension(self):
+        """Test picking the container from the output name."""
+        self.assertEqual(format_from_extension("a.BMP"), "bmp")
+        self.assertEqual(format_from_extension("a.pnm"), "ppm")
+        self.assertEqual(format_from_extension("a.tif"), "tiff")
+        self.assertEqual(format_from_extension("a.png"), "png")
+        self.assertEqual(format_from_extension("a.img"), "png")
+
+    def test_writer_output_reads_in_pillow(self):
+        """Test that written containers are standard images, for widths with and without BMP row padding."""
+        for width in (4, 5, 7):
+            raw = os.urandom(width * 6 * 3)
+            for image_format in RAW_FORMATS:
+                path = os.path.join(self.test_dir, f"out.{image_format}")
+                with open(path, "wb") as f, RawImageWriter(f, image_format, width, 6) as writer:
+                    writer.write_rows(raw[:width * 3 * 2])
+                    writer.write_rows(raw[width * 3 * 2:])
+                
+                self.assertEqual(detect_raw_format(path), image_format)
+                with Image.open(path) as img:
+                    self.assertEqual(img.mode, "RGB")
+                    self.assertEqual(img.tobytes(), raw)
+
+    def test_reader_matches_pillow_files(self):
+        """Test mapping images saved by Pillow (bottom-up BMP, PPM, TIFF)."""
+        img = Image.frombytes("RGB", (11, 9), os.urandom(11 * 9 * 3))
+        for image_format in RAW_FORMATS:
+            path = os.path.join(self.test_dir, f"pillow.{image_format}")
+            img.save(path)
+            with RawImage(path) as raw:
+                self.assertEqual((raw.width, raw.height), img.size)
+                self.assertEqual(bytes(raw.read(0, raw.size)), img.tobytes())
+                self.assertEqual(bytes(raw.read(40, 100)), img.tobytes()[40:100])
+                self.assertEqual(b"".join(bytes(chunk) for chunk in raw.iter_chunks(5, 200, 33)),
+                                 img.tobytes()[5:200])
+
+    def test_reader_top_down_bmp(self):
+        """Test a BMP with negative height (rows stored top-down)."""
+        width, height = 3, 2
+        rows = [os.urandom(width * 3) for _ in range(height)]
+        pixels = b"".join(bytes(reversed(row[i:i + 3])) for row in rows for i in range(0, width * 3, 3))
+        stride = 12
+        pixel_data = pixels[:9] + b"\x00\x00\x00" + pixels[9:] + b"\x00\x00\x00"
+        data = (struct.pack("<2sIHHI", b"BM", 54 + len(pixel_data), 0, 0, 54)
+                + struct.pack("<IiiHHIIiiII", 40, width, -height, 1, 24, 0, stride * height, 0, 0, 0, 0)
+                + pixel_data)
+        path = os.path.join(self.test_dir, "topdown.bmp")
+        with open(path, "wb") as f:
+            f.write(data)
+        
+        with RawImage(path) as raw:
+            self.assertEqual(bytes(raw.read(0, raw.size)), b"".join(rows))
+
+    def test_reader_ppm_comments(self):
+        """Test PPM headers with comments and odd whitespace."""
+        path = os.path.join(self.test_dir, "comment.ppm")
+        with open(path, "wb") as f:
+            f.write(b"P6\n# made by hand\n2  1\n255\n" + b"\x01\x02\x03\x04\x05\x06")
+        with RawImage(path) as raw:
+            self.assertEqual(bytes(raw.read(0, raw.size)), b"\x01\x02\x03\x04\x05\x06")
+
+    def test_reader_rejects_unsupported(self):
+        """Test that compressed or non-RGB containers are rejected."""
+        path = os.path.join(self.test_dir, "bad.tiff")
+        Image.new("RGB", (8, 8), "red").save(path, compression="tiff_lzw")
+        with self.assertRaises(ValueError):
+            RawImage(path)
+        
+        path = os.path.join(self.test_dir, "gray.bmp")
+        Image.new("L", (8, 8)).save(path)
+        with self.assertRaises(ValueError):
+            RawImage(path)
+        
+        path = os.path.join(self.test_dir, "not_an_image.bin")
+        with open(path, "wb") as f:
+            f.write(b"This is not an image file")
+        with self.assertRaises(ValueError):
+            RawImage(path)
+
+
+if __name__ == "__main__":
+    unittest.main()
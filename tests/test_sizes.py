@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the command-line size parsers (sizes.py).
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import sys
+import unittest
+
+# Add the project root to the path to import our modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sizes import parse_range, parse_size
+
+
+class TestSizes(unittest.TestCase):
+    """Test cases for parsing sizes and byte ranges."""
+
+    def test_parse_range(self):
+        """Test that both parts of a range accept sizes."""
+        self.assertEqual(parse_range("100M:4K"), (100 * 1024 ** 2, 4096))
+        self.assertEqual(parse_range("0:10"), (0, 10))
+
+    def test_malformed_values_are_usage_errors(self):
+        """Test that bad sizes and ranges raise the error argparse reports as usage."""
+        for text in ("4096", "1Q:4", "4:", "-1:4", "1:-4"):
+            with self.subTest(text=text):
+                with self.assertRaises(argparse.ArgumentTypeError):
+                    parse_range(text)
+        with self.assertRaises(argparse.ArgumentTypeError):
+            parse_size("lots")
+
+        parser = argparse.ArgumentParser()
+        parser.add_argument("--range", type=parse_range)
+        with contextlib.redirect_stderr(io.StringIO()) as stderr:
+            with self.assertRaises(SystemExit):
+                parser.parse_args(["--range", "100M"])
+        self.assertIn("invalid range", stderr.getvalue())
+
+
+if __name__ == "__main__":
+    unittest.main()